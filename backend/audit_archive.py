@@ -0,0 +1,107 @@
+"""
+Retención del audit_log.
+
+Los registros más viejos que `days` días se mueven a archivos mensuales
+comprimidos (audit-YYYY-MM.ndjson.gz, una línea Extended JSON por registro)
+y se borran de la colección, que así queda sólo con lo reciente.
+
+Se procesa en lotes ordenados por (created_at, _id): cada lote se agrega al
+archivo de su mes como un miembro gzip nuevo, se hace fsync y recién entonces
+se borra de Mongo. Si el proceso se corta en el medio, el peor caso es un
+lote repetido en el archivo, nunca un registro perdido.
+
+Pensado para correr desde cron (un solo proceso a la vez):
+    python audit_archive.py --days 90 --dir /var/backups/tc2000/audit
+    python audit_archive.py --restore /var/backups/tc2000/audit/audit-2025-01.ndjson.gz
+"""
+import argparse
+import gzip
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import json_util
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import BulkWriteError
+
+DEFAULT_BATCH = 5000
+
+
+def archive_path(directory, created_at):
+    return os.path.join(directory, f"audit-{created_at:%Y-%m}.ndjson.gz")
+
+
+def _append(path, docs):
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as gz:
+            for doc in docs:
+                gz.write(json_util.dumps(doc).encode("utf-8"))
+                gz.write(b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive(collection, directory, days=90, batch_size=DEFAULT_BATCH, now=None):
+    """Mueve a `directory` todo lo anterior a now - days. Devuelve {mes: cantidad}."""
+    os.makedirs(directory, exist_ok=True)
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=days)
+    moved = {}
+    while True:
+        batch = list(collection.find({"created_at": {"$lt": cutoff}})
+                     .sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+                     .limit(batch_size))
+        if not batch:
+            return moved
+        by_month = {}
+        for doc in batch:
+            by_month.setdefault(archive_path(directory, doc["created_at"]), []).append(doc)
+        for path, docs in by_month.items():
+            _append(path, docs)
+            month = os.path.basename(path)[len("audit-"):-len(".ndjson.gz")]
+            moved[month] = moved.get(month, 0) + len(docs)
+        collection.delete_many({"_id": {"$in": [d["_id"] for d in batch]}})
+
+
+def read_archive(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json_util.loads(line)
+
+
+def restore(collection, path, batch_size=DEFAULT_BATCH):
+    """Vuelve a cargar un archivo mensual (los _id repetidos se ignoran)"""
+    restored, batch = 0, []
+    for doc in read_archive(path):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            restored += _insert_ignoring_duplicates(collection, batch)
+            batch = []
+    if batch:
+        restored += _insert_ignoring_duplicates(collection, batch)
+    return restored
+
+
+def _insert_ignoring_duplicates(collection, docs):
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get("nInserted", 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/tc2000_fantasy"))
+    parser.add_argument("--days", type=int, default=int(os.getenv("AUDIT_RETENTION_DAYS", "90")))
+    parser.add_argument("--dir", default=os.getenv("AUDIT_ARCHIVE_DIR", "audit_archive"))
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--restore", metavar="FILE")
+    args = parser.parse_args()
+
+    collection = MongoClient(args.uri).get_default_database().audit_log
+    if args.restore:
+        print(f"Restaurados {restore(collection, args.restore, args.batch)} registros de {args.restore}")
+    else:
+        moved = archive(collection, args.dir, args.days, args.batch)
+        for month, n in sorted(moved.items()):
+            print(f"{month}: {n} registros archivados")
+        print(f"Total: {sum(moved.values())} registros anteriores a {args.days} días")
@@ -0,0 +1,118 @@
+"""
+Escritor asíncrono del audit_log.
+
+Los handlers sólo encolan el documento en memoria; un hilo de fondo los
+vuelca con insert_many(ordered=False) cuando se junta un lote (batch_size) o
+pasa flush_interval segundos. Si el buffer llega a max_buffer, el hilo que
+encola vacía el lote él mismo: eso frena al productor en vez de perder
+registros (backpressure). Al terminar el proceso se hace un flush final.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger("audit_writer")
+
+
+class AuditWriter:
+    def __init__(self, get_collection, batch_size=200, flush_interval=0.5, max_buffer=10000):
+        self._get_collection = get_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "inline_flushes": 0,
+            "max_depth": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def enqueue(self, doc: dict):
+        """Encola un registro de auditoría. No toca la base salvo saturación."""
+        inline = None
+        with self._cond:
+            if self._closed:
+                inline = [doc]
+            else:
+                self._buffer.append(doc)
+                self.metrics["enqueued"] += 1
+                depth = len(self._buffer)
+                if depth > self.metrics["max_depth"]:
+                    self.metrics["max_depth"] = depth
+                if depth >= self.max_buffer:
+                    inline, self._buffer = self._buffer, []
+                    self.metrics["inline_flushes"] += 1
+                elif depth >= self.batch_size:
+                    self._cond.notify()
+                self._ensure_thread()
+        if inline:
+            self._write(inline)
+
+    def depth(self):
+        return len(self._buffer)
+
+    def flush(self):
+        """Vuelca todo lo pendiente de forma síncrona"""
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            if closed:
+                return
+
+    def _write(self, batch):
+        with self._flush_lock:
+            t0 = time.perf_counter()
+            for i in range(0, len(batch), self.batch_size):
+                chunk = batch[i:i + self.batch_size]
+                try:
+                    self._get_collection().insert_many(chunk, ordered=False)
+                    self.metrics["written"] += len(chunk)
+                except BulkWriteError as e:
+                    errors = len(e.details.get("writeErrors", []))
+                    self.metrics["written"] += len(chunk) - errors
+                    self.metrics["failed"] += errors
+                    logger.warning("audit_log: %d registros rechazados", errors)
+                except PyMongoError as e:
+                    self.metrics["failed"] += len(chunk)
+                    logger.error("audit_log: no se pudo escribir el lote: %s", e)
+                self.metrics["batches"] += 1
+            self.metrics["last_flush_ms"] = (time.perf_counter() - t0) * 1000
+
+    def register_atexit(self):
+        atexit.register(self.close)
+        return self
@@ -0,0 +1,62 @@
+"""
+Caches de autenticación.
+
+- Tokens ya verificados → claims, hasta su `exp` (nunca más allá).
+- Perfil mínimo del usuario (username, role, is_active) con TTL corto,
+  invalidado explícitamente por update_user / delete_user.
+
+Con maxsize=0 el cache queda deshabilitado (útil para comparar en benchmarks).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU acotado donde cada entrada vence en un instante propio"""
+
+    def __init__(self, maxsize=10000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires = item
+            if expires is not None and time.time() >= expires:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, expires=None):
+        if self.maxsize <= 0:
+            return
+        if self.ttl is not None:
+            ttl_expires = time.time() + self.ttl
+            expires = ttl_expires if expires is None else min(expires, ttl_expires)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
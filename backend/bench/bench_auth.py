@@ -0,0 +1,67 @@
+"""
+Micro-benchmark del costo de @auth_required por request.
+
+Importa main.py con una base mongomock, crea un usuario y mide una vista
+trivial protegida por el decorador, con los caches de token/perfil
+deshabilitados ("antes": jwt.decode + find_one en cada request) y
+habilitados ("después").
+
+Uso:
+    python bench/bench_auth.py --requests 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("CACHE_CHANGE_STREAM", "0")
+# se mide el decorador, no el límite de tasa (todos los requests son del mismo usuario)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import mongomock  # noqa: E402
+
+import main  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def run(n_requests):
+    main.mongo.db = mongomock.MongoClient().tc2000_fantasy
+    user_id = main.mongo.db.users.insert_one({"username": "bench", "role": "user", "is_active": True}).inserted_id
+    token = main.create_jwt(user_id, "user")
+
+    @main.auth_required()
+    def view():
+        return "ok"
+
+    headers = {"Authorization": f"Bearer {token}"}
+    report = {}
+    for label, size in (("without_cache", 0), ("with_cache", 10000)):
+        main.token_cache.maxsize = main.user_cache.maxsize = size
+        main.token_cache.clear()
+        main.user_cache.clear()
+        times = []
+        with main.app.test_request_context("/bench", headers=headers):
+            for _ in range(n_requests):
+                t0 = time.perf_counter()
+                view()
+                times.append((time.perf_counter() - t0) * 1e6)
+        report[label] = {
+            "mean_us": sum(times) / len(times),
+            "p50_us": percentile(times, 50),
+            "p99_us": percentile(times, 99),
+        }
+    report["speedup"] = report["without_cache"]["mean_us"] / report["with_cache"]["mean_us"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests), indent=2))
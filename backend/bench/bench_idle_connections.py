@@ -0,0 +1,87 @@
+"""
+Benchmark de conexiones SSE ociosas contra un servidor levantado con serve.py.
+
+Abre N conexiones a /sse desde un único hilo (sockets no bloqueantes), espera
+el primer evento de cada una y las deja abiertas. Si se pasan los pids de los
+workers, reporta la memoria residente antes y después y el costo por conexión.
+
+Uso:
+    python serve.py --workers 2 --port 5000 &
+    python bench/bench_idle_connections.py --connections 10000 --pids $(pgrep -f serve.py)
+"""
+import argparse
+import json
+import selectors
+import socket
+import time
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def total_rss(pids):
+    return sum(rss_kb(p) for p in pids)
+
+
+def run(host, port, connections, hold, pids):
+    before = total_rss(pids)
+    sel = selectors.DefaultSelector()
+    request = f"GET /sse HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    socks, failed = [], 0
+
+    t0 = time.perf_counter()
+    for _ in range(connections):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.connect((host, port))
+            s.sendall(request)
+        except OSError:
+            failed += 1
+            s.close()
+            continue
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ)
+        socks.append(s)
+
+    pending = set(socks)
+    deadline = time.time() + 60
+    while pending and time.time() < deadline:
+        for key, _ in sel.select(timeout=1):
+            try:
+                if key.fileobj.recv(65536) and key.fileobj in pending:
+                    pending.discard(key.fileobj)
+            except OSError:
+                pending.discard(key.fileobj)
+    connect_s = time.perf_counter() - t0
+
+    time.sleep(hold)
+    after = total_rss(pids)
+    report = {
+        "requested": connections,
+        "connected": len(socks) - len(pending),
+        "failed": failed + len(pending),
+        "connect_s": connect_s,
+    }
+    if pids:
+        report["server_rss_kb"] = {"before": before, "after": after}
+        report["kb_per_connection"] = (after - before) / max(1, report["connected"])
+
+    for s in socks:
+        s.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--hold", type=float, default=5.0, help="segundos con las conexiones abiertas")
+    parser.add_argument("--pids", type=int, nargs="*", default=[])
+    args = parser.parse_args()
+    print(json.dumps(run(args.host, args.port, args.connections, args.hold, args.pids), indent=2))
@@ -0,0 +1,76 @@
+"""
+Benchmark del leaderboard en memoria.
+
+Carga N fantasy teams sintéticos y mide: consulta de posición, top-K,
+página con offset, "alrededor mío", actualización de puntaje y tamaño/tiempo
+del snapshot comprimido.
+
+Uso:
+    python bench/bench_leaderboard.py --teams 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from leaderboard import Leaderboard  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def measure(fn, samples):
+    times = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1e6)
+    return {"p50_us": percentile(times, 50), "p99_us": percentile(times, 99)}
+
+
+def run(n_teams, samples, seed):
+    rng = random.Random(seed)
+    ids = [f"{i:024x}" for i in range(n_teams)]
+    rows = ((t, rng.randint(0, 5000), f"Equipo {i}", f"{i + 10**12:024x}") for i, t in enumerate(ids))
+
+    board = Leaderboard()
+    t0 = time.perf_counter()
+    board.load(rows)
+    build_s = time.perf_counter() - t0
+
+    report = {
+        "teams": n_teams,
+        "build_s": build_s,
+        "rank": measure(lambda: board.rank(rng.choice(ids)), samples),
+        "top_50": measure(lambda: board.page(0, 50), samples),
+        "page_at_offset": measure(lambda: board.page(rng.randrange(n_teams), 50), samples),
+        "around_me_5": measure(lambda: board.around(rng.choice(ids), 5), samples),
+        "update": measure(lambda: board.apply_deltas([rng.choice(ids)], [rng.randint(-20, 20)]), samples),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "leaderboard.snapshot")
+        t0 = time.perf_counter()
+        size = board.save_snapshot(path)
+        report["snapshot_save_s"] = time.perf_counter() - t0
+        report["snapshot_bytes"] = size
+        t0 = time.perf_counter()
+        Leaderboard().load_snapshot(path)
+        report["snapshot_load_s"] = time.perf_counter() - t0
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+    print(json.dumps(run(args.teams, args.samples, args.seed), indent=2))
@@ -0,0 +1,229 @@
+"""
+Benchmark del pool de conexiones y del ruteo de lecturas/escrituras.
+
+Corre una mezcla de operaciones como la del backend desde `--threads` hilos
+durante `--seconds` por cada combinación de tamaño de pool, read preference
+y compresor:
+
+  read      lecturas pesadas (pilots ordenados, teams, top de fantasy_teams,
+            página de audit_log) con el read preference de la combinación
+  critical  $inc de version en un fantasy team con write concern majority
+  audit     insert_one en audit_log con w:1
+
+y reporta ops/s, p50/p99 por clase, espera de checkout, máximo de conexiones
+en uso / esperando (muestreado cada 10 ms) y checkouts fallidos, con el
+mismo MongoPoolListener que exporta /metrics.
+
+Necesita un replica set (los secundarios son el punto). --start-replset
+levanta uno local de tres nodos con `mongod` del PATH en directorios
+temporales y lo baja al terminar; si no, --mongo-uri a uno existente (base
+descartable, se borra entera).
+
+Uso:
+    python bench/bench_mongo_pool.py --start-replset
+    python bench/bench_mongo_pool.py --mongo-uri "mongodb://h1,h2,h3/bench_pool?replicaSet=rs0" \\
+        --pool-sizes 10,50 --read-preferences primary,secondaryPreferred --compressors none,zstd
+"""
+import argparse
+import atexit
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "db"))
+
+import migrate  # noqa: E402
+from metrics import MongoPoolListener, Registry  # noqa: E402
+from mongo_options import MongoRouting, available_compressors, client_options, read_preference, write_concerns  # noqa: E402
+
+MIX = (("read", 0.7), ("critical", 0.2), ("audit", 0.1))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else None
+
+
+# -------------------
+# Replica set local
+# -------------------
+def start_replset(base_port=27117, nodes=3):
+    mongod = shutil.which("mongod")
+    if mongod is None:
+        raise SystemExit("--start-replset necesita mongod en el PATH")
+    root = tempfile.mkdtemp(prefix="bench_pool_")
+    ports = [base_port + i for i in range(nodes)]
+    procs = []
+    for port in ports:
+        path = os.path.join(root, str(port))
+        os.makedirs(path)
+        procs.append(subprocess.Popen(
+            [mongod, "--replSet", "bench", "--port", str(port), "--dbpath", path, "--bind_ip", "127.0.0.1",
+             "--quiet", "--logpath", os.path.join(path, "mongod.log")],
+        ))
+
+    def stop():
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+    atexit.register(stop)
+    seed = MongoClient(f"mongodb://127.0.0.1:{ports[0]}/?directConnection=true", serverSelectionTimeoutMS=30000)
+    seed.admin.command("ping")
+    seed.admin.command("replSetInitiate", {
+        "_id": "bench",
+        "members": [{"_id": i, "host": f"127.0.0.1:{port}"} for i, port in enumerate(ports)],
+    })
+    deadline = time.time() + 60
+    while not seed.admin.command("hello").get("isWritablePrimary"):
+        if time.time() > deadline:
+            raise SystemExit("el replica set no eligió primario")
+        time.sleep(0.5)
+    return f"mongodb://{','.join(f'127.0.0.1:{p}' for p in ports)}/bench_pool?replicaSet=bench"
+
+
+# -------------------
+# Carga
+# -------------------
+def setup(uri, users, seed):
+    client = MongoClient(uri)
+    db = client.get_default_database()
+    client.drop_database(db.name)
+    migrate.migrate(db, verbose=False)
+    migrate.generate(db, users=users, seed=seed, verbose=False)
+    db.audit_log.insert_many([
+        {"action": "bench", "resource_type": "bench", "created_at": migrate.datetime.now(migrate.timezone.utc)}
+        for _ in range(1000)
+    ])
+    team_ids = [t["_id"] for t in db.fantasy_teams.find({}, {"_id": 1})]
+    client.close()
+    return team_ids
+
+
+def operations(db, routing, team_ids, rng):
+    reads = routing.reads(db)
+    critical = routing.writes(db, "critical")
+    audit = routing.writes(db, "audit")
+    heavy_reads = (
+        lambda: list(reads.pilots.find({}).sort("_id", 1)),
+        lambda: list(reads.teams.find({}, {"logo_png": 0})),
+        lambda: list(reads.fantasy_teams.find({}, {"name": 1, "total_score": 1}).sort("total_score", -1).limit(50)),
+        lambda: list(reads.audit_log.find({}).sort([("created_at", -1), ("_id", -1)]).limit(50)),
+    )
+    return {
+        "read": lambda: rng.choice(heavy_reads)(),
+        "critical": lambda: critical.fantasy_teams.find_one_and_update(
+            {"_id": rng.choice(team_ids)}, {"$inc": {"version": 1}}),
+        "audit": lambda: audit.audit_log.insert_one(
+            {"action": "bench", "resource_type": "bench", "created_at": migrate.datetime.now(migrate.timezone.utc)}),
+    }
+
+
+def run_config(uri, team_ids, pool_size, mode, compressor, threads, seconds, seed):
+    os.environ["MONGO_READ_PREFERENCE"] = mode
+    options = client_options(uri)
+    options["maxPoolSize"] = pool_size
+    options.pop("compressors", None)
+    if compressor != "none":
+        if not available_compressors([compressor]):
+            return {"skipped": f"{compressor} no está instalado"}
+        options["compressors"] = compressor
+    registry = Registry()
+    pool = MongoPoolListener(registry, pool_size)
+    client = MongoClient(uri, event_listeners=[pool], **options)
+    db = client.get_default_database()
+    routing = MongoRouting(read_preference(), write_concerns())
+
+    latencies = {name: [] for name, _ in MIX}
+    errors = {"count": 0}
+    peak = {"in_use": 0, "waiting": 0}
+    stop = threading.Event()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        ops = operations(db, routing, team_ids, rng)
+        names, weights = zip(*MIX)
+        barrier.wait()
+        while not stop.is_set():
+            name = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                ops[name]()
+            except Exception:
+                errors["count"] += 1
+                continue
+            latencies[name].append((time.perf_counter() - t0) * 1000)
+
+    def sampler():
+        while not stop.is_set():
+            peak["in_use"] = max(peak["in_use"], pool.in_use)
+            peak["waiting"] = max(peak["waiting"], pool.waiting)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for t in workers:
+        t.start()
+    barrier.wait()
+    threading.Thread(target=sampler, daemon=True).start()
+    time.sleep(seconds)
+    stop.set()
+    for t in workers:
+        t.join()
+
+    wait = {name[len(pool.wait.name) + 1:]: value for name, _, value in pool.wait.samples()
+            if name.endswith(("_sum", "_count"))}
+    client.close()
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "ops_per_s": total / seconds,
+        "errors": errors["count"],
+        "ops": {name: {"count": len(v), "p50_ms": percentile(v, 50), "p99_ms": percentile(v, 99)}
+                for name, v in latencies.items()},
+        "pool": {
+            "connections": pool.open,
+            "peak_in_use": peak["in_use"],
+            "peak_waiting": peak["waiting"],
+            "checkout_wait_avg_ms": wait["sum"] / wait["count"] * 1000 if wait.get("count") else None,
+            "checkout_failures": {labels: value for _, labels, value in pool.failures.samples()},
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="replica set con base descartable (se borra entera)")
+    parser.add_argument("--start-replset", action="store_true", help="levanta un replica set local de 3 nodos")
+    parser.add_argument("--pool-sizes", default="10,100")
+    parser.add_argument("--read-preferences", default="primary,secondaryPreferred")
+    parser.add_argument("--compressors", default="none,zstd")
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    if not (args.mongo_uri or args.start_replset):
+        parser.error("hace falta --mongo-uri o --start-replset")
+    uri = start_replset() if args.start_replset else args.mongo_uri
+    team_ids = setup(uri, args.users, args.seed)
+
+    report = []
+    for pool_size in (int(n) for n in args.pool_sizes.split(",")):
+        for mode in args.read_preferences.split(","):
+            for compressor in args.compressors.split(","):
+                result = run_config(uri, team_ids, pool_size, mode, compressor, args.threads, args.seconds, args.seed)
+                report.append({"pool_size": pool_size, "read_preference": mode, "compressor": compressor, **result})
+                print(json.dumps(report[-1]), file=sys.stderr)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,175 @@
+"""
+Prueba de estrés de las transferencias de roster bajo concurrencia.
+
+Arma `--teams` fantasy teams con el roster completo y lanza `--requests`
+transferencias a la vez (un hilo por request, liberados juntos con una
+barrera) contra POST /fantasy-teams/me/transfers de main.py. Pocos equipos y
+muchos requests fuerzan choques sobre el mismo documento. Al final verifica,
+equipo por equipo, que no se perdió ninguna actualización:
+
+  - version final - version inicial == transferencias respondidas con 200,
+  - size / spent / team_counts coinciden con el roster embebido,
+  - team_roster tiene exactamente las filas del roster,
+  - ningún equipo supera el presupuesto ni el máximo por equipo real,
+
+y reporta p50/p99 de latencia por tipo de respuesta (200, 409, 422).
+
+Con mongomock (por defecto) la base es un diccionario en el mismo proceso
+que no es atómico entre hilos; para que se comporte como un mongod (cada
+operación sobre un documento es atómica) sus escrituras se serializan con un
+lock. Los números de latencia que importan son los de un mongod real
+(--mongo-uri, base descartable).
+
+Uso:
+    python bench/bench_roster.py --teams 50 --requests 1000
+    python bench/bench_roster.py --teams 50 --requests 1000 --mongo-uri mongodb://localhost:27017/bench_roster
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "db"))
+os.environ.setdefault("CACHE_CHANGE_STREAM", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("EVENT_SCHEDULER", "0")
+
+import main  # noqa: E402
+import migrate  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else None
+
+
+def connect(uri):
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri, maxPoolSize=200)
+        client.drop_database(client.get_default_database().name)
+        return client.get_default_database()
+    import mongomock
+    from mongomock.collection import Collection
+    lock = threading.RLock()
+
+    def atomic(fn):
+        def wrapper(*args, **kwargs):
+            with lock:
+                return fn(*args, **kwargs)
+        return wrapper
+
+    for name in ("find_one", "find_one_and_update", "find_one_and_delete", "insert_one", "bulk_write", "delete_many"):
+        setattr(Collection, name, atomic(getattr(Collection, name)))
+    return mongomock.MongoClient().bench_roster
+
+
+def setup(db, n_teams, seed):
+    migrate.migrate(db, verbose=False)
+    rng = random.Random(seed)
+    pilots = list(db.pilots.find({}, {"price": 1, "team_id": 1}))
+    users = db.users.insert_many([
+        {"username": f"bench_{i}", "email": f"bench_{i}@tc2000.local", "role": "user", "is_active": True}
+        for i in range(n_teams)
+    ]).inserted_ids
+    service = main.roster_service
+    for uid in users:
+        team = service.create(uid, f"Bench {uid}")
+        roster = migrate.synthetic_roster(rng, pilots, service.max_pilots, None)
+        for pid in roster["roster"]:
+            service.add(team["_id"], migrate.ObjectId(pid))
+    return [str(u) for u in users], [str(p["_id"]) for p in pilots]
+
+
+def run(db, users, pilot_ids, n_requests, seed):
+    rng = random.Random(seed)
+    tokens = {u: main.create_jwt(u, "user") for u in users}
+    start_versions = {str(t["user_id"]): t["version"] for t in db.fantasy_teams.find({}, {"user_id": 1, "version": 1})}
+    # cada request parte de lo que "vio" el cliente al cargar la página: puede estar desactualizado
+    seen = {str(t["user_id"]): list(t["roster"]) for t in db.fantasy_teams.find({}, {"user_id": 1, "roster": 1})}
+
+    plan = []
+    for _ in range(n_requests):
+        user = rng.choice(users)
+        out = rng.choice(seen[user])
+        pilot_in = rng.choice([p for p in pilot_ids if p not in seen[user]])
+        plan.append((user, out, pilot_in))
+
+    barrier = threading.Barrier(n_requests)
+    results = [None] * n_requests
+
+    def worker(i):
+        user, out, pilot_in = plan[i]
+        client = main.app.test_client()
+        headers = {"Authorization": f"Bearer {tokens[user]}"}
+        if i % 2:
+            # la mitad manda la versión que vio: compite por ella y el resto recibe 409
+            headers["If-Match"] = f'"{start_versions[user]}"'
+        barrier.wait()
+        t0 = time.perf_counter()
+        r = client.post("/fantasy-teams/me/transfers", json={"pilot_out": out, "pilot_in": pilot_in}, headers=headers)
+        results[i] = (user, r.status_code, (time.perf_counter() - t0) * 1000)
+
+    threading.stack_size(512 * 1024)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_requests)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    by_status = {}
+    for _, status, ms in results:
+        by_status.setdefault(status, []).append(ms)
+    ok_by_user = Counter(user for user, status, _ in results if status == 200)
+    return {
+        "requests": n_requests,
+        "wall_s": wall,
+        "status": {str(s): {"count": len(v), "p50_ms": percentile(v, 50), "p99_ms": percentile(v, 99)}
+                   for s, v in sorted(by_status.items())},
+        "p99_ms": percentile([ms for _, _, ms in results], 99),
+        "errors": verify(db, start_versions, ok_by_user),
+    }
+
+
+def verify(db, start_versions, ok_by_user):
+    service = main.roster_service
+    errors = []
+    for t in db.fantasy_teams.find():
+        user = str(t["user_id"])
+        roster = t["roster"]
+        counts = Counter(str(e["team_id"]) for e in roster.values() if e.get("team_id"))
+        rows = {str(r["pilot_id"]) for r in db.team_roster.find({"fantasy_team_id": t["_id"]})}
+        checks = {
+            "lost update": t["version"] - start_versions[user] == ok_by_user[user],
+            "size": t["size"] == len(roster),
+            "spent": t["spent"] == sum(e["price"] for e in roster.values()),
+            "team_counts": {k: v for k, v in t["team_counts"].items() if v} == dict(counts),
+            "team_roster rows": rows == set(roster),
+            "budget": t["spent"] <= service.budget,
+            "max per team": all(v <= service.max_per_team for v in counts.values()),
+        }
+        errors.extend(f"{user}: {name}" for name, ok in checks.items() if not ok)
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--mongo-uri", help="base descartable (se borra entera)")
+    args = parser.parse_args()
+
+    db = connect(args.mongo_uri)
+    main.mongo.db = db
+    users, pilot_ids = setup(db, args.teams, args.seed)
+    report = run(db, users, pilot_ids, args.requests, args.seed)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["errors"] else 0)
@@ -0,0 +1,118 @@
+"""
+Benchmark del motor de puntaje con fantasy teams sintéticos.
+
+Modo por defecto: mide sólo el cálculo vectorizado (puntos por fila y suma
+sobre rosters) con 100k equipos en memoria. Con --mongo-uri además siembra una
+base descartable y mide ScoringEngine.publish_event de punta a punta, tanto la
+primera publicación como una corrección que afecta a dos pilotos.
+
+Uso:
+    python bench/bench_scoring.py --teams 100000
+    python bench/bench_scoring.py --teams 100000 --mongo-uri mongodb://localhost:27017/bench_scoring
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scoring import ScoringEngine, roster_deltas, score_rows  # noqa: E402
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def bench_compute(n_teams, n_pilots, roster_size, seed):
+    rng = np.random.default_rng(seed)
+    positions = rng.permutation(n_pilots) + 1
+    dnf = rng.random(n_pilots) < 0.1
+    rows, t_rows = timed(score_rows, positions, dnf)
+
+    roster_team = np.repeat(np.arange(n_teams), roster_size)
+    roster_pilot = np.concatenate([rng.choice(n_pilots, roster_size, replace=False) for _ in range(n_teams)])
+    totals, t_full = timed(roster_deltas, roster_team, roster_pilot, rows[:, 0], n_teams)
+
+    # Corrección: sólo dos pilotos cambian → sólo sus filas de roster
+    touched = np.array([0, 1])
+    mask = np.isin(roster_pilot, touched)
+    _, t_incr = timed(roster_deltas, roster_team[mask], np.searchsorted(touched, roster_pilot[mask]),
+                      np.array([5, -5]), n_teams)
+
+    ranking, t_rank = timed(lambda s: np.argsort(-s, kind="stable")[:1000], totals)
+    return {
+        "teams": n_teams,
+        "roster_rows": int(len(roster_team)),
+        "score_rows_ms": t_rows,
+        "full_roster_sum_ms": t_full,
+        "correction_rows": int(mask.sum()),
+        "correction_sum_ms": t_incr,
+        "top1000_ms": t_rank,
+    }
+
+
+def bench_mongo(uri, n_teams, n_pilots, roster_size, seed):
+    from pymongo import MongoClient, ASCENDING, DESCENDING
+
+    client = MongoClient(uri)
+    db = client.get_default_database()
+    for name in ("pilots", "events", "event_results", "fantasy_teams", "team_roster", "derived_stats"):
+        db.drop_collection(name)
+    db.team_roster.create_index([("pilot_id", ASCENDING)])
+    db.fantasy_teams.create_index([("total_score", DESCENDING), ("_id", ASCENDING)])
+    db.event_results.create_index([("event_id", ASCENDING), ("pilot_id", ASCENDING)], unique=True)
+
+    rng = np.random.default_rng(seed)
+    pilot_ids = db.pilots.insert_many([
+        {"name": f"P{i}", "car_number": i, "current_score": 0, "stats": {"podiums": 0, "wins": 0, "DNF": 0}}
+        for i in range(n_pilots)
+    ]).inserted_ids
+    team_ids = db.fantasy_teams.insert_many([
+        {"name": f"FT{i}", "total_score": 0} for i in range(n_teams)
+    ]).inserted_ids
+    roster = []
+    for tid in team_ids:
+        for p in rng.choice(n_pilots, roster_size, replace=False):
+            roster.append({"fantasy_team_id": tid, "pilot_id": pilot_ids[p]})
+    db.team_roster.insert_many(roster)
+    event_id = db.events.insert_one({"name": "bench", "status": "finished"}).inserted_id
+    positions = rng.permutation(n_pilots) + 1
+    db.event_results.insert_many([
+        {"event_id": event_id, "pilot_id": pid, "position": int(pos), "dnf": False}
+        for pid, pos in zip(pilot_ids, positions)
+    ])
+
+    engine = ScoringEngine(lambda: db)
+    first, t_first = timed(engine.publish_event, event_id)
+
+    # Corrección: se invierten las posiciones de dos pilotos
+    a, b = pilot_ids[0], pilot_ids[1]
+    pa = db.event_results.find_one({"event_id": event_id, "pilot_id": a})["position"]
+    pb = db.event_results.find_one({"event_id": event_id, "pilot_id": b})["position"]
+    db.event_results.update_one({"event_id": event_id, "pilot_id": a}, {"$set": {"position": pb}})
+    db.event_results.update_one({"event_id": event_id, "pilot_id": b}, {"$set": {"position": pa}})
+    second, t_second = timed(engine.publish_event, event_id)
+
+    client.close()
+    return {"first_publish": {"ms": t_first, **first}, "correction": {"ms": t_second, **second}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=100_000)
+    parser.add_argument("--pilots", type=int, default=30)
+    parser.add_argument("--roster-size", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--mongo-uri", help="base descartable (se borran sus colecciones)")
+    args = parser.parse_args()
+
+    report = {"compute": bench_compute(args.teams, args.pilots, args.roster_size, args.seed)}
+    if args.mongo_uri:
+        report["mongo"] = bench_mongo(args.mongo_uri, args.teams, args.pilots, args.roster_size, args.seed)
+    print(json.dumps(report, indent=2))
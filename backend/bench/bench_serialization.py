@@ -0,0 +1,168 @@
+"""
+Benchmark de serialización y compresión de respuestas grandes.
+
+Arma `--rows` documentos como los de /admin/users y /pilots (ObjectId,
+datetime, floats, stats anidados) y mide, para cada serializador:
+
+  bson_json_util   el provider que instala Flask-PyMongo (el de antes)
+  stdlib           json de la biblioteca estándar convirtiendo cada documento
+                   a mano (str(_id), isoformat) como hacían las vistas
+  orjson           serialization.dumps_bytes (sin conversiones previas)
+  msgpack          serialization.dumps_msgpack (si está instalado)
+
+el CPU por respuesta (mediana de `--repeat` corridas, process_time) y los
+bytes en el cable sin comprimir, con gzip y con brotli (más lo que cuesta
+comprimir). Después importa main.py con una base mongomock con `--rows`
+usuarios y pide /admin/users y /pilots por el test client con distintos
+Accept / Accept-Encoding, de punta a punta.
+
+Uso:
+    python bench/bench_serialization.py --rows 10000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("CACHE_CHANGE_STREAM", "0")
+os.environ.setdefault("EVENT_SCHEDULER", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("TEAM_CHECK_INTERVAL_S", "0")
+os.environ.setdefault("ROSTER_CHECK_INTERVAL_S", "0")
+
+import serialization  # noqa: E402
+
+
+def make_rows(n, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "username": f"user{i:06d}",
+        "email": f"user{i:06d}@example.com",
+        "role": "admin" if i % 100 == 0 else "user",
+        "is_active": rng.random() > 0.05,
+        "created_at": start + timedelta(minutes=rng.randint(0, 500000)),
+        "last_login": start + timedelta(minutes=rng.randint(0, 500000)) if rng.random() > 0.2 else None,
+        "team_id": ObjectId(),
+        "current_score": round(rng.uniform(0, 500), 2),
+        "stats": {"wins": rng.randint(0, 10), "podiums": rng.randint(0, 20), "avg_position": round(rng.uniform(1, 30), 2)},
+    } for i in range(n)]
+
+
+def convert_by_hand(rows):
+    """Lo que hacían las vistas antes de serializar (serialize_user y similares)"""
+    out = []
+    for row in rows:
+        row = dict(row)
+        row["_id"] = str(row["_id"])
+        row["team_id"] = str(row["team_id"])
+        for field in ("created_at", "last_login"):
+            if row.get(field) is not None:
+                row[field] = row[field].isoformat()
+        out.append(row)
+    return out
+
+
+def serializers():
+    result = {
+        "bson_json_util": lambda rows: json_util.dumps(rows).encode("utf-8"),
+        "stdlib": lambda rows: json.dumps(convert_by_hand(rows)).encode("utf-8"),
+        "orjson" if serialization.orjson is not None else "stdlib_provider": serialization.dumps_bytes,
+    }
+    if serialization.msgpack is not None:
+        result["msgpack"] = serialization.dumps_msgpack
+    return result
+
+
+def cpu_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.process_time()
+        out = fn()
+        times.append((time.process_time() - t0) * 1000)
+    return statistics.median(times), out
+
+
+def run_serializers(rows, repeat, compressor):
+    report = {}
+    for name, dumps in serializers().items():
+        ms, body = cpu_ms(lambda: dumps(rows), repeat)
+        entry = {"cpu_ms": ms, "bytes": len(body)}
+        for encoding in ("gzip", "br"):
+            if encoding == "br" and serialization.brotli is None:
+                continue
+            compress_ms, compressed = cpu_ms(lambda: compressor.compress(body, encoding), max(1, repeat // 2))
+            entry[encoding] = {"bytes": len(compressed), "cpu_ms": compress_ms, "ratio": len(body) / len(compressed)}
+        report[name] = entry
+    return report
+
+
+# -------------------
+# De punta a punta
+# -------------------
+def run_http(rows, repeat):
+    import mongomock
+    import main
+
+    db = mongomock.MongoClient().tc2000_fantasy
+    main.mongo.db = db
+    db.users.insert_many([{**r, "password_hash": "x" * 60} for r in rows])
+    db.pilots.insert_many([{"name": r["username"], "team_id": r["team_id"], "team": "bench", "car_number": i,
+                            "current_score": r["current_score"], "stats": r["stats"], "created_at": r["created_at"]}
+                           for i, r in enumerate(rows)])
+    admin = db.users.find_one({"role": "admin"})
+    token = main.create_jwt(str(admin["_id"]), "admin")
+    client = main.app.test_client()
+
+    variants = [("json", {}), ("json+gzip", {"Accept-Encoding": "gzip"})]
+    if serialization.brotli is not None:
+        variants.append(("json+br", {"Accept-Encoding": "br"}))
+    if serialization.msgpack is not None:
+        variants.append(("msgpack+br", {"Accept": "application/msgpack", "Accept-Encoding": "br, gzip"}))
+
+    report = {}
+    for path in ("/admin/users", "/pilots"):
+        report[path] = {}
+        for label, headers in variants:
+            headers = {"Authorization": f"Bearer {token}", **headers}
+            client.get(path, headers=headers)  # calienta el cache de /pilots
+            times, size = [], 0
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                response = client.get(path, headers=headers)
+                times.append((time.perf_counter() - t0) * 1000)
+                size = len(response.data)
+                assert response.status_code == 200, response.status_code
+            report[path][label] = {"p50_ms": statistics.median(times), "bytes": size,
+                                   "encoding": response.headers.get("Content-Encoding")}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--no-http", action="store_true", help="sólo los serializadores, sin importar main.py")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.seed)
+    compressor = serialization.Compressor()
+    report = {
+        "rows": args.rows,
+        "available": {"orjson": serialization.orjson is not None, "msgpack": serialization.msgpack is not None,
+                      "brotli": serialization.brotli is not None},
+        "serializers": run_serializers(rows, args.repeat, compressor),
+    }
+    if not args.no_http:
+        report["http"] = run_http(rows, args.repeat)
+    print(json.dumps(report, indent=2))
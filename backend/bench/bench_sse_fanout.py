@@ -0,0 +1,94 @@
+"""
+Benchmark de fan-out del hub SSE.
+
+Levanta N clientes locales (hilos que consumen igual que /sse) y publica M
+eventos, midiendo la latencia publicación → recepción en cada cliente y el
+tiempo que tarda publish() en el hilo emisor.
+
+Uso:
+    python bench/bench_sse_fanout.py --subscribers 2000 --events 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sse_hub import SSEHub  # noqa: E402
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def client(sub, expected, latencies, done):
+    received = 0
+    while received < expected:
+        frames = sub.get(timeout=5)
+        if not frames:
+            break
+        now = time.perf_counter()
+        for frame in frames:
+            payload = json.loads(frame.split("data: ", 1)[1])
+            latencies.append(now - payload["sent"])
+            received += 1
+    done.append(received)
+    sub.close()
+
+
+def run(subscribers, events, interval, buffer, policy):
+    hub = SSEHub(subscriber_buffer=buffer, policy=policy)
+    latencies, done, threads = [], [], []
+
+    for _ in range(subscribers):
+        t = threading.Thread(target=client, args=(hub.subscribe(), events, latencies, done), daemon=True)
+        t.start()
+        threads.append(t)
+
+    publish_times = []
+    for i in range(events):
+        t0 = time.perf_counter()
+        hub.publish({"type": "bench", "seq": i, "sent": time.perf_counter()})
+        publish_times.append(time.perf_counter() - t0)
+        if interval:
+            time.sleep(interval)
+
+    for t in threads:
+        t.join(timeout=30)
+
+    stats = hub.stats()
+    return {
+        "subscribers": subscribers,
+        "events": events,
+        "delivered": sum(done),
+        "dropped": subscribers * events - sum(done),
+        "fanout_latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies, default=0) * 1000,
+        },
+        "publish_ms": {
+            "mean": statistics.mean(publish_times) * 1000,
+            "p99": percentile(publish_times, 99) * 1000,
+        },
+        "hub": stats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005, help="segundos entre eventos")
+    parser.add_argument("--buffer", type=int, default=256)
+    parser.add_argument("--policy", default="drop_oldest", choices=["drop_oldest", "coalesce"])
+    args = parser.parse_args()
+    print(json.dumps(run(args.subscribers, args.events, args.interval, args.buffer, args.policy), indent=2))
@@ -0,0 +1,243 @@
+"""
+Replay de telemetría de carrera a N× de velocidad.
+
+Un archivo de carrera es NDJSON, una línea por dato recibido:
+    {"t": 12.4, "car_number": 7, "position": 3, "lap": 1}
+    {"t": 830.0, "car_number": 22, "dnf": true}
+(t en segundos desde la largada). Con --generate se graba una carrera
+sintética con los pilotos y el circuito del evento.
+
+Modos:
+  en proceso (por defecto): importa main.py con mongomock, aplica las
+  migraciones, genera --users fantasy teams, pone el evento en "live" y
+  manda el archivo a POST /admin/live/<id> con el cliente de pruebas. Al
+  final compara el puntaje provisorio con el oficial (publica los
+  resultados finales con ScoringEngine) equipo por equipo y reporta
+  latencias de ingesta, costo de cada lote aplicado y deltas emitidos.
+  Sale con código 1 si algún equipo no coincide.
+
+  --url: manda el archivo a un backend corriendo (--token de admin y
+  --event-id de un evento en "live").
+
+Uso:
+    python bench/replay_race.py --speed 100 --users 2000
+    python bench/replay_race.py --generate carrera.ndjson --laps 20
+    python bench/replay_race.py --file carrera.ndjson --url http://localhost:5000 --token ... --event-id ...
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.request
+from itertools import groupby
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "db"))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else None
+
+
+# -------------------
+# Carrera sintética
+# -------------------
+def generate_race(car_numbers, laps, lap_time=90.0, sample_hz=5.0, dnf_rate=0.1, seed=1):
+    """Cada auto reporta posición y vuelta sample_hz veces por segundo; hay sobrepasos y abandonos"""
+    rng = random.Random(seed)
+    order = list(car_numbers)
+    rng.shuffle(order)
+    retired = {}
+    for car in order:
+        if rng.random() < dnf_rate:
+            retired[car] = rng.uniform(0.1, 0.9) * laps * lap_time
+    step = 1.0 / sample_hz
+    t = 0.0
+    while t <= laps * lap_time:
+        lap = min(laps, int(t // lap_time) + 1)
+        # sobrepasos: un par de autos vecinos intercambia posiciones de vez en cuando
+        if rng.random() < 0.05:
+            i = rng.randrange(len(order) - 1)
+            order[i], order[i + 1] = order[i + 1], order[i]
+        running = [c for c in order if retired.get(c, float("inf")) > t]
+        for car, when in list(retired.items()):
+            if when <= t:
+                yield {"t": round(t, 3), "car_number": car, "dnf": True}
+                del retired[car]
+        for position, car in enumerate(running, 1):
+            yield {"t": round(t, 3), "car_number": car, "position": position, "lap": lap}
+        t += step
+
+
+def read_race(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def ticks(rows):
+    """Agrupa las filas por instante: un POST por tick"""
+    for t, group in groupby(rows, key=lambda r: r["t"]):
+        yield t, [{k: v for k, v in r.items() if k != "t"} for r in group]
+
+
+def replay(rows, post, speed):
+    """Manda cada tick respetando los tiempos / speed. Devuelve latencias de POST (ms)."""
+    latencies, sent = [], 0
+    t0 = time.perf_counter()
+    for t, updates in ticks(rows):
+        wait = t / speed - (time.perf_counter() - t0)
+        if wait > 0:
+            time.sleep(wait)
+        start = time.perf_counter()
+        post(updates)
+        latencies.append((time.perf_counter() - start) * 1000)
+        sent += len(updates)
+    return latencies, sent, time.perf_counter() - t0
+
+
+# -------------------
+# En proceso
+# -------------------
+def run_in_process(args):
+    os.environ.setdefault("CACHE_CHANGE_STREAM", "0")
+    os.environ.setdefault("EVENT_SCHEDULER", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import mongomock
+    import main
+    import migrate
+
+    db = mongomock.MongoClient().replay_race
+    main.mongo.db = db
+    migrate.migrate(db, verbose=False)
+    migrate.generate(db, users=args.users, seed=args.seed, verbose=False)
+
+    event = db.events.find_one({"name": "Ronda Córdoba"})
+    db.events.update_one({"_id": event["_id"]}, {"$set": {"status": "live"}})
+    circuit = db.circuits.find_one({"_id": event["circuit_id"]})
+    cars = [p["car_number"] for p in db.pilots.find({}, {"car_number": 1})]
+    rows = list(read_race(args.file)) if args.file else list(
+        generate_race(cars, args.laps or circuit["laps"], lap_time=args.lap_time, seed=args.seed))
+
+    admin = db.users.find_one({"username": "admin"})
+    headers = {"Authorization": f"Bearer {main.create_jwt(str(admin['_id']), 'admin')}"}
+    client = main.app.test_client()
+    url = f"/admin/live/{event['_id']}"
+
+    apply_ms, emitted = [], [0]
+    original_apply = main.apply_live
+
+    def timed_apply(message):
+        start = time.perf_counter()
+        original_apply(message)
+        apply_ms.append((time.perf_counter() - start) * 1000)
+
+    main.apply_live = timed_apply
+    original_add = main.delta_publisher.add
+
+    def counting_add(*a, **kw):
+        emitted[0] += 1
+        return original_add(*a, **kw)
+
+    main.delta_publisher.add = counting_add
+
+    def post(updates):
+        r = client.post(url, json={"updates": updates}, headers=headers)
+        if r.status_code != 202:
+            raise SystemExit(f"POST {url}: {r.status_code} {r.get_data(as_text=True)}")
+
+    latencies, sent, wall = replay(rows, post, args.speed)
+    main.live_ingest.flush()
+    state = main.live_board.race(str(event["_id"]))
+
+    # Verificación: resultados finales → puntaje oficial, contra el provisorio
+    final = {}
+    for r in rows:
+        final.setdefault(r["car_number"], {}).update(r)
+    by_car = {p["car_number"]: p["_id"] for p in db.pilots.find({}, {"car_number": 1})}
+    before = {t["_id"]: t.get("total_score", 0) for t in db.fantasy_teams.find({}, {"total_score": 1})}
+    db.event_results.insert_many([{
+        "event_id": event["_id"], "pilot_id": by_car[car],
+        "position": None if f.get("dnf") else f.get("position"), "dnf": bool(f.get("dnf")),
+    } for car, f in final.items()])
+    main.scoring_engine.publish_event(event["_id"])
+    mismatches = []
+    for t in db.fantasy_teams.find({}, {"total_score": 1}):
+        official = t.get("total_score", 0) - before.get(t["_id"], 0)
+        provisional = state.team_points_of(str(t["_id"])) or 0
+        if official != provisional:
+            mismatches.append({"fantasy_team_id": str(t["_id"]), "official": official, "provisional": provisional})
+    return {
+        "mode": "in-process",
+        "rows": len(rows),
+        "updates_sent": sent,
+        "race_seconds": rows[-1]["t"] if rows else 0,
+        "speed": args.speed,
+        "wall_s": wall,
+        "updates_per_s": sent / wall if wall else None,
+        "post_ms": {"count": len(latencies), "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)},
+        "bus_batches": main.live_ingest.batches,
+        "apply_batch_ms": {"p50": percentile(apply_ms, 50), "p99": percentile(apply_ms, 99), "max": max(apply_ms or [0])},
+        "deltas_emitted": emitted[0],
+        "fantasy_teams": len(state.team_ids),
+        "team_points_total": int(state.team_points.sum()),
+        "mismatches": mismatches[:10],
+        "mismatch_count": len(mismatches),
+    }
+
+
+# -------------------
+# Contra un backend corriendo
+# -------------------
+def run_remote(args):
+    url = f"{args.url.rstrip('/')}/admin/live/{args.event_id}"
+
+    def post(updates):
+        req = urllib.request.Request(url, data=json.dumps({"updates": updates}).encode("utf-8"), method="POST", headers={
+            "Content-Type": "application/json", "Authorization": f"Bearer {args.token}",
+        })
+        with urllib.request.urlopen(req) as resp:
+            resp.read()
+
+    latencies, sent, wall = replay(read_race(args.file), post, args.speed)
+    return {
+        "mode": "remote",
+        "updates_sent": sent,
+        "wall_s": wall,
+        "updates_per_s": sent / wall if wall else None,
+        "post_ms": {"count": len(latencies), "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="carrera grabada (NDJSON)")
+    parser.add_argument("--generate", metavar="FILE", help="graba una carrera sintética y sale")
+    parser.add_argument("--cars", type=int, default=30, help="autos de la carrera sintética (--generate)")
+    parser.add_argument("--laps", type=int, help="vueltas (por defecto las del circuito)")
+    parser.add_argument("--lap-time", type=float, default=90.0)
+    parser.add_argument("--speed", type=float, default=100.0, help="N× tiempo real")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--url")
+    parser.add_argument("--token")
+    parser.add_argument("--event-id")
+    args = parser.parse_args()
+
+    if args.generate:
+        with open(args.generate, "w", encoding="utf-8") as f:
+            for row in generate_race(range(1, args.cars + 1), args.laps or 20, args.lap_time, seed=args.seed):
+                f.write(json.dumps(row) + "\n")
+        sys.exit(0)
+    if args.url:
+        if not (args.file and args.token and args.event_id):
+            parser.error("--url necesita --file, --token y --event-id")
+        print(json.dumps(run_remote(args), indent=2))
+        sys.exit(0)
+    report = run_in_process(args)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["mismatch_count"] else 0)
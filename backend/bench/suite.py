@@ -0,0 +1,433 @@
+"""
+Suite de carga y de regresión de todo el backend.
+
+Importa main.py, lo apunta a una base mongomock (por defecto) o a un mongod
+(--mongo-uri, base descartable: se borra entera), corre las migraciones y
+genera datos sintéticos con migrate.generate (--users, --events). Después
+corre los escenarios pedidos contra la app por el test client desde
+`--concurrency` hilos, cada uno durante `--duration` segundos:
+
+  login_storm   largada de carrera: POST /login de usuarios al azar
+  page_load     carga de la página: /pilots, /teams, /leaderboard,
+                /leaderboard/me, /fantasy-teams/me y /me con token
+  admin_crud    alta / rename / baja de equipos y pilotos, lectura de
+                usuarios y de la auditoría
+  listeners     `--listeners` clientes SSE y otros tantos de Socket.IO
+                suscriptos a "pilots"; se publican `--messages` eventos y se
+                mide publicación → recepción en cada cliente
+
+Por escenario reporta requests, throughput, p50/p99 (ms), errores (status
+inesperados) por status y memoria (RSS al terminar y cuánto creció; con
+--tracemalloc también el pico de memoria Python, más lento). Todo sale como
+JSON por stdout.
+
+--save-baseline guarda el reporte; --baseline compara contra uno guardado y
+sale con código 1 si algún escenario empeoró más que --tolerance (throughput
+menor, p99 o crecimiento de memoria mayores; las diferencias de menos de
+--min-delta-ms / 16 MB se consideran ruido). Sólo se comparan reportes de la
+misma escala y el mismo tipo de base. Con mongomock la base corre en el
+mismo proceso y sus operaciones se serializan con un lock: sirve para ver
+regresiones del código de la app, no para dimensionar.
+
+Uso:
+    python bench/suite.py --users 2000 --save-baseline bench/baselines/mongomock.json
+    python bench/suite.py --users 2000 --baseline bench/baselines/mongomock.json
+    python bench/suite.py --mongo-uri mongodb://localhost:27017/bench_suite --users 20000 \\
+        --scenarios login_storm,page_load --concurrency 64
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "db"))
+os.environ.setdefault("CACHE_CHANGE_STREAM", "0")
+os.environ.setdefault("EVENT_SCHEDULER", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TEAM_CHECK_INTERVAL_S", "0")
+os.environ.setdefault("ROSTER_CHECK_INTERVAL_S", "0")
+# todo sale del mismo "IP": el límite de tasa cortaría la carga
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+# el costo con el que migrate.generate hashea las contraseñas sintéticas (sin re-hash en el login)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# el snapshot del ranking de otra base no debe pisar el de la generada
+os.environ.setdefault("LEADERBOARD_SNAPSHOT", os.path.join(tempfile.mkdtemp(prefix="bench_suite_"), "leaderboard.snapshot"))
+
+import main  # noqa: E402
+import migrate  # noqa: E402
+
+SCENARIOS = ("login_storm", "page_load", "admin_crud", "listeners")
+MEMORY_NOISE_MB = 16
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else None
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def connect(uri):
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri, maxPoolSize=200)
+        client.drop_database(client.get_default_database().name)
+        return client.get_default_database()
+    import mongomock
+    from mongomock.collection import Collection, Cursor
+    # mongomock no es seguro entre hilos: cada operación (y el cálculo de
+    # los resultados de un cursor) corre con el lock tomado
+    lock = threading.RLock()
+
+    def atomic(fn):
+        def wrapper(*args, **kwargs):
+            with lock:
+                return fn(*args, **kwargs)
+        return wrapper
+
+    for name in ("find_one", "find_one_and_update", "find_one_and_delete", "find_one_and_replace", "insert_one",
+                 "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+                 "bulk_write", "aggregate", "count_documents", "estimated_document_count", "distinct"):
+        setattr(Collection, name, atomic(getattr(Collection, name)))
+    Cursor._compute_results = atomic(Cursor._compute_results)
+    return mongomock.MongoClient().bench_suite
+
+
+def setup(db, users, events, seed):
+    migrate.migrate(db, verbose=False)
+    migrate.generate(db, users=users, events=events, seed=seed, verbose=False)
+    admin = db.users.find_one({"role": "admin"})
+    accounts = [(str(u["_id"]), u["username"]) for u in db.users.find({"synthetic": True}, {"username": 1})]
+    team_ids = [str(t["_id"]) for t in db.teams.find({}, {"_id": 1})]
+    return str(admin["_id"]), accounts, team_ids
+
+
+# -------------------
+# Carga
+# -------------------
+def run_load(concurrency, duration, step, seed):
+    """
+    Corre step(client, rng) en `concurrency` hilos durante `duration`
+    segundos. step devuelve [(nombre, ms, status, esperado)].
+    """
+    latencies, by_name, statuses, errors = [], {}, Counter(), Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(i):
+        rng = random.Random(seed + i)
+        client = main.app.test_client()
+        local = []
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            try:
+                local.extend(step(client, rng))
+            except Exception as e:  # un error de la app también es un resultado
+                local.append(("exception", 0.0, type(e).__name__, False))
+        with lock:
+            for name, ms, status, ok in local:
+                latencies.append(ms)
+                by_name.setdefault(name, []).append(ms)
+                statuses[str(status)] += 1
+                if not ok:
+                    errors[f"{name}:{status}"] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    started = time.perf_counter()
+    deadline[0] = started + duration
+    barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "errors": sum(errors.values()),
+        "error_detail": dict(errors),
+        "statuses": dict(statuses),
+        "routes": {name: {"count": len(v), "p50_ms": percentile(v, 50), "p99_ms": percentile(v, 99)}
+                   for name, v in sorted(by_name.items())},
+    }
+
+
+def timed(client, name, method, path, expect=(200,), **kwargs):
+    t0 = time.perf_counter()
+    response = getattr(client, method)(path, **kwargs)
+    ms = (time.perf_counter() - t0) * 1000
+    return (name, ms, response.status_code, response.status_code in expect), response
+
+
+def login_storm(ctx, args):
+    accounts = ctx["accounts"]
+
+    def step(client, rng):
+        _, username = rng.choice(accounts)
+        # 429: el pool de bcrypt descarta lo que no puede atender (esperado en una ráfaga)
+        result, _ = timed(client, "login", "post", "/login", expect=(200, 429),
+                          json={"username": username, "password": migrate.SYNTHETIC_PASSWORD})
+        return [result]
+    return run_load(args.concurrency, args.duration, step, args.seed)
+
+
+def page_load(ctx, args):
+    tokens = {uid: main.create_jwt(uid, "user") for uid, _ in ctx["accounts"]}
+    user_ids = list(tokens)
+
+    def step(client, rng):
+        headers = {"Authorization": f"Bearer {tokens[rng.choice(user_ids)]}", "Accept-Encoding": "gzip"}
+        results = []
+        for name, path in (("pilots", "/pilots"), ("teams", "/teams"), ("leaderboard", "/leaderboard"),
+                           ("leaderboard_me", "/leaderboard/me"), ("fantasy_team_me", "/fantasy-teams/me"),
+                           ("me", "/me")):
+            result, _ = timed(client, name, "get", path, headers=headers)
+            results.append(result)
+        return results
+    return run_load(args.concurrency, args.duration, step, args.seed)
+
+
+def admin_crud(ctx, args):
+    headers = {"Authorization": f"Bearer {main.create_jwt(ctx['admin_id'], 'admin')}"}
+    accounts = ctx["accounts"]
+    counter = iter(range(10 ** 9))
+    counter_lock = threading.Lock()
+
+    def step(client, rng):
+        with counter_lock:
+            n = next(counter)
+        name = f"bench-{os.getpid()}-{n}"
+        results = []
+        result, response = timed(client, "team_create", "post", "/teams", expect=(201,), headers=headers,
+                                 json={"name": name, "base_country": "Argentina"})
+        results.append(result)
+        if response.status_code != 201:
+            return results
+        team_id = response.get_json()["team_id"]
+        result, response = timed(client, "pilot_create", "post", "/pilots", expect=(201,), headers=headers,
+                                 json={"name": name, "team_id": team_id, "car_number": 900 + n % 100, "price": 10})
+        results.append(result)
+        result, _ = timed(client, "team_rename", "patch", f"/teams/{team_id}", headers=headers,
+                          json={"name": f"{name}-renamed"})
+        results.append(result)
+        if response.status_code == 201:
+            result, _ = timed(client, "pilot_delete", "delete", f"/pilots/{response.get_json()['pilot_id']}",
+                              headers=headers)
+            results.append(result)
+        result, _ = timed(client, "team_delete", "delete", f"/teams/{team_id}", headers=headers)
+        results.append(result)
+        result, _ = timed(client, "user_get", "get", f"/admin/users/{rng.choice(accounts)[0]}", headers=headers)
+        results.append(result)
+        result, _ = timed(client, "audit", "get", "/admin/audit?limit=50", headers=headers)
+        results.append(result)
+        return results
+    return run_load(args.concurrency, args.duration, step, args.seed)
+
+
+# -------------------
+# SSE y Socket.IO
+# -------------------
+def listeners(ctx, args):
+    n, messages = args.listeners, args.messages
+    sse_latencies, ws_latencies = [], []
+    lock = threading.Lock()
+    stop = threading.Event()
+    ready = threading.Barrier(n + 1)
+
+    def sse_client():
+        response = main.app.test_client().get("/sse", buffered=False)
+        ready.wait()
+        local, buffer = [], ""
+        for chunk in response.response:
+            now = time.perf_counter()
+            buffer += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+            *frames, buffer = buffer.split("\n\n")
+            for frame in frames:
+                data = next((line[6:] for line in frame.split("\n") if line.startswith("data: ")), None)
+                payload = json.loads(data) if data else {}
+                if payload.get("type") == "bench":
+                    local.append((now - payload["sent"]) * 1000)
+            if stop.is_set():
+                break
+        response.close()
+        with lock:
+            sse_latencies.extend(local)
+
+    sse_threads = [threading.Thread(target=sse_client, daemon=True) for _ in range(n)]
+    for t in sse_threads:
+        t.start()
+    ws_clients = []
+    for _ in range(n):
+        client = main.socketio.test_client(main.app)
+        client.emit("subscribe", {"topics": ["pilots"]}, callback=True)
+        client.get_received()
+        ws_clients.append(client)
+    ready.wait()
+
+    received = Counter()
+
+    def ws_poller():
+        while not stop.is_set() or sum(received.values()) < n * messages:
+            now = time.perf_counter()
+            for i, client in enumerate(ws_clients):
+                for packet in client.get_received():
+                    if packet["name"] != "delta":
+                        continue
+                    for change in packet["args"][0]["changes"]:
+                        sent = (change.get("data") or {}).get("sent")
+                        if sent is not None:
+                            ws_latencies.append((now - sent) * 1000)
+                            received[i] += 1
+            if stop.is_set() and time.perf_counter() > stop_deadline[0]:
+                break
+            time.sleep(0.001)
+
+    stop_deadline = [float("inf")]
+    poller = threading.Thread(target=ws_poller, daemon=True)
+    poller.start()
+
+    interval = args.duration / messages
+    publish_ms = []
+    for i in range(messages):
+        t0 = time.perf_counter()
+        main.send_sse({"type": "bench", "seq": i, "sent": t0})
+        main.publish_delta("pilots", f"bench-{i}", main.OP_UPSERT, {"sent": t0})
+        publish_ms.append((time.perf_counter() - t0) * 1000)
+        time.sleep(max(0.0, interval - (time.perf_counter() - t0)))
+
+    # un último evento despierta a los lectores SSE para que vean stop
+    stop_deadline[0] = time.perf_counter() + 5
+    stop.set()
+    main.send_sse({"type": "bench_end"})
+    for t in sse_threads:
+        t.join(timeout=5)
+    poller.join(timeout=10)
+    for client in ws_clients:
+        client.disconnect()
+
+    expected = n * messages
+    return {
+        "requests": len(sse_latencies) + len(ws_latencies),
+        "throughput_rps": (len(sse_latencies) + len(ws_latencies)) / args.duration,
+        "p50_ms": percentile(sse_latencies + ws_latencies, 50),
+        "p99_ms": percentile(sse_latencies + ws_latencies, 99),
+        "errors": 2 * expected - len(sse_latencies) - len(ws_latencies),
+        "publish_p99_ms": percentile(publish_ms, 99),
+        "routes": {
+            "sse": {"count": len(sse_latencies), "expected": expected,
+                    "p50_ms": percentile(sse_latencies, 50), "p99_ms": percentile(sse_latencies, 99)},
+            "socketio": {"count": len(ws_latencies), "expected": expected,
+                         "p50_ms": percentile(ws_latencies, 50), "p99_ms": percentile(ws_latencies, 99)},
+        },
+    }
+
+
+def run_scenario(name, ctx, args):
+    if args.tracemalloc:
+        tracemalloc.start()
+    before = rss_mb()
+    result = globals()[name](ctx, args)
+    result["memory"] = {"rss_mb": rss_mb(), "rss_growth_mb": rss_mb() - before}
+    if args.tracemalloc:
+        result["memory"]["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+
+# -------------------
+# Baseline
+# -------------------
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Lista de regresiones (texto) del reporte contra el baseline"""
+    if report["config"] != baseline["config"]:
+        raise SystemExit(f"el baseline es de otra configuración: {baseline['config']}")
+    regressions = []
+    for name, current in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']:.1f}/s "
+                               f"(baseline {base['throughput_rps']:.1f}/s)")
+        for metric in ("p50_ms", "p99_ms"):
+            now, then = current.get(metric), base.get(metric)
+            if now is not None and then is not None and now > then * (1 + tolerance) and now - then > min_delta_ms:
+                regressions.append(f"{name}: {metric} {now:.2f} (baseline {then:.2f})")
+        growth, base_growth = current["memory"]["rss_growth_mb"], base["memory"]["rss_growth_mb"]
+        if growth > max(base_growth, 0) * (1 + tolerance) + MEMORY_NOISE_MB:
+            regressions.append(f"{name}: memoria +{growth:.1f} MB (baseline +{base_growth:.1f} MB)")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errores (baseline {base['errors']})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="base descartable (se borra entera); sin esto, mongomock")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="segundos por escenario")
+    parser.add_argument("--listeners", type=int, default=200, help="clientes SSE y clientes Socket.IO")
+    parser.add_argument("--messages", type=int, default=50, help="eventos publicados en listeners")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--baseline", help="reporte guardado contra el que comparar")
+    parser.add_argument("--save-baseline", help="guarda el reporte en este archivo")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="empeoramiento relativo tolerado")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="diferencias de latencia menores son ruido")
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    db = connect(args.mongo_uri)
+    main.mongo.db = db
+    admin_id, accounts, team_ids = setup(db, args.users, args.events, args.seed)
+    ctx = {"admin_id": admin_id, "accounts": accounts, "team_ids": team_ids}
+
+    report = {
+        "config": {
+            "database": "mongod" if args.mongo_uri else "mongomock",
+            "users": args.users, "events": args.events, "concurrency": args.concurrency,
+            "duration": args.duration, "listeners": args.listeners, "messages": args.messages,
+        },
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpus": os.cpu_count(), "git": os.popen("git rev-parse --short HEAD 2>/dev/null").read().strip()},
+        "scenarios": {},
+    }
+    for name in scenarios:
+        report["scenarios"][name] = run_scenario(name, ctx, args)
+        summary = {k: report["scenarios"][name][k] for k in ("requests", "throughput_rps", "p50_ms", "p99_ms", "errors")}
+        print(json.dumps({"scenario": name, **summary}), file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        report["regressions"] = regressions
+    print(json.dumps(report, indent=2))
+    for line in regressions:
+        print(f"REGRESIÓN {line}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
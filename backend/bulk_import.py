@@ -0,0 +1,213 @@
+"""
+Importación masiva de pilotos, equipos y resultados desde NDJSON o CSV.
+
+El cuerpo se lee línea a línea desde el stream del request (nunca entero en
+memoria); cada fila se valida al vuelo y se convierte en un UpdateOne con
+upsert sobre la clave natural (car_number, nombre del equipo, evento+piloto).
+Las operaciones se juntan en lotes de batch_size y se aplican con
+bulk_write(ordered=False). Dentro de un lote las filas repetidas con la misma
+clave se colapsan (gana la última), así el upsert no choca consigo mismo.
+"""
+import codecs
+import csv
+import json
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+_TRUE = {"1", "true", "yes", "si", "sí", "x"}
+
+
+def detect_format(content_type, explicit=None):
+    if explicit:
+        if explicit not in (FORMAT_NDJSON, FORMAT_CSV):
+            raise ValueError("format must be ndjson or csv")
+        return explicit
+    return FORMAT_CSV if "csv" in (content_type or "") else FORMAT_NDJSON
+
+
+def read_rows(stream, fmt):
+    """Genera (número de línea, dict) leyendo el stream binario de a una línea"""
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    if fmt == FORMAT_CSV:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, {k.strip(): v.strip() for k, v in row.items() if k and v is not None}
+        return
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        yield line_no, row if isinstance(row, dict) else None
+
+
+def _text(row, field, required=False):
+    value = row.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value in (None, ""):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    return str(value)
+
+
+def _int(row, field, required=False):
+    value = row.get(field)
+    if value in (None, ""):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {field}")
+
+
+def _bool(row, field):
+    value = row.get(field)
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in _TRUE
+
+
+def _oid(value, field):
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise ValueError(f"invalid {field}")
+
+
+# -------------------
+# Parsers: fila → (clave, UpdateOne)
+# -------------------
+def team_parser():
+    def parse(row):
+        name = _text(row, "name", required=True)
+        update = {"$setOnInsert": {"name": name, "logo_url": None, "created_at": datetime.now(timezone.utc)}}
+        base_country = _text(row, "base_country")
+        if base_country is not None:
+            update["$set"] = {"base_country": base_country}
+        return name, UpdateOne({"name": name}, update, upsert=True)
+    return parse
+
+
+def pilot_parser(team_ids):
+    """team_ids: nombre de equipo → _id (los equipos son pocos, se cargan una vez)"""
+    def parse(row):
+        car_number = _int(row, "car_number", required=True)
+        fields = {"name": _text(row, "name", required=True)}
+        team = _text(row, "team")
+        if team is not None:
+            if team not in team_ids:
+                raise ValueError(f"unknown team {team!r}")
+            fields["team_id"] = team_ids[team]
+            fields["team"] = team
+        price = _int(row, "price")
+        if price is not None:
+            fields["price"] = price
+        update = {
+            "$set": fields,
+            "$setOnInsert": {
+                "current_score": 0,
+                "stats": {"podiums": 0, "wins": 0, "DNF": 0},
+                "created_at": datetime.now(timezone.utc),
+            },
+        }
+        return car_number, UpdateOne({"car_number": car_number}, update, upsert=True)
+    return parse
+
+
+def result_parser(pilot_ids, event_exists):
+    """
+    pilot_ids: car_number → _id del piloto.
+    event_exists(oid): True si el evento existe (el llamador lo memoiza).
+    """
+    def parse(row):
+        event_id = _oid(_text(row, "event_id", required=True), "event_id")
+        if not event_exists(event_id):
+            raise ValueError(f"unknown event {event_id}")
+        if row.get("pilot_id"):
+            pilot_id = _oid(row["pilot_id"], "pilot_id")
+        else:
+            car_number = _int(row, "car_number", required=True)
+            if car_number not in pilot_ids:
+                raise ValueError(f"unknown car_number {car_number}")
+            pilot_id = pilot_ids[car_number]
+        dnf = _bool(row, "dnf")
+        position = _int(row, "position", required=not dnf)
+        update = {"$set": {"position": position, "dnf": dnf}}
+        return (event_id, pilot_id), UpdateOne({"event_id": event_id, "pilot_id": pilot_id}, update, upsert=True)
+    return parse
+
+
+# -------------------
+# Importador
+# -------------------
+class BulkImport:
+    def __init__(self, collection, parse, batch_size=1000, max_errors=100):
+        self.collection = collection
+        self.parse = parse
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.summary = {"rows": 0, "batches": 0, "upserted": 0, "modified": 0, "matched": 0, "invalid": 0, "failed": 0}
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.summary["invalid"] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_no, "error": message})
+
+    def run(self, rows, on_batch=None):
+        """
+        Aplica las filas por lotes. on_batch(batch_summary, keys) se llama una
+        vez por lote escrito (auditoría, notificaciones).
+        """
+        batch = {}
+        for line_no, row in rows:
+            self.summary["rows"] += 1
+            if row is None:
+                self.error(line_no, "malformed row")
+                continue
+            try:
+                key, op = self.parse(row)
+            except ValueError as e:
+                self.error(line_no, str(e))
+                continue
+            batch.pop(key, None)
+            batch[key] = op
+            if len(batch) >= self.batch_size:
+                self._write(batch, on_batch)
+                batch = {}
+        if batch:
+            self._write(batch, on_batch)
+        return {**self.summary, "errors": self.errors}
+
+    def _write(self, batch, on_batch):
+        result = {"ops": len(batch), "upserted": 0, "modified": 0, "matched": 0, "failed": 0}
+        try:
+            r = self.collection.bulk_write(list(batch.values()), ordered=False)
+            details = r.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            result["failed"] = len(details.get("writeErrors", []))
+            for err in details.get("writeErrors", [])[:max(0, self.max_errors - len(self.errors))]:
+                self.errors.append({"batch": self.summary["batches"] + 1, "error": err.get("errmsg")})
+        result["upserted"] = details.get("nUpserted", 0)
+        result["modified"] = details.get("nModified", 0)
+        result["matched"] = details.get("nMatched", 0)
+
+        self.summary["batches"] += 1
+        for k in ("upserted", "modified", "matched", "failed"):
+            self.summary[k] += result[k]
+        if on_batch:
+            on_batch({"batch": self.summary["batches"], **result}, list(batch))
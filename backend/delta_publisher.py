@@ -0,0 +1,88 @@
+"""
+Canal de deltas en tiempo real por Socket.IO.
+
+Los cambios se acumulan por tópico durante una ventana (100 ms por defecto)
+y se emiten juntos al room del tópico ("pilots", "teams", "leaderboard",
+"fantasy_team:<id>"). Dentro de la ventana los cambios a la misma entidad se
+colapsan: varias actualizaciones se funden en una y un delete pisa todo lo
+anterior. Un upsert después de un delete sale con "replace": true: el cliente
+reemplaza la entidad en vez de fundir los campos con la que tenía.
+
+Cada lote lleva un número de secuencia por tópico y la época del proceso.
+Si un cliente ve un salto de secuencia (o cambia la época porque reconectó
+contra otro worker) pide un snapshot con el evento "resync".
+"""
+import os
+import threading
+import time
+
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+# cambio masivo: el cliente pide un snapshot del tópico en vez de aplicar diffs
+OP_RELOAD = "reload"
+
+
+class DeltaPublisher:
+    def __init__(self, emit, window=0.1, start_task=None, sleep=time.sleep):
+        """
+        emit(event, payload, room): envía al room (socketio.emit).
+        start_task(fn): corre fn en segundo plano (socketio.start_background_task).
+        """
+        self._emit = emit
+        self.window = window
+        self._start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._seq = {}
+        self._scheduled = False
+        self.epoch = f"{os.getpid()}-{int(time.time())}"
+        self.batches = 0
+        self.collapsed = 0
+
+    def add(self, topic, entity_id, op=OP_UPSERT, data=None):
+        with self._lock:
+            changes = self._pending.setdefault(topic, {})
+            prev = changes.get(entity_id)
+            change = {"op": op, "data": dict(data or {})}
+            if prev is not None:
+                self.collapsed += 1
+                if op == OP_UPSERT and prev["op"] == OP_UPSERT:
+                    prev["data"].update(data or {})
+                    return
+                if op == OP_UPSERT and prev["op"] == OP_DELETE:
+                    # lo que el cliente tenga de antes del delete ya no vale
+                    change["replace"] = True
+            changes[entity_id] = change
+            if not self._scheduled:
+                self._scheduled = True
+                self._start_task(self._flush_later)
+
+    def _flush_later(self):
+        self._sleep(self.window)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+            batches = []
+            for topic, changes in pending.items():
+                seq = self._seq.get(topic, 0) + 1
+                self._seq[topic] = seq
+                batches.append((topic, {
+                    "topic": topic,
+                    "seq": seq,
+                    "epoch": self.epoch,
+                    "changes": [
+                        {"id": entity_id, "op": c["op"], **({"data": c["data"]} if c["data"] else {}),
+                         **({"replace": True} if c.get("replace") else {})}
+                        for entity_id, c in changes.items()
+                    ],
+                }))
+        for topic, payload in batches:
+            self.batches += 1
+            self._emit("delta", payload, topic)
+
+    def seq(self, topic):
+        return self._seq.get(topic, 0)
@@ -0,0 +1,244 @@
+"""
+Bus de mensajes entre procesos del backend.
+
+Con varios workers cada uno tiene sus propios clientes SSE y Socket.IO, así
+que los eventos se publican en el bus y cada worker los reenvía a los suyos.
+Todo lo que se publica vuelve por el bus también al worker que lo originó,
+de modo que el camino es el mismo con uno o con varios procesos.
+
+Implementaciones (elegidas por EVENT_BUS_URL):
+  local://              en el mismo proceso (desarrollo / un solo worker)
+  unix:///ruta/socket   broker por Unix socket que corre en el proceso
+                        maestro de serve.py (o suelto con UnixSocketBroker)
+
+Cada mensaje lleva un número de secuencia asignado en un único lugar (el
+bus local o el broker), que se usa como id de evento SSE: así Last-Event-ID
+sirve aunque el cliente reconecte contra otro worker.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+# los logs van por la cola de log_pipeline (no por el bus): loguear acá no se realimenta
+logger = logging.getLogger("event_bus")
+
+
+class LocalBus:
+    def __init__(self):
+        self._handlers = []
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler):
+        """handler(channel, message, key, seq)"""
+        self._handlers.append(handler)
+
+    def start(self):
+        return self
+
+    def publish(self, channel, message, key=None):
+        with self._lock:
+            seq = next(self._seq)
+        self._dispatch(channel, message, key, seq)
+
+    def _dispatch(self, channel, message, key, seq):
+        for handler in self._handlers:
+            try:
+                handler(channel, message, key, seq)
+            except Exception:
+                logger.exception("bus: falló el handler del canal %s", channel)
+
+    def close(self):
+        pass
+
+
+class UnixSocketBus(LocalBus):
+    """Cliente del broker: publica por el socket y despacha lo que recibe"""
+
+    def __init__(self, path, reconnect_delay=0.5):
+        super().__init__()
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._reader = None
+        self._closed = False
+
+    def start(self):
+        if self._reader is None:
+            # Si el broker todavía no está, el hilo lector sigue reintentando
+            self._connect(attempts=10)
+            self._reader = threading.Thread(target=self._read_loop, name="event-bus", daemon=True)
+            self._reader.start()
+        return self
+
+    def _connect(self, attempts=None):
+        tries = itertools.count() if attempts is None else range(attempts)
+        for _ in tries:
+            if self._closed:
+                return
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+                self._sock = sock
+                return
+            except OSError:
+                sock.close()
+                time.sleep(self.reconnect_delay)
+
+    def publish(self, channel, message, key=None):
+        frame = (json.dumps({"c": channel, "m": message, "k": key}, default=str) + "\n").encode("utf-8")
+        with self._send_lock:
+            try:
+                if self._sock is None:
+                    raise OSError("not connected")
+                self._sock.sendall(frame)
+                return
+            except OSError:
+                pass
+        # Sin broker: al menos se entrega a los clientes de este proceso
+        super().publish(channel, message, key)
+
+    def _read_loop(self):
+        while not self._closed:
+            sock = self._sock
+            if sock is None:
+                self._connect()
+                continue
+            try:
+                for line in sock.makefile("rb"):
+                    frame = json.loads(line)
+                    self._dispatch(frame["c"], frame["m"], frame.get("k"), frame["s"])
+            except (OSError, ValueError) as e:
+                logger.warning("bus: desconectado del broker (%s), se reconecta", e)
+            with self._send_lock:
+                self._sock = None
+            time.sleep(self.reconnect_delay)
+
+    def close(self):
+        self._closed = True
+        if self._sock is not None:
+            self._sock.close()
+
+
+class _BrokerClient:
+    """Conexión de un worker con su propia cola de salida y su hilo escritor"""
+
+    def __init__(self, conn, max_pending):
+        self.conn = conn
+        self.pending = queue.Queue(max_pending)
+        self.dropped = False
+
+    def drop(self):
+        """Corta la conexión: el lector sale de su loop y el escritor del suyo"""
+        if self.dropped:
+            return
+        self.dropped = True
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.pending.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class UnixSocketBroker:
+    """
+    Retransmite cada línea a todos los clientes, numerándolas en orden. El
+    envío no se hace bajo el lock: cada cliente tiene una cola acotada y un
+    hilo que escribe; un worker que no lee (cola llena o SEND_TIMEOUT en un
+    envío) se desconecta y reconecta, en vez de frenar a los demás o quedar
+    con una línea cortada a la mitad.
+    """
+
+    SEND_TIMEOUT = 5
+    MAX_PENDING = 10000
+
+    def __init__(self, path):
+        self.path = path
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._server = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(128)
+        threading.Thread(target=self._accept_loop, name="bus-broker", daemon=True).start()
+        return self
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            # un envío trabado más de SEND_TIMEOUT desconecta a ese worker
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack("ll", self.SEND_TIMEOUT, 0))
+            client = _BrokerClient(conn, self.MAX_PENDING)
+            with self._lock:
+                self._clients.add(client)
+            threading.Thread(target=self._write_loop, args=(client,), daemon=True).start()
+            threading.Thread(target=self._client_loop, args=(client,), daemon=True).start()
+
+    def _client_loop(self, client):
+        try:
+            for line in client.conn.makefile("rb"):
+                frame = json.loads(line)
+                with self._lock:
+                    self._seq += 1
+                    frame["s"] = self._seq
+                    out = (json.dumps(frame) + "\n").encode("utf-8")
+                    # sólo encolar bajo el lock: el orden es el mismo en todas las colas
+                    for other in list(self._clients):
+                        try:
+                            other.pending.put_nowait(out)
+                        except queue.Full:
+                            self._clients.discard(other)
+                            other.drop()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+            client.drop()
+            client.conn.close()
+
+    def _write_loop(self, client):
+        while True:
+            out = client.pending.get()
+            if out is None or client.dropped:
+                return
+            try:
+                client.conn.sendall(out)
+            except OSError:
+                # timeout o worker caído: lo que quedó a medio mandar no se completa
+                with self._lock:
+                    self._clients.discard(client)
+                client.drop()
+                return
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def make_bus(url: str):
+    if not url or url.startswith("local://"):
+        return LocalBus()
+    if url.startswith("unix://"):
+        return UnixSocketBus(url[len("unix://"):])
+    raise ValueError(f"unsupported EVENT_BUS_URL: {url}")
@@ -0,0 +1,272 @@
+"""
+Ciclo de vida de los eventos: scheduled → locked → live → finished → published.
+
+Cada evento tiene sus horarios a partir de start_at (o de lock_at / end_at si
+el documento los trae):
+  locked    start_at - lock_before    se congelan todos los rosters
+  live      start_at
+  finished  end_at (start_at + duration)
+  published end_at + publish_after    se puntúa y se liberan los rosters;
+                                      sin resultados se reintenta cada
+                                      `retry` segundos hasta publish_timeout
+
+Las transiciones pendientes viven en un heap de timers (heapq) y el hilo del
+scheduler duerme hasta la próxima; no se recorre la colección periódicamente.
+Con varios procesos sólo trabaja el que tiene el lease (documento en
+`leases` con vencimiento que el dueño renueva); los demás reintentan tomarlo
+cada lease_ttl/3 y, al conseguirlo, reconstruyen el heap desde `events` con
+una sola consulta sobre el índice (status, start_at).
+
+Cada transición es un update condicional sobre el status anterior, así que
+aunque dos procesos se crean dueños a la vez sólo uno la aplica (y sólo ese
+dispara los efectos). El congelamiento es un único update_many que agrega el
+evento a fantasy_teams.locked_by; RosterService rechaza cambios mientras
+esa lista no esté vacía.
+"""
+import heapq
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("event_scheduler")
+
+SCHEDULED, LOCKED, LIVE, FINISHED, PUBLISHED = "scheduled", "locked", "live", "finished", "published"
+NEXT_STATUS = {SCHEDULED: LOCKED, LOCKED: LIVE, LIVE: FINISHED, FINISHED: PUBLISHED}
+# estados en los que los rosters están congelados
+LOCKED_STATUSES = (LOCKED, LIVE, FINISHED)
+
+LEASE_NAME = "event_scheduler"
+_PROJECTION = {"name": 1, "start_at": 1, "lock_at": 1, "end_at": 1, "status": 1}
+
+
+def _epoch(dt):
+    # pymongo devuelve datetimes naive en UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def freeze_rosters(db, event_id):
+    return db.fantasy_teams.update_many({}, {"$addToSet": {"locked_by": event_id}}).modified_count
+
+
+def release_rosters(db, event_id):
+    return db.fantasy_teams.update_many({"locked_by": event_id}, {"$pull": {"locked_by": event_id}}).modified_count
+
+
+class EventScheduler:
+    def __init__(self, get_db, publish, notify, lock_before=3600, duration=7200, publish_after=1800,
+                 publish_timeout=48 * 3600, retry=300, lease_ttl=30, start_task=None, clock=time.time):
+        """
+        publish(event_id): puntúa el evento (devuelve el resumen; puede levantar
+        excepción y se reintenta). notify(event, old, new, summary): avisos.
+        """
+        self._get_db = get_db
+        self.publish = publish
+        self.notify = notify
+        self.lock_before = lock_before
+        self.duration = duration
+        self.publish_after = publish_after
+        self.publish_timeout = publish_timeout
+        self.retry = retry
+        self.lease_ttl = lease_ttl
+        self._start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self.clock = clock
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.leader = False
+        self._heap = []
+        self._planned = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self.transitions = 0
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    # -------------------
+    # Horarios
+    # -------------------
+    def due(self, event):
+        """(próximo status, epoch en que corresponde) o (None, None) si ya terminó"""
+        status = event.get("status") or SCHEDULED
+        nxt = NEXT_STATUS.get(status)
+        if nxt is None or not event.get("start_at"):
+            return None, None
+        start = _epoch(event["start_at"])
+        end = _epoch(event["end_at"]) if event.get("end_at") else start + self.duration
+        when = {
+            LOCKED: _epoch(event["lock_at"]) if event.get("lock_at") else start - self.lock_before,
+            LIVE: start,
+            FINISHED: end,
+            PUBLISHED: end + self.publish_after,
+        }[nxt]
+        return nxt, when
+
+    def _plan(self, event_id, when):
+        with self._lock:
+            if self._planned.get(event_id) == when:
+                return
+            self._planned[event_id] = when
+            heapq.heappush(self._heap, (when, next(self._seq), event_id))
+        self._wake.set()
+
+    def recover(self):
+        """Reconstruye el heap con los eventos no publicados (una consulta)"""
+        db = self.db
+        with self._lock:
+            self._heap, self._planned = [], {}
+        count = 0
+        for event in db.events.find({"status": {"$ne": PUBLISHED}}, _PROJECTION):
+            if event.get("status") in LOCKED_STATUSES:
+                # idempotente: cubre una caída entre la transición y el congelamiento
+                freeze_rosters(db, event["_id"])
+            nxt, when = self.due(event)
+            if nxt:
+                self._plan(event["_id"], when)
+                count += 1
+        logger.info("scheduler: %d eventos agendados", count)
+        return count
+
+    def reschedule(self, event_id):
+        """El evento cambió (horario, resultados): se reevalúa ya mismo si somos el dueño"""
+        if self.leader:
+            self._plan(event_id, self.clock())
+
+    # -------------------
+    # Lease
+    # -------------------
+    def acquire_lease(self):
+        now = datetime.now(timezone.utc)
+        try:
+            self.db.leases.find_one_and_update(
+                {"_id": LEASE_NAME, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            # lo tiene otro proceso y no venció
+            return False
+
+    def release_lease(self):
+        self.db.leases.delete_one({"_id": LEASE_NAME, "owner": self.owner})
+        self.leader = False
+
+    # -------------------
+    # Bucle
+    # -------------------
+    def start(self):
+        self._start_task(self._run)
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        if self.leader:
+            try:
+                self.release_lease()
+            except Exception:
+                pass
+
+    def _run(self):
+        while not self._stopped:
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("scheduler: error en el ciclo")
+            self._wake.wait(max(0.0, self.next_wake() - self.clock()))
+            self._wake.clear()
+
+    def next_wake(self):
+        renew = self.clock() + self.lease_ttl / 3
+        with self._lock:
+            if self.leader and self._heap:
+                return min(renew, self._heap[0][0])
+        return renew
+
+    def tick(self):
+        """Renueva (o intenta tomar) el lease y aplica lo vencido"""
+        if not self.acquire_lease():
+            if self.leader:
+                logger.warning("scheduler: se perdió el lease")
+            self.leader = False
+            return
+        if not self.leader:
+            self.leader = True
+            self.recover()
+        now = self.clock()
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    return
+                when, _, event_id = heapq.heappop(self._heap)
+                if self._planned.get(event_id) != when:
+                    continue  # entrada vieja: el evento se reagendó
+                del self._planned[event_id]
+            self._fire(event_id, now)
+
+    def _fire(self, event_id, now):
+        event = self.db.events.find_one({"_id": event_id}, _PROJECTION)
+        if event is None:
+            return
+        nxt, when = self.due(event)
+        if nxt is None:
+            return
+        if when > now:
+            self._plan(event_id, when)
+            return
+        if self.advance(event, nxt, now):
+            event["status"] = nxt
+            nxt, when = self.due(event)
+            if nxt:
+                self._plan(event_id, when)
+
+    def advance(self, event, new, now=None):
+        """Aplica una transición. False si no corresponde todavía o la aplicó otro."""
+        db = self.db
+        now = self.clock() if now is None else now
+        old = event.get("status") or SCHEDULED
+        summary = None
+        if new == PUBLISHED:
+            _, due = self.due(event)
+            if db.event_results.find_one({"event_id": event["_id"]}, {"_id": 1}):
+                try:
+                    summary = self.publish(event["_id"])
+                except Exception:
+                    logger.exception("scheduler: falló la publicación de %s", event["_id"])
+                    self._plan(event["_id"], now + self.retry)
+                    return False
+            elif now < due - self.publish_after + self.publish_timeout:
+                self._plan(event["_id"], now + self.retry)
+                return False
+            else:
+                logger.warning("scheduler: %s se cierra sin resultados", event["_id"])
+            # ya puntuado: se liberan los rosters antes de marcarlo publicado
+            release_rosters(db, event["_id"])
+
+        stamp = datetime.fromtimestamp(now, timezone.utc)
+        result = db.events.update_one(
+            {"_id": event["_id"], "status": event.get("status")},
+            {"$set": {"status": new, f"status_at.{new}": stamp}},
+        )
+        if result.modified_count == 0:
+            return False
+        if new == LOCKED:
+            frozen = freeze_rosters(db, event["_id"])
+            summary = {"frozen": frozen}
+        self.transitions += 1
+        logger.info("evento %s: %s → %s", event["_id"], old, new)
+        self.notify(event, old, new, summary)
+        return True
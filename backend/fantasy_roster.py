@@ -0,0 +1,369 @@
+"""
+Alta, baja y transferencias del roster de un fantasy team.
+
+El documento de fantasy_teams es la fuente de verdad del roster:
+    roster:      {<pilot_id>: {"price", "team_id", "added_at"}}
+    size:        cantidad de pilotos
+    spent:       suma de los precios de compra
+    team_counts: {<team_id>: pilotos de ese equipo real}
+    version:     se incrementa con cada cambio
+
+Cada operación es UN solo find_one_and_update cuyo filtro lleva todas las
+reglas (presupuesto, cupo de pilotos, máximo por equipo real, que el piloto
+esté o no en el roster y, si el cliente la manda, la versión esperada). Si dos
+requests compiten, Mongo aplica uno y el otro no matchea: no hay
+read-modify-write ni actualizaciones perdidas. Cuando el filtro no matchea se
+relee el documento sólo para explicar el motivo (404, 409 de versión o 422
+con la regla violada).
+
+team_roster (una fila por piloto, la que lee el motor de puntaje) es una
+proyección del documento y se actualiza a continuación con upserts/deletes
+idempotentes; con transactions=True (replica set) ambas escrituras van en
+una transacción. Sin transacciones, una caída entre las dos deja la
+proyección desfasada: check() la rehace desde el roster embebido. El borrado
+va en dos fases (marca deleting, borra las filas, borra el documento) para
+que el verificador también pueda terminar uno cortado.
+
+Mientras un evento está en curso el equipo tiene su id en locked_by (lo pone
+y lo saca event_scheduler) y ni el roster ni el equipo (rename, baja) se
+pueden tocar (423).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from event_scheduler import LOCKED_STATUSES
+
+logger = logging.getLogger("fantasy_roster")
+
+ACTIVE = {"deleting": {"$ne": True}}
+
+
+class RosterError(Exception):
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+class VersionConflict(RosterError):
+    """El documento cambió desde la versión que tenía el cliente"""
+
+    def __init__(self, current):
+        super().__init__("version conflict", 409)
+        self.current = current
+
+
+def _key(oid):
+    return str(oid) if oid else None
+
+
+# (filtro, verificación en Python para explicar el rechazo, error)
+UNLOCKED = ({"locked_by.0": {"$exists": False}}, lambda d: not d.get("locked_by"), RosterError("rosters are locked", 423))
+
+
+class RosterService:
+    def __init__(self, get_db, budget=100, max_pilots=5, max_per_team=2, default_price=15, transactions=False,
+                 batch_size=1000, start_task=None, sleep=time.sleep):
+        self._get_db = get_db
+        self.budget = budget
+        self.max_pilots = max_pilots
+        self.max_per_team = max_per_team
+        self.default_price = default_price
+        self.transactions = transactions
+        self.batch_size = batch_size
+        self._start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._sleep = sleep
+        self.repaired = 0
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    # -------------------
+    # Equipo
+    # -------------------
+    def create(self, user_id, name):
+        doc = {
+            "name": name,
+            "user_id": user_id,
+            "total_score": 0,
+            "roster": {},
+            "size": 0,
+            "spent": 0,
+            "team_counts": {},
+            "version": 1,
+            # si hay un evento en curso el equipo nace congelado como los demás
+            "locked_by": [e["_id"] for e in self.db.events.find({"status": {"$in": LOCKED_STATUSES}}, {"_id": 1})],
+            "created_at": datetime.now(timezone.utc),
+        }
+        try:
+            doc["_id"] = self.db.fantasy_teams.insert_one(doc).inserted_id
+        except DuplicateKeyError:
+            raise RosterError("user already has a fantasy team", 409)
+        return doc
+
+    def get(self, team_id):
+        doc = self.db.fantasy_teams.find_one({"_id": team_id, **ACTIVE})
+        if doc is None:
+            raise RosterError("fantasy team not found", 404)
+        return doc
+
+    def of_user(self, user_id):
+        doc = self.db.fantasy_teams.find_one({"user_id": user_id, **ACTIVE})
+        if doc is None:
+            raise RosterError("user has no fantasy team", 404)
+        return doc
+
+    def rename(self, team_id, name, version=None):
+        return self._apply(team_id, version, [UNLOCKED], {"$set": {"name": name}}, [])
+
+    def delete(self, team_id, version=None):
+        """Marca el equipo (con las mismas reglas que una escritura), borra sus filas y después el documento"""
+        query = {"_id": team_id, **ACTIVE, **UNLOCKED[0]}
+        if version is not None:
+            query["version"] = version
+        doc = self.db.fantasy_teams.find_one_and_update(query, {"$set": {"deleting": True}}, projection={"roster": 1})
+        if doc is None:
+            self._explain(team_id, version, [UNLOCKED])
+        self.db.team_roster.delete_many({"fantasy_team_id": team_id})
+        self.db.fantasy_teams.delete_one({"_id": team_id})
+        return doc
+
+    # -------------------
+    # Roster
+    # -------------------
+    def pilot(self, pilot_id):
+        """(precio, team_id) vigentes del piloto"""
+        p = self.db.pilots.find_one({"_id": pilot_id}, {"price": 1, "team_id": 1})
+        if p is None:
+            raise RosterError("pilot not found", 404)
+        return int(p.get("price") or self.default_price), p.get("team_id")
+
+    def add(self, team_id, pilot_id, version=None):
+        price, real_team = self.pilot(pilot_id)
+        pid, tk = _key(pilot_id), _key(real_team)
+        rules = [
+            UNLOCKED,
+            ({f"roster.{pid}": {"$exists": False}}, lambda d: pid not in d["roster"], RosterError("pilot already in roster")),
+            ({"size": {"$lt": self.max_pilots}}, lambda d: d["size"] < self.max_pilots, RosterError("roster is full")),
+            ({"spent": {"$lte": self.budget - price}}, lambda d: d["spent"] + price <= self.budget, RosterError("over budget")),
+        ]
+        inc = {"size": 1, "spent": price}
+        if tk:
+            rules.append(self._team_rule(tk))
+            inc[f"team_counts.{tk}"] = 1
+        update = {"$set": {f"roster.{pid}": self._entry(price, real_team)}, "$inc": inc}
+        return self._apply(team_id, version, rules, update, [self._row_upsert(team_id, pilot_id)])
+
+    def remove(self, team_id, pilot_id, version=None):
+        pid = _key(pilot_id)
+        entry = self._current_entry(team_id, pid)
+        rules = [UNLOCKED, self._owned_rule(pid, entry)]
+        inc = {"size": -1, "spent": -entry["price"]}
+        if entry.get("team_id"):
+            inc[f"team_counts.{_key(entry['team_id'])}"] = -1
+        update = {"$unset": {f"roster.{pid}": ""}, "$inc": inc}
+        return self._apply(team_id, version, rules, update, [DeleteOne({"fantasy_team_id": team_id, "pilot_id": pilot_id})])
+
+    def transfer(self, team_id, out_id, in_id, version=None):
+        """Cambia out_id por in_id en una sola escritura (el cupo no cambia)"""
+        if out_id == in_id:
+            raise RosterError("pilot_out and pilot_in must differ", 400)
+        out_key, in_key = _key(out_id), _key(in_id)
+        entry = self._current_entry(team_id, out_key)
+        price, real_team = self.pilot(in_id)
+        delta = price - entry["price"]
+        out_tk, in_tk = _key(entry.get("team_id")), _key(real_team)
+        rules = [
+            UNLOCKED,
+            self._owned_rule(out_key, entry),
+            ({f"roster.{in_key}": {"$exists": False}}, lambda d: in_key not in d["roster"], RosterError("pilot already in roster")),
+            ({"spent": {"$lte": self.budget - delta}}, lambda d: d["spent"] + delta <= self.budget, RosterError("over budget")),
+        ]
+        inc = {"spent": delta}
+        if out_tk != in_tk:
+            if in_tk:
+                rules.append(self._team_rule(in_tk))
+                inc[f"team_counts.{in_tk}"] = 1
+            if out_tk:
+                inc[f"team_counts.{out_tk}"] = -1
+        update = {
+            "$unset": {f"roster.{out_key}": ""},
+            "$set": {f"roster.{in_key}": self._entry(price, real_team)},
+            "$inc": inc,
+        }
+        rows = [DeleteOne({"fantasy_team_id": team_id, "pilot_id": out_id}), self._row_upsert(team_id, in_id)]
+        return self._apply(team_id, version, rules, update, rows)
+
+    # -------------------
+    # Internos
+    # -------------------
+    def _team_rule(self, tk):
+        return (
+            {f"team_counts.{tk}": {"$not": {"$gte": self.max_per_team}}},
+            lambda d: d.get("team_counts", {}).get(tk, 0) < self.max_per_team,
+            RosterError("too many pilots from the same team"),
+        )
+
+    @staticmethod
+    def _owned_rule(pid, entry):
+        # la entrada exacta que se leyó: si otro request la cambió, no matchea
+        return ({f"roster.{pid}": entry}, lambda d: d["roster"].get(pid) == entry, RosterError("pilot not in roster"))
+
+    @staticmethod
+    def _entry(price, real_team):
+        return {"price": price, "team_id": real_team, "added_at": datetime.now(timezone.utc)}
+
+    @staticmethod
+    def _row_upsert(team_id, pilot_id):
+        key = {"fantasy_team_id": team_id, "pilot_id": pilot_id}
+        return UpdateOne(key, {"$setOnInsert": key}, upsert=True)
+
+    def _current_entry(self, team_id, pid):
+        doc = self.db.fantasy_teams.find_one({"_id": team_id}, {f"roster.{pid}": 1})
+        if doc is None:
+            raise RosterError("fantasy team not found", 404)
+        entry = (doc.get("roster") or {}).get(pid)
+        if entry is None:
+            raise RosterError("pilot not in roster")
+        return entry
+
+    def _apply(self, team_id, version, rules, update, rows):
+        query = {"_id": team_id, **ACTIVE}
+        for condition, _, _ in rules:
+            query.update(condition)
+        if version is not None:
+            query["version"] = version
+        update.setdefault("$inc", {})["version"] = 1
+
+        def write(session=None):
+            doc = self.db.fantasy_teams.find_one_and_update(
+                query, update, return_document=ReturnDocument.AFTER, session=session
+            )
+            if doc is not None and rows:
+                self.db.team_roster.bulk_write(rows, ordered=True, session=session)
+            return doc
+
+        if self.transactions:
+            with self.db.client.start_session() as session:
+                doc = session.with_transaction(write)
+        else:
+            doc = write()
+        if doc is None:
+            self._explain(team_id, version, rules)
+        return doc
+
+    def _explain(self, team_id, version, rules):
+        """El filtro no matcheó: levanta el error que corresponde al estado actual"""
+        doc = self.db.fantasy_teams.find_one({"_id": team_id})
+        if doc is None or doc.get("deleting"):
+            raise RosterError("fantasy team not found", 404)
+        if version is not None and doc.get("version") != version:
+            raise VersionConflict(doc.get("version"))
+        doc.setdefault("roster", {})
+        doc.setdefault("size", 0)
+        doc.setdefault("spent", 0)
+        for _, holds, error in rules:
+            if not holds(doc):
+                raise RosterError(str(error), error.status)
+        # cambió entre la escritura y la relectura: el cliente reintenta
+        raise VersionConflict(doc.get("version"))
+
+    # -------------------
+    # Verificador
+    # -------------------
+    def check(self, attempts=3):
+        """
+        Rehace team_roster donde no coincide con el roster embebido y termina
+        los borrados cortados; devuelve cuántas filas se tocaron por motivo.
+
+        Recorre fantasy_teams por lotes (cursor por _id). De cada lote lee
+        primero las filas y después los documentos: una operación que esté
+        entre sus dos escrituras aparece como faltante o sobrante y la
+        corrección es la misma que va a hacer ella (idempotente). Si la versión
+        de un equipo cambia mientras se lo corrige, se vuelve a mirar (hasta
+        `attempts` veces; si sigue cambiando queda para la próxima pasada).
+        """
+        db = self.db
+        fixed = {"deleted": 0, "missing": 0, "extra": 0}
+        for team in db.fantasy_teams.find({"deleting": True}, {"_id": 1}):
+            fixed["deleted"] += db.team_roster.delete_many({"fantasy_team_id": team["_id"]}).deleted_count
+            db.fantasy_teams.delete_one({"_id": team["_id"], "deleting": True})
+
+        last = None
+        while True:
+            query = {"_id": {"$gt": last}} if last else {}
+            ids = [t["_id"] for t in db.fantasy_teams.find(query, {"_id": 1}).sort("_id", 1).limit(self.batch_size)]
+            if not ids:
+                break
+            last = ids[-1]
+            for _ in range(attempts):
+                ids = self._reconcile(db, ids, fixed)
+                if not ids:
+                    break
+        self.repaired += sum(fixed.values())
+        return fixed
+
+    def _reconcile(self, db, ids, fixed):
+        """Corrige las filas de esos equipos; devuelve los que cambiaron de versión en el medio"""
+        rows = {}
+        for r in db.team_roster.find({"fantasy_team_id": {"$in": ids}}, {"fantasy_team_id": 1, "pilot_id": 1}):
+            rows.setdefault(r["fantasy_team_id"], set()).add(r["pilot_id"])
+        ops, versions = [], {}
+        for t in db.fantasy_teams.find({"_id": {"$in": ids}, **ACTIVE}, {"roster": 1, "version": 1}):
+            expected = {ObjectId(pid) for pid in t.get("roster") or {}}
+            current = rows.get(t["_id"], set())
+            if expected == current:
+                continue
+            versions[t["_id"]] = t.get("version")
+            for pilot_id in expected - current:
+                fixed["missing"] += 1
+                ops.append(self._row_upsert(t["_id"], pilot_id))
+            for pilot_id in current - expected:
+                fixed["extra"] += 1
+                ops.append(DeleteOne({"fantasy_team_id": t["_id"], "pilot_id": pilot_id}))
+        if not ops:
+            return []
+        db.team_roster.bulk_write(ops, ordered=False)
+        after = {t["_id"]: t.get("version") for t in db.fantasy_teams.find({"_id": {"$in": list(versions)}}, {"version": 1})}
+        return [team_id for team_id, version in versions.items() if team_id in after and after[team_id] != version]
+
+    def start(self, interval):
+        """Corre check() cada `interval` segundos en segundo plano"""
+        def loop():
+            while True:
+                self._sleep(interval)
+                try:
+                    fixed = self.check()
+                    if any(fixed.values()):
+                        logger.warning("rosters: filas de team_roster corregidas %s", fixed)
+                except Exception:
+                    logger.exception("rosters: falló la verificación")
+        self._start_task(loop)
+        return self
+
+
+def serialize_team(doc, budget):
+    roster = doc.get("roster") or {}
+    return {
+        "_id": str(doc["_id"]),
+        "name": doc.get("name"),
+        "user_id": str(doc["user_id"]) if doc.get("user_id") else None,
+        "total_score": doc.get("total_score", 0),
+        "version": doc.get("version", 0),
+        "budget": budget,
+        "spent": doc.get("spent", 0),
+        "remaining": budget - doc.get("spent", 0),
+        "locked": bool(doc.get("locked_by")),
+        "pilots": [{
+            "pilot_id": pid,
+            "price": e.get("price"),
+            "team_id": _key(e.get("team_id")),
+            "added_at": e["added_at"].isoformat() if e.get("added_at") else None,
+        } for pid, e in roster.items()],
+    }
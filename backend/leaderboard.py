@@ -0,0 +1,307 @@
+"""
+Leaderboard en memoria indexado por posición.
+
+Los fantasy teams se guardan en una SortedList ordenada por (-puntaje, id),
+el mismo orden que el índice (total_score desc, _id) de Mongo. Eso da:
+  - posición de un equipo en O(log n),
+  - top-K y páginas por offset en O(log n + K),
+  - actualización de un puntaje en O(log n).
+
+El estado se persiste como un snapshot binario comprimido (ids, puntajes,
+usuarios y nombres) para no tener que releer toda la colección al arrancar.
+El snapshot lleva la versión del ranking que refleja: el worker que puntúa lo
+escribe y los demás lo cargan en vez de recorrer fantasy_teams cada uno.
+"""
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from array import array
+from itertools import repeat
+
+from sortedcontainers import SortedList
+
+SNAPSHOT_MAGIC = b"TCLB1"
+_EMPTY_HEX = "0" * 24
+# un snapshot roto (escritura cortada, disco lleno) no puede tumbar /leaderboard
+SNAPSHOT_ERRORS = (OSError, ValueError, IndexError, struct.error, zlib.error)
+
+logger = logging.getLogger("leaderboard")
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._sorted = SortedList()
+        self._scores = {}
+        self._names = {}
+        self._users = {}
+        self._by_user = {}
+        self.loaded = False
+        # versión del documento derived_stats "ranking" que refleja la memoria
+        self.version = None
+        self._checked = 0.0
+        self._save_lock = threading.Lock()
+        self._saving = False
+        self._save_again = False
+
+    def __len__(self):
+        return len(self._scores)
+
+    # -------------------
+    # Escritura
+    # -------------------
+    def load(self, rows):
+        """rows: iterable de (team_id, score, name, user_id). Reemplaza todo."""
+        # Se arma fuera del lock: las lecturas siguen atendiéndose durante la recarga
+        scores, names, users, by_user = {}, {}, {}, {}
+        for team_id, score, name, user_id in rows:
+            scores[team_id] = score
+            # "\0" separa los nombres en el snapshot
+            names[team_id] = (name or "").replace("\0", "")
+            if user_id:
+                users[team_id] = user_id
+                by_user[user_id] = team_id
+        ordered = SortedList((-s, t) for t, s in scores.items())
+        with self._lock:
+            self._scores, self._names, self._users, self._by_user = scores, names, users, by_user
+            self._sorted = ordered
+            self.loaded = True
+
+    def set(self, team_id, score, name=None, user_id=None):
+        with self._lock:
+            old = self._scores.get(team_id)
+            if old is not None:
+                self._sorted.remove((-old, team_id))
+            self._scores[team_id] = score
+            self._sorted.add((-score, team_id))
+            if name is not None:
+                self._names[team_id] = name.replace("\0", "")
+            if user_id:
+                self._users[team_id] = user_id
+                self._by_user[user_id] = team_id
+
+    def apply_deltas(self, team_ids, deltas):
+        with self._lock:
+            for team_id, delta in zip(team_ids, deltas):
+                team_id = str(team_id)
+                self.set(team_id, self._scores.get(team_id, 0) + int(delta))
+
+    def remove(self, team_id):
+        with self._lock:
+            score = self._scores.pop(team_id, None)
+            if score is None:
+                return
+            self._sorted.remove((-score, team_id))
+            self._names.pop(team_id, None)
+            user_id = self._users.pop(team_id, None)
+            if user_id and self._by_user.get(user_id) == team_id:
+                del self._by_user[user_id]
+
+    # -------------------
+    # Lectura
+    # -------------------
+    def rank(self, team_id):
+        """Posición (1 = primero) o None si el equipo no existe"""
+        with self._lock:
+            score = self._scores.get(team_id)
+            if score is None:
+                return None
+            return self._sorted.index((-score, team_id)) + 1
+
+    def team_of_user(self, user_id):
+        return self._by_user.get(user_id)
+
+    def page(self, offset=0, limit=50):
+        with self._lock:
+            items = self._sorted[offset:offset + limit]
+            return [self._entry(offset + i + 1, team_id) for i, (_, team_id) in enumerate(items)]
+
+    def around(self, team_id, neighbours=5):
+        """El equipo con `neighbours` posiciones arriba y abajo"""
+        with self._lock:
+            rank = self.rank(team_id)
+            if rank is None:
+                return None, []
+            start = max(0, rank - 1 - neighbours)
+            return rank, self.page(start, 2 * neighbours + 1)
+
+    def _entry(self, rank, team_id):
+        return {
+            "rank": rank,
+            "fantasy_team_id": team_id,
+            "user_id": self._users.get(team_id),
+            "name": self._names.get(team_id) or None,
+            "total_score": self._scores[team_id],
+        }
+
+    # -------------------
+    # Snapshot
+    # -------------------
+    def dumps(self) -> bytes:
+        with self._lock:
+            version = self.version or 0
+            ids = [t for _, t in self._sorted]
+            scores = array("q", map(self._scores.__getitem__, ids))
+            users = bytes.fromhex("".join(map(self._users.get, ids, repeat(_EMPTY_HEX))))
+            names = "\0".join(map(self._names.get, ids, repeat(""))).encode("utf-8")
+        body = b"".join([
+            struct.pack("<qI", version, len(ids)),
+            bytes.fromhex("".join(ids)),
+            scores.tobytes(),
+            users,
+            names,
+        ])
+        return SNAPSHOT_MAGIC + zlib.compress(body, 1)
+
+    def loads(self, data: bytes):
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError("invalid leaderboard snapshot")
+        body = zlib.decompress(data[len(SNAPSHOT_MAGIC):])
+        version, n = struct.unpack_from("<qI", body)
+        pos = 12
+        hex_ids = body[pos:pos + 12 * n].hex()
+        ids = [hex_ids[24 * i:24 * (i + 1)] for i in range(n)]
+        pos += 12 * n
+        scores = array("q")
+        scores.frombytes(body[pos:pos + 8 * n])
+        pos += 8 * n
+        hex_users = body[pos:pos + 12 * n].hex()
+        users = [hex_users[24 * i:24 * (i + 1)] for i in range(n)]
+        pos += 12 * n
+        names = body[pos:].decode("utf-8").split("\0") if n else []
+        self.load(
+            (ids[i], scores[i], names[i] or None, users[i] if users[i] != _EMPTY_HEX else None)
+            for i in range(n)
+        )
+        self.version = version
+
+    def save_snapshot(self, path):
+        """Escribe a un temporal propio y lo renombra: varios workers pueden guardar a la vez"""
+        data = self.dumps()
+        directory, name = os.path.split(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return len(data)
+
+    def persist(self, path, on_saved=None):
+        """
+        save_snapshot para cambios en ráfaga: si ya hay un guardado en curso,
+        ese vuelve a guardar al terminar en vez de escribir uno por cambio.
+        on_saved(version) corre después de cada escritura.
+        """
+        with self._save_lock:
+            if self._saving:
+                self._save_again = True
+                return
+            self._saving = True
+        try:
+            while True:
+                self.save_snapshot(path)
+                if on_saved is not None:
+                    on_saved(self.version)
+                with self._save_lock:
+                    if not self._save_again:
+                        return
+                    self._save_again = False
+        finally:
+            with self._save_lock:
+                self._saving = False
+
+    def load_snapshot(self, path):
+        with open(path, "rb") as f:
+            self.loads(f.read())
+
+    @staticmethod
+    def snapshot_version(path):
+        """Versión del snapshot leyendo sólo el encabezado (None si no hay o está roto)"""
+        try:
+            with open(path, "rb") as f:
+                head = f.read(4096)
+            if not head.startswith(SNAPSHOT_MAGIC):
+                return None
+            body = zlib.decompressobj().decompress(head[len(SNAPSHOT_MAGIC):], 8)
+            return struct.unpack("<q", body)[0]
+        except SNAPSHOT_ERRORS:
+            return None
+
+    # -------------------
+    # Sincronización con Mongo
+    # -------------------
+    def sync(self, db, snapshot_path=None, min_interval=2.0, snapshot_grace=30.0):
+        """
+        Recarga si otro worker publicó puntajes o cambió equipos (subió la
+        versión del ranking). Consulta la versión como mucho cada min_interval
+        segundos. Sólo avanza: leyendo de un secundario atrasado puede verse
+        una versión anterior a la que ya se aplicó en memoria.
+
+        Primero prueba con el snapshot (lo escribe el worker que hizo el
+        cambio). Si todavía no llegó y la versión tiene menos de
+        snapshot_grace segundos, sigue con lo que tiene y vuelve a mirar en la
+        próxima consulta; recién después recorre fantasy_teams.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self._checked < min_interval:
+            return self
+        self._checked = now
+        doc = db.derived_stats.find_one({"key": "ranking"}, {"version": 1, "updated_at": 1})
+        version = (doc or {}).get("version", 0)
+        if self.loaded and self.version is not None and version <= self.version:
+            return self
+        with self._sync_lock:
+            if self.loaded and self.version is not None and version <= self.version:
+                return self
+            was_loaded = self.loaded
+            if snapshot_path:
+                on_disk = self.snapshot_version(snapshot_path)
+                if on_disk is not None and (self.version is None or on_disk > self.version):
+                    try:
+                        self.load_snapshot(snapshot_path)
+                    except SNAPSHOT_ERRORS:
+                        logger.exception("leaderboard: snapshot ilegible, se recarga desde Mongo")
+            if self.version is not None and self.version >= version:
+                return self
+            if was_loaded and _age_seconds((doc or {}).get("updated_at")) < snapshot_grace:
+                return self
+            self.load(rows_from_db(db))
+            self.version = version
+            if snapshot_path:
+                self.save_snapshot(snapshot_path)
+        return self
+
+    def applied(self, version):
+        """Marca como vigente la versión producida por un cambio aplicado en memoria"""
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+
+
+def _age_seconds(when):
+    if when is None:
+        return float("inf")
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - when).total_seconds()
+
+
+def rows_from_db(db):
+    """Itera los fantasy teams con la proyección mínima para el leaderboard"""
+    cursor = db.fantasy_teams.find({}, {"total_score": 1, "name": 1, "user_id": 1}, batch_size=10000)
+    for t in cursor:
+        yield (
+            str(t["_id"]),
+            int(t.get("total_score") or 0),
+            t.get("name"),
+            str(t["user_id"]) if t.get("user_id") else None,
+        )
@@ -0,0 +1,167 @@
+"""
+Telemetría en vivo y puntaje provisorio durante la carrera.
+
+El worker que recibe la telemetría (POST /admin/live/<event_id>) sólo
+acumula el último dato de cada piloto y lo publica en el bus cada
+LIVE_THROTTLE_MS (un DeltaPublisher más, con otra ventana). Todos los workers
+aplican esos lotes a su propia copia de la carrera, así cada uno puede
+calcular lo que necesitan sus clientes (rooms fantasy_team:<id> abiertos
+en ese proceso) sin consultar a Mongo.
+
+Estado de una carrera (RaceState), todo en arrays de NumPy por piloto:
+posición, vuelta, abandono y puntos provisorios. Los rosters están
+congelados mientras el evento está en curso, así que al empezar se cargan
+una sola vez como una matriz dispersa por piloto (CSR: filas de team_roster
+ordenadas por piloto + offsets). Una actualización recalcula los puntos
+sólo de los pilotos tocados (score_rows, la misma tabla que la publicación
+oficial) y suma la diferencia únicamente a las filas de roster de los que
+cambiaron de puntos.
+"""
+import threading
+
+import numpy as np
+
+from scoring import POINTS_BY_POSITION, score_rows
+
+
+class RaceState:
+    def __init__(self, event_id, pilot_ids, roster_pilots, roster_teams, team_ids, laps=None, length_km=None,
+                 points_table=POINTS_BY_POSITION):
+        """
+        pilot_ids / team_ids: ids (str) en el orden de los índices.
+        roster_pilots / roster_teams: índice de piloto y de equipo de cada fila de roster.
+        """
+        self.event_id = event_id
+        self.pilot_ids = list(pilot_ids)
+        self.team_ids = list(team_ids)
+        self.index = {pid: i for i, pid in enumerate(self.pilot_ids)}
+        self.team_index = {tid: j for j, tid in enumerate(self.team_ids)}
+        self.laps = laps
+        self.length_km = length_km
+        self.points_table = points_table
+
+        n = len(self.pilot_ids)
+        self.position = np.zeros(n, dtype=np.int16)
+        self.lap = np.zeros(n, dtype=np.int16)
+        self.dnf = np.zeros(n, dtype=bool)
+        self.points = np.zeros(n, dtype=np.int64)
+        self.team_points = np.zeros(len(self.team_ids), dtype=np.int64)
+
+        roster_pilots = np.asarray(roster_pilots, dtype=np.int64)
+        order = np.argsort(roster_pilots, kind="stable")
+        self.row_team = np.asarray(roster_teams, dtype=np.int64)[order]
+        self.row_start = np.searchsorted(roster_pilots[order], np.arange(n + 1))
+        self.updates = 0
+
+    def apply(self, updates):
+        """
+        updates: iterable de (pilot_id, {"position", "lap", "dnf"}). Devuelve
+        (índices de pilotos tocados, índices de equipos cuyo puntaje cambió).
+        """
+        touched = []
+        for pilot_id, data in updates:
+            i = self.index.get(pilot_id)
+            if i is None:
+                continue
+            if data.get("position") is not None:
+                self.position[i] = data["position"]
+            if data.get("lap") is not None:
+                self.lap[i] = data["lap"]
+            if data.get("dnf") is not None:
+                self.dnf[i] = bool(data["dnf"])
+            touched.append(i)
+        self.updates += len(touched)
+        if not touched:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+        idx = np.unique(np.array(touched, dtype=np.int64))
+        new = score_rows(self.position[idx], self.dnf[idx], self.points_table)[:, 0]
+        delta = new - self.points[idx]
+        self.points[idx] = new
+
+        moved = np.flatnonzero(delta)
+        if len(moved) == 0:
+            return idx, np.array([], dtype=np.int64)
+        starts, ends = self.row_start[idx[moved]], self.row_start[idx[moved] + 1]
+        rows = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        teams = self.row_team[rows]
+        np.add.at(self.team_points, teams, np.repeat(delta[moved], ends - starts))
+        return idx, np.unique(teams)
+
+    def pilot_entry(self, i):
+        entry = {
+            "event_id": self.event_id,
+            "position": int(self.position[i]) or None,
+            "lap": int(self.lap[i]),
+            "dnf": bool(self.dnf[i]),
+            "points": int(self.points[i]),
+        }
+        if self.laps:
+            entry["progress"] = round(min(1.0, int(self.lap[i]) / self.laps), 4)
+        if self.length_km:
+            entry["distance_km"] = round(int(self.lap[i]) * self.length_km, 2)
+        return entry
+
+    def standings(self):
+        # en carrera por posición; sin dato y abandonos al final
+        order = sorted(range(len(self.pilot_ids)),
+                       key=lambda i: (bool(self.dnf[i]), self.position[i] == 0, int(self.position[i])))
+        return [{"pilot_id": self.pilot_ids[i], **self.pilot_entry(i)} for i in order]
+
+    def team_points_of(self, team_id):
+        j = self.team_index.get(team_id)
+        return int(self.team_points[j]) if j is not None else None
+
+
+def load_race(db, event_id, points_table=POINTS_BY_POSITION):
+    """Arma el RaceState de un evento: pilotos, rosters (congelados) y circuito"""
+    event = db.events.find_one({"_id": event_id}, {"circuit_id": 1})
+    if event is None:
+        return None
+    circuit = db.circuits.find_one({"_id": event.get("circuit_id")}, {"laps": 1, "length_km": 1}) or {}
+    pilot_ids = [str(p["_id"]) for p in db.pilots.find({}, {"_id": 1})]
+    pilot_index = {pid: i for i, pid in enumerate(pilot_ids)}
+    team_index, roster_pilots, roster_teams = {}, [], []
+    for row in db.team_roster.find({}, {"_id": 0, "fantasy_team_id": 1, "pilot_id": 1}, batch_size=10000):
+        i = pilot_index.get(str(row["pilot_id"]))
+        if i is None:
+            continue
+        roster_pilots.append(i)
+        roster_teams.append(team_index.setdefault(str(row["fantasy_team_id"]), len(team_index)))
+    return RaceState(str(event_id), pilot_ids, roster_pilots, roster_teams, list(team_index),
+                     circuit.get("laps"), circuit.get("length_km"), points_table)
+
+
+class LiveBoard:
+    """Carreras en curso de este worker (normalmente una)"""
+
+    def __init__(self, loader):
+        """loader(event_id) → RaceState o None"""
+        self._loader = loader
+        self._races = {}
+        self._lock = threading.Lock()
+
+    def race(self, event_id):
+        state = self._races.get(event_id)
+        if state is None:
+            with self._lock:
+                state = self._races.get(event_id)
+                if state is None:
+                    state = self._loader(event_id)
+                    if state is not None:
+                        self._races[event_id] = state
+        return state
+
+    def apply(self, event_id, updates):
+        state = self.race(event_id)
+        if state is None:
+            return None, (), ()
+        with self._lock:
+            pilots, teams = state.apply(updates)
+        return state, pilots, teams
+
+    def end(self, event_id):
+        self._races.pop(event_id, None)
+
+    def races(self):
+        return list(self._races.values())
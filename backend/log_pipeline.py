@@ -0,0 +1,141 @@
+"""
+Logging estructurado y no bloqueante.
+
+Los handlers de la app sólo dejan el LogRecord en una cola acotada
+(QueueHandler, sin formatear); un QueueListener en segundo plano lo formatea
+como una línea JSON y lo escribe. Si la cola se llena se descarta el
+registro y se cuenta, nunca se bloquea al request.
+
+Canales (loggers) con nivel propio:
+- "access" / "werkzeug": una línea por request, con muestreo (LOG_ACCESS_SAMPLE)
+  aplicado antes de encolar, así lo descartado no cuesta nada;
+- "tc2000.events": eventos de negocio (log_action); son los únicos que además
+  se publican en la consola SSE de admin;
+- el resto (root, scoring, read_cache, ...): LOG_LEVEL, o el nivel puntual de
+  LOG_LEVELS="scoring=DEBUG,read_cache=WARNING".
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+ACCESS_LOGGERS = ("access", "werkzeug")
+EVENTS_LOGGER = "tc2000.events"
+
+# atributos estándar de LogRecord: lo demás viene de extra= y va como campo
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada round(1/rate) registros (determinístico, sin random)"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._n = 0
+
+    def filter(self, record):
+        if self.every == 0:
+            return False
+        self._n += 1
+        return self._n % self.every == 0 or record.levelno >= logging.WARNING
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo del request y descarta si la cola está llena"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # el formateo (getMessage, traceback) lo hace el listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    def __init__(self, queue_size=10000, fmt="json", stream=None, filename=None):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_handler = DroppingQueueHandler(self.queue)
+        formatter = JsonFormatter() if fmt == "json" else logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s: %(message)s"
+        )
+        outputs = [logging.StreamHandler(stream or sys.stdout)]
+        if filename:
+            outputs.append(logging.handlers.WatchedFileHandler(filename))
+        for h in outputs:
+            h.setFormatter(formatter)
+        self.outputs = outputs
+        self.listener = logging.handlers.QueueListener(self.queue, *outputs, respect_handler_level=True)
+
+    @property
+    def dropped(self):
+        return self.queue_handler.dropped
+
+    def install(self, level="INFO", access_level="INFO", access_sample=1.0, levels=""):
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        root.addHandler(self.queue_handler)
+        root.setLevel(level)
+
+        for name in ACCESS_LOGGERS:
+            logger = logging.getLogger(name)
+            logger.setLevel(access_level)
+            logger.filters = [f for f in logger.filters if not isinstance(f, SamplingFilter)]
+            if access_sample < 1:
+                logger.addFilter(SamplingFilter(access_sample))
+
+        for item in filter(None, (s.strip() for s in levels.split(","))):
+            name, _, lvl = item.partition("=")
+            logging.getLogger(name.strip()).setLevel(lvl.strip().upper())
+
+        self.listener.start()
+        return self
+
+    def add_output(self, handler):
+        """Handler extra del lado del listener (fuera del hilo del request)"""
+        self.listener.handlers = self.listener.handlers + (handler,)
+
+    def stop(self):
+        self.listener.stop()
+
+
+def from_env():
+    pipeline = LogPipeline(
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+        fmt=os.getenv("LOG_FORMAT", "json"),
+        filename=os.getenv("LOG_FILE") or None,
+    )
+    return pipeline.install(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        access_level=os.getenv("LOG_ACCESS_LEVEL", "INFO").upper(),
+        access_sample=float(os.getenv("LOG_ACCESS_SAMPLE", "0.1")),
+        levels=os.getenv("LOG_LEVELS", ""),
+    )
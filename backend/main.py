@@ -1,18 +1,64 @@
 import os
-import json
+import re
+import base64
+import binascii
+import hmac
+import ipaddress
 import logging
 from datetime import datetime, timedelta, timezone
-from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_pymongo import PyMongo
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
-import bcrypt
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import atexit
+import time
 import jwt
 from functools import wraps
-import queue
 from bson import ObjectId
-import logging
-logging.basicConfig(level=logging.INFO)
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from sse_hub import SSEHub, format_event, parse_last_event_id
+from audit_writer import AuditWriter
+from read_cache import ReadCache
+from scoring import ScoringEngine, ScoringInProgress
+from leaderboard import Leaderboard
+from auth_cache import TTLCache
+from password_pool import PasswordPool, PasswordPoolBusy
+from delta_publisher import DeltaPublisher, OP_DELETE, OP_RELOAD, OP_UPSERT
+from bulk_import import BulkImport, detect_format, pilot_parser, read_rows, result_parser, team_parser
+from static_assets import AssetError, AssetPipeline
+from fantasy_roster import RosterError, RosterService, VersionConflict, serialize_team
+from team_membership import TeamError, TeamMembership
+import rate_limit
+from rate_limit import MemoryStore, RateLimited, RateLimiter, parse_rule
+from event_scheduler import EventScheduler, LIVE, PUBLISHED
+from live_race import LiveBoard, load_race
+from metrics import (
+    BCRYPT_BUCKETS, CONTENT_TYPE as METRICS_CONTENT_TYPE, MongoCommandListener, MongoPoolListener, Registry, SamplingProfiler,
+)
+from mongo_options import from_env as mongo_from_env
+from event_bus import make_bus
+from log_pipeline import EVENTS_LOGGER, from_env as logging_from_env
+from serialization import MSGPACK_MIMETYPES, Compressor, FastJSONProvider, dumps_msgpack, wants_msgpack
+
+# "threading" para desarrollo; serve.py corre los workers con "gevent"
+ASYNC_MODE = os.getenv("ASYNC_MODE", "threading")
+
+# bcrypt en procesos aparte; el fork va antes que cualquier otro hilo
+# (el listener de logs, los monitores de PyMongo): un hijo forkeado con un
+# hilo ajeno a mitad de un lock puede quedar colgado
+password_pool = PasswordPool(
+    workers=int(os.getenv("BCRYPT_WORKERS", str(os.cpu_count() or 1))),
+    max_pending=int(os.getenv("BCRYPT_MAX_PENDING", "0")) or None,
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    executor="gevent" if ASYNC_MODE == "gevent" else "process",
+).start()
+atexit.register(password_pool.shutdown)
+
+# Logs JSON asíncronos (cola + listener en segundo plano); ver log_pipeline.py
+log_pipeline = logging_from_env()
+atexit.register(log_pipeline.stop)
+events_logger = logging.getLogger(EVENTS_LOGGER)
 
 
 
@@ -20,56 +66,361 @@ logging.basicConfig(level=logging.INFO)
 # Configuración
 # -------------------
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
-CORS(app, resources={r"/*": {"origins": "*"}})
+# los cursores y totales de los listados van en headers: el front los tiene que poder leer
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=["X-Next-After", "X-Total-Count", "X-Total-Capped"])
+# gzip/brotli de las respuestas grandes según Accept-Encoding
+compressor = Compressor(
+    min_size=int(os.getenv("COMPRESS_MIN_BYTES", "1024")),
+    gzip_level=int(os.getenv("COMPRESS_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESS_BROTLI_QUALITY", "4")),
+)
 
 app.config["MONGO_URI"] = os.getenv("MONGO_URI", "mongodb://localhost:27017/tc2000_fantasy")
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "supersecretkey")
+# con nginx/apache delante, los archivos los manda el proxy (X-Sendfile)
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "0") == "1"
+
+# Métricas Prometheus en /metrics (el listener mide cada comando de Mongo)
+metrics = Registry()
+http_latency = metrics.histogram(
+    "http_request_duration_seconds", "Latencia por ruta", ("route", "method", "status")
+)
+bcrypt_latency = metrics.histogram(
+    "bcrypt_duration_seconds", "Hash/verificación bcrypt, incluida la espera en el pool", ("op",), BCRYPT_BUCKETS
+)
+rate_limited_total = metrics.counter("rate_limited_total", "Requests rechazados con 429 por límite de tasa", ("rule",))
+
+# Pool, timeouts y compresión del cliente; lecturas pesadas a secundarios y
+# write concern por clase de operación (ver mongo_options.py)
+mongo_client_options, mongo_routing = mongo_from_env(app.config["MONGO_URI"])
+mongo_pool = MongoPoolListener(metrics, mongo_client_options.get("maxPoolSize"))
+mongo = PyMongo(app, event_listeners=[MongoCommandListener(metrics), mongo_pool], **mongo_client_options)
+# después de PyMongo, que instala su propio provider: orjson (ObjectId y fechas
+# nativos) y MessagePack con Accept; ver serialization.py
+app.json = FastJSONProvider(app)
+
+
+def read_db():
+    """Lecturas pesadas: pueden venir de un secundario con staleness acotada"""
+    return mongo_routing.reads(mongo.db)
+
+
+def critical_db():
+    """Rosters, puntaje y scheduler: escrituras con write concern majority"""
+    return mongo_routing.writes(mongo.db, "critical")
+
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
+
+# Límites de tasa: "N/S" = N requests cada S segundos por clave (token bucket).
+# Con varios workers serve.py deja un store en memoria compartida antes del fork.
+RATE_LIMIT_RULES = {
+    "login_ip": "30/60",       # POST /login por IP
+    "login_user": "10/60",     # POST /login por username
+    "register_ip": "10/3600",  # POST /register por IP
+    "user": "600/60",          # cualquier ruta con @auth_required, por usuario (no admins)
+    "transfers": "60/60",      # transferencias de roster por usuario
+}
+rate_limiter = RateLimiter(
+    rate_limit.shared_store or MemoryStore(stripes=int(os.getenv("RATE_LIMIT_STRIPES", "64"))),
+    {name: parse_rule(os.getenv(f"RATE_LIMIT_{name.upper()}", spec)) for name, spec in RATE_LIMIT_RULES.items()},
+    # logins fallidos por username: libres, base, tope y ventana (s)
+    backoff=(
+        int(os.getenv("LOGIN_BACKOFF_FREE", "3")),
+        float(os.getenv("LOGIN_BACKOFF_BASE_S", "1")),
+        float(os.getenv("LOGIN_BACKOFF_CAP_S", "900")),
+        float(os.getenv("LOGIN_BACKOFF_WINDOW_S", "900")),
+    ),
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "1") == "1",
+)
+
+# Hub de difusión SSE (un buffer acotado por cliente + replay compartido)
+sse_hub = SSEHub(
+    subscriber_buffer=int(os.getenv("SSE_SUBSCRIBER_BUFFER", "256")),
+    replay_size=int(os.getenv("SSE_REPLAY_SIZE", "1000")),
+    policy=os.getenv("SSE_SLOW_POLICY", "drop_oldest"),
+)
+
+# Bus entre workers: SSE y Socket.IO se publican acá y cada proceso los
+# reenvía a sus propios clientes
+event_bus = make_bus(os.getenv("EVENT_BUS_URL", "local://"))
+
+
+def on_bus_message(channel, message, key, seq):
+    if channel == "sse":
+        sse_hub.publish(message, coalesce_key=key, event_id=seq)
+    elif channel == "socketio":
+        socketio.emit(message["event"], message["data"])
+    elif channel == "cache":
+        read_cache.bump_collection(message["collection"])
+    elif channel == "user":
+        user_cache.invalidate(message["user_id"])
+        user_counts.clear()
+    elif channel == "delta":
+        delta_publisher.add(message["topic"], message["id"], message["op"], message.get("data"))
+    elif channel == "leaderboard":
+        socketio.start_background_task(fantasy_team_deltas)
+    elif channel == "live":
+        apply_live(message)
+    elif channel == "live_end":
+        live_board.end(message["event_id"])
+    elif channel == "schedule":
+        event_scheduler.reschedule(ObjectId(message["event_id"]))
+    elif channel == "fantasy_team":
+        apply_fantasy_team(message)
+
+
+def broadcast(event, message: dict):
+    """socketio.emit a los clientes de todos los workers"""
+    event_bus.publish("socketio", {"event": event, "data": message})
+
+
+def publish_delta(topic, entity_id, op=OP_UPSERT, data=None):
+    """Cambio de una entidad para el canal de deltas (rooms por tópico) de todos los workers"""
+    event_bus.publish("delta", {"topic": topic, "id": entity_id, "op": op, "data": data})
+
+
+def invalidate_collection(collection):
+    """Invalida el cache de lectura acá y en los demás workers"""
+    read_cache.bump_collection(collection)
+    event_bus.publish("cache", {"collection": collection})
+
+
+# Escritor del audit_log en segundo plano (lotes con insert_many)
+audit_writer = AuditWriter(
+    lambda: mongo_routing.writes(mongo.db, "audit").audit_log,
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "200")),
+    flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5")),
+    max_buffer=int(os.getenv("AUDIT_MAX_BUFFER", "10000")),
+).register_atexit()
+
+# Cache de lectura de /pilots y /teams (los pilotos muestran el nombre del equipo)
+read_cache = ReadCache(
+    max_age=float(os.getenv("CACHE_MAX_AGE", "5")),
+    dependencies={"pilots": ("pilots",), "teams": ("pilots", "teams")},
+    # armado desde un secundario, el listado puede ser anterior al último bump
+    always_expire=mongo_routing.secondary_reads,
+)
+if os.getenv("CACHE_CHANGE_STREAM", "1") == "1":
+    read_cache.watch(mongo.db, ["pilots", "teams"])
+
+# Tokens verificados (hasta su exp) y perfiles mínimos de usuario
+token_cache = TTLCache(maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")))
+user_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_USER_CACHE_TTL", "30")),
+)
+# Totales de /admin/users por filtro: estimación cacheada, no un conteo por request
+user_counts = TTLCache(maxsize=256, ttl=float(os.getenv("USER_COUNT_TTL", "60")))
+
+# Leaderboard en memoria; el motor de puntaje le aplica los deltas directamente
+leaderboard = Leaderboard()
+LEADERBOARD_SNAPSHOT = os.getenv("LEADERBOARD_SNAPSHOT", os.path.join(os.path.dirname(__file__), "leaderboard.snapshot"))
+# si un worker muere puntuando, otro puede retomar el evento pasado el lease
+scoring_engine = ScoringEngine(critical_db, on_team_deltas=leaderboard.apply_deltas,
+                               lease_seconds=float(os.getenv("SCORING_LEASE_S", "300")))
+
+# Rosters: reglas en el filtro de una única escritura condicional por operación
+roster_service = RosterService(
+    critical_db,
+    budget=int(os.getenv("FANTASY_BUDGET", "100")),
+    max_pilots=int(os.getenv("FANTASY_MAX_PILOTS", "5")),
+    max_per_team=int(os.getenv("FANTASY_MAX_PER_TEAM", "2")),
+    default_price=int(os.getenv("FANTASY_DEFAULT_PRICE", "15")),
+    transactions=os.getenv("ROSTER_TRANSACTIONS", "0") == "1",
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep,
+)
+
+# Pilotos ↔ equipos: nombre del equipo copiado en cada piloto, mantenido por
+# rename/borrado y por un verificador periódico
+team_membership = TeamMembership(
+    lambda: mongo.db,
+    transactions=os.getenv("TEAM_TRANSACTIONS", "0") == "1",
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep,
+)
+
+# Ciclo de vida de eventos (heap de timers; sólo actúa el worker con el lease)
+event_scheduler = EventScheduler(
+    critical_db,
+    publish=lambda event_id: score_event(event_id),
+    notify=lambda event, old, new, summary: notify_event_status(event, old, new, summary),
+    lock_before=int(os.getenv("EVENT_LOCK_BEFORE_MIN", "60")) * 60,
+    duration=int(os.getenv("EVENT_DURATION_MIN", "120")) * 60,
+    publish_after=int(os.getenv("EVENT_PUBLISH_AFTER_MIN", "30")) * 60,
+    publish_timeout=int(os.getenv("EVENT_PUBLISH_TIMEOUT_H", "48")) * 3600,
+    retry=int(os.getenv("EVENT_PUBLISH_RETRY_S", "300")),
+    lease_ttl=int(os.getenv("SCHEDULER_LEASE_S", "30")),
+    start_task=socketio.start_background_task,
+)
+
+# Deltas por Socket.IO: se juntan durante DELTA_WINDOW_MS y se emiten por room
+delta_publisher = DeltaPublisher(
+    lambda event, payload, room: socketio.emit(event, payload, to=room),
+    window=int(os.getenv("DELTA_WINDOW_MS", "100")) / 1000.0,
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep,
+)
+
+# Telemetría en vivo: el worker que la recibe la junta por piloto y la pasa al
+# bus cada LIVE_THROTTLE_MS; cada worker mantiene su copia de la carrera
+live_ingest = DeltaPublisher(
+    lambda _event, payload, topic: event_bus.publish("live", payload),
+    window=int(os.getenv("LIVE_THROTTLE_MS", "250")) / 1000.0,
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep,
+)
+live_board = LiveBoard(lambda event_id: load_race(mongo.db, ObjectId(event_id), scoring_engine.points_table))
+live_events = TTLCache(maxsize=64, ttl=float(os.getenv("LIVE_STATUS_TTL", "1")))
+
+# Estáticos con hash en el nombre + gzip/brotli precomprimidos; miniaturas de logos
+asset_pipeline = AssetPipeline(
+    app.static_folder,
+    os.getenv("STATIC_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".static_cache")),
+    uploads_dir=os.getenv("UPLOADS_DIR"),
+).build()
+
+@metrics.collector
+def component_metrics():
+    sse = sse_hub.stats()
+    pool = password_pool.stats()
+    return [
+        ("sse_subscribers", "gauge", "Clientes SSE conectados", sse["subscribers"]),
+        ("sse_queue_max_depth", "gauge", "Mensajes pendientes del cliente SSE más atrasado", sse["max_depth"]),
+        ("sse_dropped", "gauge", "Mensajes descartados por clientes lentos (conectados)", sse["dropped"]),
+        ("sse_published_total", "counter", "Mensajes publicados en el hub SSE", sse["published"]),
+        ("audit_enqueued_total", "counter", "Registros de auditoría encolados", audit_writer.metrics["enqueued"]),
+        ("audit_written_total", "counter", "Registros de auditoría escritos", audit_writer.metrics["written"]),
+        ("audit_failed_total", "counter", "Registros de auditoría rechazados", audit_writer.metrics["failed"]),
+        ("audit_queue_depth", "gauge", "Registros de auditoría en memoria", audit_writer.depth()),
+        ("audit_last_flush_seconds", "gauge", "Duración del último flush", audit_writer.metrics["last_flush_ms"] / 1000),
+        ("bcrypt_pending", "gauge", "Operaciones bcrypt en el pool", pool["pending"]),
+        ("bcrypt_rejected_total", "counter", "Operaciones bcrypt rechazadas con 429", pool["rejected"]),
+        ("read_cache_hits_total", "counter", "Aciertos del cache de /pilots y /teams", read_cache.hits),
+        ("read_cache_misses_total", "counter", "Fallos del cache de /pilots y /teams", read_cache.misses),
+        ("auth_token_cache_hits_total", "counter", "Aciertos del cache de tokens", token_cache.hits),
+        ("auth_user_cache_hits_total", "counter", "Aciertos del cache de perfiles", user_cache.hits),
+        ("leaderboard_teams", "gauge", "Fantasy teams en el leaderboard en memoria", len(leaderboard)),
+        ("delta_batches_total", "counter", "Lotes de deltas emitidos por Socket.IO", delta_publisher.batches),
+        ("delta_collapsed_total", "counter", "Cambios colapsados dentro de un lote", delta_publisher.collapsed),
+        ("live_updates_total", "counter", "Actualizaciones de telemetría aplicadas", sum(r.updates for r in live_board.races())),
+        ("live_batches_total", "counter", "Lotes de telemetría publicados en el bus", live_ingest.batches),
+        ("team_membership_repaired_total", "counter", "Pilotos corregidos por el verificador de equipos", team_membership.repaired),
+        ("roster_repaired_total", "counter", "Filas de team_roster corregidas por el verificador de rosters", roster_service.repaired),
+        ("log_queue_depth", "gauge", "Registros de log pendientes de escribir", log_pipeline.queue.qsize()),
+        ("log_dropped_total", "counter", "Registros de log descartados con la cola llena", log_pipeline.dropped),
+        ("http_compressed_responses_total", "counter", "Respuestas comprimidas con gzip/brotli", compressor.compressed),
+        ("http_compression_saved_bytes_total", "counter", "Bytes ahorrados por la compresión de respuestas", compressor.saved_bytes),
+    ]
+
+
+# Con todo lo anterior creado, recién ahora se empiezan a recibir mensajes
+event_bus.subscribe(on_bus_message)
+event_bus.start()
+if os.getenv("EVENT_SCHEDULER", "1") == "1":
+    event_scheduler.start()
+    atexit.register(event_scheduler.stop)
+TEAM_CHECK_INTERVAL = float(os.getenv("TEAM_CHECK_INTERVAL_S", "600"))
+if TEAM_CHECK_INTERVAL > 0:
+    team_membership.start(TEAM_CHECK_INTERVAL)
+# sin transacciones, team_roster puede quedar desfasado del roster embebido tras una caída
+ROSTER_CHECK_INTERVAL = float(os.getenv("ROSTER_CHECK_INTERVAL_S", "0" if roster_service.transactions else "600"))
+if ROSTER_CHECK_INTERVAL > 0:
+    roster_service.start(ROSTER_CHECK_INTERVAL)
 
-mongo = PyMongo(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+# -------------------
+# Utils
+# -------------------
+def hash_password(password: str) -> bytes:
+    with bcrypt_latency.time("hash"):
+        return password_pool.hash(password)
 
-# Cola para SSE
-sse_queue = queue.Queue(maxsize=100)
 
-# Handler personalizado para capturar logs del servidor
-class SSELogHandler(logging.Handler):
-    def emit(self, record):
-        try:
-            log_message = record.getMessage()
-            msg = {
-                "type": "server",
-                "message": log_message,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
-            try:
-                # No bloquear JAMÁS
-                sse_queue.put_nowait(msg)
-            except queue.Full:
-                # Si la cola está llena, descartar el mensaje
-                pass
+def check_password(password: str, hashed: bytes) -> bool:
+    with bcrypt_latency.time("check"):
+        return password_pool.check(password, hashed)
 
-        except Exception as e:
-            print(f"Error en SSELogHandler: {e}")
 
-# --------------------
-# Logging Werkzeug → SSE
-# --------------------
-server_logger = logging.getLogger()
-server_logger.setLevel(logging.INFO)
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(e):
+    response = jsonify({"error": "too many requests, retry later"})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
 
-if not any(isinstance(h, SSELogHandler) for h in server_logger.handlers):
-    server_logger.addHandler(SSELogHandler())
 
+@app.errorhandler(RateLimited)
+def rate_limited_error(e):
+    rate_limited_total.inc(e.rule)
+    response = jsonify({"error": "too many requests, retry later"})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
 
-# -------------------
-# Utils
-# -------------------
-def hash_password(password: str) -> bytes:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
 
+def parse_networks(value):
+    """CIDRs separados por coma (una IP sola vale como /32 o /128)"""
+    return [ipaddress.ip_network(net.strip(), strict=False) for net in value.split(",") if net.strip()]
 
-def check_password(password: str, hashed: bytes) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed)
+
+def in_networks(addr, networks):
+    try:
+        addr = ipaddress.ip_address(addr or "")
+    except ValueError:
+        return False
+    return any(addr in net for net in networks)
+
+
+# Proxies (nginx, balanceador) cuyo X-Forwarded-For se cree. Sin esto, detrás
+# del proxy todos los clientes comparten la IP del proxy y sus límites de tasa
+TRUSTED_PROXIES = parse_networks(os.getenv("TRUSTED_PROXIES", ""))
+
+
+def client_ip():
+    """
+    IP del cliente. Si el par es un proxy de confianza, el último salto de
+    X-Forwarded-For que no sea otro proxy de confianza (los de más a la
+    izquierda los escribe el cliente y no valen).
+    """
+    addr = request.remote_addr
+    if not TRUSTED_PROXIES or not in_networks(addr, TRUSTED_PROXIES):
+        return addr
+    route = request.access_route
+    for hop in reversed(route):
+        if not in_networks(hop, TRUSTED_PROXIES):
+            return hop
+    return route[0] if route else addr
+
+
+def rate_limited(rule, key=client_ip):
+    """Aplica la regla antes de la vista (debajo de @auth_required si la clave es el usuario)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            rate_limiter.hit(rule, key())
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@app.errorhandler(RosterError)
+def roster_error(e):
+    body = {"error": str(e)}
+    if isinstance(e, VersionConflict):
+        body["version"] = e.current
+    return jsonify(body), e.status
+
+
+@app.errorhandler(TeamError)
+def team_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+@app.errorhandler(AssetError)
+def asset_error(e):
+    return jsonify({"error": str(e)}), e.status
 
 
 def create_jwt(user_id: str, role: str):
@@ -81,6 +432,41 @@ def create_jwt(user_id: str, role: str):
     return jwt.encode(payload, app.config["SECRET_KEY"], algorithm="HS256")
 
 
+def verify_token(token: str) -> dict:
+    """Decodifica el JWT, reutilizando la verificación previa mientras no venza"""
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
+        token_cache.put(token, claims, expires=claims.get("exp"))
+    return claims
+
+
+def get_user_profile(user_id: str):
+    """Perfil mínimo (username, role, is_active) cacheado; None si no existe"""
+    profile = user_cache.get(user_id)
+    if profile is None:
+        user = mongo.db.users.find_one(
+            {"_id": ObjectId(user_id)}, {"username": 1, "role": 1, "is_active": 1, "email": 1}
+        )
+        if not user:
+            return None
+        profile = {
+            "username": user["username"],
+            "email": user.get("email"),
+            "role": user["role"],
+            "is_active": user.get("is_active", True),
+        }
+        user_cache.put(user_id, profile)
+    return profile
+
+
+def invalidate_user(user_id: str):
+    """Perfil cacheado y totales de /admin/users, acá y en los demás workers"""
+    user_cache.invalidate(user_id)
+    user_counts.clear()
+    event_bus.publish("user", {"user_id": user_id})
+
+
 def auth_required(role=None):
     def decorator(f):
         @wraps(f)
@@ -90,16 +476,35 @@ def auth_required(role=None):
                 return jsonify({"error": "missing token"}), 401
 
             try:
-                decoded = jwt.decode(token.split()[1], app.config["SECRET_KEY"], algorithms=["HS256"])
-                request.user_id = decoded["user_id"]
-                request.user_role = decoded["role"]
-
-                if role and decoded["role"] != role:
-                    return jsonify({"error": "insufficient role"}), 403
-
+                decoded = verify_token(token.split()[1])
+                user_id = str(decoded["user_id"])
+            except Exception as e:
+                return jsonify({"error": str(e)}), 401
+            # el límite va antes del perfil: un request rechazado no llega a Mongo
+            claimed_admin = decoded.get("role") == "admin"
+            if not claimed_admin:
+                rate_limiter.hit("user", user_id)
+            try:
+                profile = get_user_profile(user_id)
             except Exception as e:
                 return jsonify({"error": str(e)}), 401
 
+            if profile is None:
+                return jsonify({"error": "user not found"}), 401
+            if not profile["is_active"]:
+                return jsonify({"error": "user is inactive"}), 403
+
+            request.user_id = decoded["user_id"]
+            # El rol vigente es el de la base, no el que quedó en el token
+            request.user_role = profile["role"]
+            request.user = profile
+
+            # un token de admin de alguien que ya no lo es paga el límite acá
+            if claimed_admin and request.user_role != "admin":
+                rate_limiter.hit("user", request.user_id)
+            if role and request.user_role != role:
+                return jsonify({"error": "insufficient role"}), 403
+
             return f(*args, **kwargs)
 
         return wrapper
@@ -108,9 +513,11 @@ def auth_required(role=None):
 
 
 def audit_log(action, resource_type=None, resource_id=None, details=None, result="SUCCESS"):
-    mongo.db.audit_log.insert_one({
-        "who_user_id": getattr(request, "user_id", None),
-        "who_ip": request.remote_addr,
+    """Encola el registro; el AuditWriter lo persiste en lote"""
+    audit_writer.enqueue({
+        # fuera de un request (scheduler) no hay usuario ni IP
+        "who_user_id": getattr(request, "user_id", None) if has_request_context() else None,
+        "who_ip": client_ip() if has_request_context() else None,
         "action": action,
         "resource_type": resource_type,
         "resource_id": resource_id,
@@ -126,7 +533,10 @@ def send_sse(message: dict):
         message["timestamp"] = datetime.now(timezone.utc).isoformat()
     if "type" not in message:
         message["type"] = "info"
-    sse_queue.put(message)
+    key = None
+    if message.get("resource_id"):
+        key = f"{message.get('resource_type')}:{message['resource_id']}"
+    event_bus.publish("sse", message, key)
 
 
 def log_action(action_type="info", message="", resource_type=None, resource_id=None, details=None, result="SUCCESS"):
@@ -141,40 +551,162 @@ def log_action(action_type="info", message="", resource_type=None, resource_id=N
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     
-    # Enviar por SSE
+    # Enviar por SSE: a la consola de admin sólo llegan estos eventos de negocio
     send_sse(log_entry)
+    events_logger.info(message or action_type, extra={
+        "action": action_type, "resource_type": resource_type, "resource_id": resource_id, "result": result,
+    })
     
     # También guardar en base de datos
     audit_log(message or action_type, resource_type, resource_id, details, result)
 
 
 
-def serialize_user(user):
-    """Serializa un usuario para JSON, convirtiendo ObjectId y datetime"""
-    if not user:
-        return None
-    user["_id"] = str(user["_id"])
-    # Convertir datetime a ISO 8601
-    if user.get("last_login") and hasattr(user["last_login"], "isoformat"):
-        user["last_login"] = user["last_login"].isoformat()
-    if user.get("created_at") and hasattr(user["created_at"], "isoformat"):
-        user["created_at"] = user["created_at"].isoformat()
-    # No devolver hash de contraseña
-    user.pop("password_hash", None)
-    user.pop("api_key_enc", None)
-    return user
+# Los secretos (y las claves de búsqueda) no salen de Mongo; ObjectId y fechas los serializa el provider
+USER_PUBLIC_FIELDS = {"password_hash": 0, "api_key_enc": 0, "username_lc": 0, "email_lc": 0}
+
+
+def search_key(value):
+    """username_lc / email_lc: el valor sin mayúsculas, para buscar por prefijo con el índice"""
+    return value.casefold() if isinstance(value, str) else None
+
+def cached_json(name, build, key="", headers=None):
+    """
+    Responde con el JSON (o MessagePack) cacheado de `name`; 304 si el
+    cliente ya lo tiene. El cuerpo comprimido también queda en el cache.
+    """
+    msgpack_out = wants_msgpack()
+    if msgpack_out:
+        key = f"{key}|msgpack"
+    entry = read_cache.get(name, key)
+    if entry is None:
+        generation = read_cache.generation(name)
+        data = build()
+        body = dumps_msgpack(data) if msgpack_out else app.json.dumps_bytes(data)
+        entry = read_cache.put(name, key, body, generation, headers(data) if headers else None)
+
+    encoding = compressor.encoding_for(len(entry.body))
+    if request.if_none_match.contains_weak(entry.etag):
+        response = Response(status=304)
+    else:
+        body = entry.body
+        if encoding:
+            body = entry.variant(encoding, compressor.compress)
+            compressor.count(entry.body, body)
+        response = Response(body, mimetype=MSGPACK_MIMETYPES[0] if msgpack_out else "application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    if entry.headers:
+        response.headers.update(entry.headers)
+    response.set_etag(entry.etag, weak=bool(encoding))
+    response.headers["Cache-Control"] = "no-cache"
+    # el mismo recurso sale en JSON o MessagePack según Accept
+    response.vary.add("Accept")
+    return response
+
+# -------------------
+# Métricas y profiling
+# -------------------
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_MAX_SECONDS = 60
+profiler = SamplingProfiler()
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_latency.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    return compressor.apply(response)
+
+
+# /metrics no es público: lo lee el scraper con METRICS_TOKEN (Bearer), una
+# red de METRICS_ALLOW_NETS (CIDRs separados por coma; vacío por defecto, porque
+# detrás de un proxy local todo llega desde loopback) o un admin con su token.
+# La IP es la de client_ip(): detrás de TRUSTED_PROXIES, la del scraper
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOW_NETS = parse_networks(os.getenv("METRICS_ALLOW_NETS", ""))
+
+
+def metrics_scraper_allowed():
+    auth = request.headers.get("Authorization", "")
+    if METRICS_TOKEN and hmac.compare_digest(auth.encode("utf-8"), f"Bearer {METRICS_TOKEN}".encode("utf-8")):
+        return True
+    return in_networks(client_ip(), METRICS_ALLOW_NETS)
+
+
+def render_metrics():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if metrics_scraper_allowed():
+        return render_metrics()
+    return auth_required(role="admin")(render_metrics)()
+
+
+@app.route("/admin/profile", methods=["POST"])
+@auth_required(role="admin")
+def profile_worker():
+    """
+    Perfil por muestreo del worker que atiende el request durante ?seconds=N
+    (máx. 60) a ?hz=N muestras por segundo. Devuelve pilas en formato folded
+    para flamegraph.pl / speedscope. Sólo con PROFILING_ENABLED=1.
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "profiling is disabled"}), 404
+    seconds = int_arg("seconds", 10, 1, PROFILE_MAX_SECONDS)
+    try:
+        result = profiler.profile(seconds, wait=socketio.sleep, hz=int_arg("hz", 100, 1, 1000))
+    except RuntimeError:
+        return jsonify({"error": "a profile is already running"}), 409
+    log_action("info", f"Profile de {seconds}s ({result['samples']} muestras)", "profile", str(os.getpid()))
+    return Response(profiler.folded(result), mimetype="text/plain",
+                    headers={"X-Profile-Samples": str(result["samples"]), "X-Profile-Pid": str(os.getpid())})
+
 
 # -------------------
 # Index
 # -------------------
 @app.route("/")
 def index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return asset_pipeline.send_page("index.html")
+
+
+@app.route("/index.html")
+@app.route("/admin.html")
+def page():
+    return asset_pipeline.send_page(request.path.lstrip("/"))
+
+
+@app.route("/assets/<path:name>")
+def asset(name):
+    """JS/CSS/imágenes con hash en el nombre: cache inmutable"""
+    return asset_pipeline.send_asset(name)
+
+
+@app.route("/media/<variant>/<path:name>")
+def media(variant, name):
+    """Imágenes subidas: thumb / card (WebP si el cliente lo acepta) u orig"""
+    return asset_pipeline.send_media(variant, name)
 
 # -------------------
 # Auth
 # -------------------
 @app.route("/register", methods=["POST"])
+@rate_limited("register_ip")
 def register():
     data = request.json or {}
     if not data.get("username") or not data.get("password") or not data.get("role"):
@@ -188,6 +720,8 @@ def register():
     user_id = mongo.db.users.insert_one({
         "username": data["username"],
         "email": data.get("email"),
+        "username_lc": search_key(data["username"]),
+        "email_lc": search_key(data.get("email")),
         "password_hash": hashed,
         "role": data["role"],
         "created_at": datetime.now(timezone.utc),
@@ -201,16 +735,27 @@ def register():
 
 
 @app.route("/login", methods=["POST"])
+@rate_limited("login_ip")
 def login():
     data = request.json or {}
-    user = mongo.db.users.find_one({"username": data.get("username")})
+    username = data.get("username")
+    # antes de Mongo y bcrypt: ráfagas por username y backoff tras fallos seguidos
+    rate_limiter.hit("login_user", username)
+    rate_limiter.check_backoff("login", username)
+    user = mongo.db.users.find_one({"username": username})
 
     if not user or not check_password(data.get("password", ""), user.get("password_hash", b"")):
-        log_action("error", f"Intento de login fallido para '{data.get('username')}'", "auth", None)
+        rate_limiter.failure("login", username)
+        log_action("error", f"Intento de login fallido para '{username}'", "auth", None)
         return jsonify({"error": "invalid credentials"}), 401
+    rate_limiter.success("login", username)
 
     token = create_jwt(user["_id"], user["role"])
-    mongo.db.users.update_one({"_id": user["_id"]}, {"$set": {"last_login": datetime.now(timezone.utc)}})
+    update = {"last_login": datetime.now(timezone.utc)}
+    # Si cambió BCRYPT_ROUNDS, se re-hashea con el costo nuevo aprovechando el login
+    if password_pool.needs_rehash(user["password_hash"]):
+        update["password_hash"] = hash_password(data["password"])
+    mongo.db.users.update_one({"_id": user["_id"]}, {"$set": update})
 
     log_action("success", f"Login exitoso: '{user['username']}' ({user['role']})", "auth", str(user["_id"]))
 
@@ -220,39 +765,123 @@ def login():
 # -------------------
 # Pilots CRUD
 # -------------------
+PILOT_FIELDS = ("name", "team", "team_id", "car_number", "current_score", "stats", "created_at", "avatar_png")
+# avatar_png puede traer la imagen embebida: sólo se devuelve si se pide en ?fields=
+PILOT_DEFAULT_FIELDS = tuple(f for f in PILOT_FIELDS if f != "avatar_png")
+PILOTS_MAX_LIMIT = 500
+
+
 @app.route("/pilots", methods=["GET"])
 def list_pilots():
-    pilots = list(mongo.db.pilots.find())
-    teams = {str(t["_id"]): t["name"] for t in mongo.db.teams.find()}
+    """
+    Lista pilotos. Parámetros opcionales:
+      ?after=<id>&limit=N   paginación por cursor (orden por _id)
+      ?fields=name,team     campos a devolver
+      ?team=<id|nombre>     filtra por equipo
+      ?car_number=N         filtra por número de auto
+    """
+    try:
+        query = parse_pilot_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    for p in pilots:
-        p["_id"] = str(p["_id"])
-        if "team_id" in p and p["team_id"]:
-            p["team"] = teams.get(str(p["team_id"]), "sin equipo")
-        else:
-            p["team"] = p.get("team", "sin equipo")
+    def next_cursor(pilots):
+        if query["limit"] and len(pilots) == query["limit"]:
+            return {"X-Next-After": str(pilots[-1]["_id"])}
+        return {}
 
-    return jsonify(pilots)
+    key = request.query_string.decode("utf-8")
+    return cached_json("pilots", lambda: build_pilots(query), key=key, headers=next_cursor)
+
+
+def parse_pilot_query(args):
+    query = {"after": None, "limit": None, "fields": PILOT_DEFAULT_FIELDS, "team": None, "car_number": None}
+
+    if args.get("after"):
+        try:
+            query["after"] = ObjectId(args["after"])
+        except Exception:
+            raise ValueError("invalid after cursor")
+
+    if args.get("limit"):
+        try:
+            query["limit"] = max(1, min(int(args["limit"]), PILOTS_MAX_LIMIT))
+        except ValueError:
+            raise ValueError("invalid limit")
+
+    if args.get("fields"):
+        fields = tuple(f for f in args["fields"].split(",") if f in PILOT_FIELDS)
+        if not fields:
+            raise ValueError("invalid fields")
+        query["fields"] = fields
+
+    if args.get("car_number"):
+        try:
+            query["car_number"] = int(args["car_number"])
+        except ValueError:
+            raise ValueError("invalid car_number")
+
+    query["team"] = args.get("team")
+    return query
+
+
+def build_pilots(query, db=None):
+    db = db or read_db()
+    match = {}
+    if query["after"]:
+        match["_id"] = {"$gt": query["after"]}
+    if query["car_number"] is not None:
+        match["car_number"] = query["car_number"]
+    if query["team"]:
+        try:
+            match["team_id"] = ObjectId(query["team"])
+        except Exception:
+            # por nombre: es la copia que cada piloto tiene del nombre de su equipo
+            match["team"] = query["team"]
+
+    fields = query["fields"]
+    pipeline = [{"$match": match}, {"$sort": {"_id": 1}}]
+    if query["limit"]:
+        pipeline.append({"$limit": query["limit"]})
+
+    # ObjectId y fechas salen tal cual: los serializa el provider JSON
+    project = {"_id": 1}
+    for f in fields:
+        project[f] = 1
+
+    if "team" in fields:
+        # sin join: el nombre está copiado en el piloto (ver team_membership.py)
+        project["team"] = {"$ifNull": ["$team", "sin equipo"]}
+
+    pipeline.append({"$project": project})
+    return list(db.pilots.aggregate(pipeline))
 
 
 @app.route("/pilots", methods=["POST"])
 @auth_required(role="admin")
 def create_pilot():
     data = request.json or {}
+    # team_id o nombre de equipo; se guardan los dos (el nombre como copia)
+    membership = team_membership.resolve(data.get("team_id"), data.get("team"))
 
     pilot_id = mongo.db.pilots.insert_one({
         "name": data.get("name"),
-        "team": data.get("team"),
+        **membership,
         "car_number": data.get("car_number"),
+        "price": data.get("price"),
         "current_score": 0,
         "created_at": datetime.now(timezone.utc)
     }).inserted_id
 
+    invalidate_collection("pilots")
     audit_log("pilot_create", "pilots", str(pilot_id), details=data)
 
     msg = {"type": "pilot_created", "pilot_id": str(pilot_id), "name": data.get("name")}
     send_sse(msg)
-    socketio.emit("pilot_created", msg)
+    publish_delta("pilots", str(pilot_id), OP_UPSERT, {
+        "name": data.get("name"), "team": membership["team"], "team_id": str(membership["team_id"]) if membership["team_id"] else None,
+        "car_number": data.get("car_number"), "current_score": 0,
+    })
 
     return jsonify({"pilot_id": str(pilot_id)}), 201
 
@@ -270,11 +899,12 @@ def delete_pilot(pilot_id):
     if result.deleted_count == 0:
         return jsonify({"error": "pilot not found"}), 404
 
+    invalidate_collection("pilots")
     audit_log("pilot_delete", "pilots", pilot_id)
 
     msg = {"type": "pilot_deleted", "pilot_id": pilot_id}
     send_sse(msg)
-    socketio.emit("pilot_deleted", msg)
+    publish_delta("pilots", pilot_id, OP_DELETE)
 
     return jsonify({"ok": True})
 
@@ -284,10 +914,12 @@ def delete_pilot(pilot_id):
 # -------------------
 @app.route("/teams", methods=["GET"])
 def list_teams():
-    teams = list(mongo.db.teams.find())
-    for t in teams:
-        t["_id"] = str(t["_id"])
-    return jsonify(teams)
+    return cached_json("teams", build_teams)
+
+
+def build_teams(db=None):
+    # los logos van por URL (logo_url); nunca se devuelven embebidos
+    return list((db or read_db()).teams.find({"deleting": {"$ne": True}}, {"logo_png": 0, "deleting": 0}))
 
 
 @app.route("/teams", methods=["POST"])
@@ -298,17 +930,18 @@ def create_team():
     team = {
         "name": data.get("name"),
         "base_country": data.get("base_country"),
-        "logo_png": data.get("logo_png"),
+        "logo_url": asset_pipeline.store_logo(data.get("logo_url") or data.get("logo_png")),
         "created_at": datetime.now(timezone.utc)
     }
 
     team_id = mongo.db.teams.insert_one(team).inserted_id
 
+    invalidate_collection("teams")
     audit_log("team_create", "teams", str(team_id), details=data)
 
     msg = {"type": "team_created", "team_id": str(team_id), "name": team["name"]}
     send_sse(msg)
-    socketio.emit("team_created", msg)
+    publish_delta("teams", str(team_id), OP_UPSERT, {"name": team["name"], "base_country": team["base_country"]})
 
     return jsonify({"team_id": str(team_id)}), 201
 
@@ -321,77 +954,191 @@ def delete_team(team_id):
     except:
         return jsonify({"error": "invalid team id"}), 400
 
-    result = mongo.db.teams.delete_one({"_id": oid})
-
-    if result.deleted_count == 0:
-        return jsonify({"error": "team not found"}), 404
-
-    mongo.db.pilots.update_many({"team_id": oid}, {"$set": {"team_id": None}})
+    # el equipo y sus pilotos juntos (transacción o borrado en dos fases)
+    orphans = team_membership.delete(oid)
 
+    invalidate_collection("teams")
     audit_log("team_delete", "teams", team_id)
 
     msg = {"type": "team_deleted", "team_id": team_id}
     send_sse(msg)
-    socketio.emit("team_deleted", msg)
+    publish_delta("teams", team_id, OP_DELETE)
+    for pilot_id in orphans:
+        publish_delta("pilots", str(pilot_id), OP_UPSERT, {"team_id": None, "team": None})
 
     return jsonify({"ok": True})
 
 
+@app.route("/teams/<team_id>", methods=["PATCH"])
+@auth_required(role="admin")
+def update_team(team_id):
+    """Body: {"name"?, "base_country"?}. Un rename actualiza también a los pilotos del equipo."""
+    try:
+        oid = ObjectId(team_id)
+    except:
+        return jsonify({"error": "invalid team id"}), 400
+    data = request.json or {}
+    name = (data.get("name") or "").strip() if "name" in data else None
+    if name == "":
+        return jsonify({"error": "name must not be empty"}), 400
+
+    renamed = team_membership.rename(oid, name) if name else None
+    if "base_country" in data:
+        result = mongo.db.teams.update_one({"_id": oid, "deleting": {"$ne": True}}, {"$set": {"base_country": data["base_country"]}})
+        if result.matched_count == 0:
+            return jsonify({"error": "team not found"}), 404
+    team = mongo.db.teams.find_one({"_id": oid}, {"name": 1, "base_country": 1})
+    if team is None:
+        return jsonify({"error": "team not found"}), 404
+
+    invalidate_collection("teams")
+    audit_log("team_update", "teams", team_id, details=data)
+
+    send_sse({"type": "team_updated", "team_id": team_id, "name": team["name"]})
+    publish_delta("teams", team_id, OP_UPSERT, {"name": team["name"], "base_country": team.get("base_country")})
+    for pilot_id in renamed or ():
+        publish_delta("pilots", str(pilot_id), OP_UPSERT, {"team": name})
+
+    return jsonify({"team_id": team_id, "name": team["name"], "base_country": team.get("base_country")})
+
+
 # -------------------
 # SSE
 # -------------------
 @app.route("/sse")
 def sse_stream():
+    last_event_id = parse_last_event_id(
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    )
+    subscriber = sse_hub.subscribe(last_event_id)
+
     def event_stream():
         try:
             # Enviar mensaje inicial de conexión
-            yield f"data: {json.dumps({'type': 'info', 'message': 'Conectado a logs', 'timestamp': datetime.now(timezone.utc).isoformat()})}\n\n"
-            
+            yield format_event(None, {'type': 'info', 'message': 'Conectado a logs', 'timestamp': datetime.now(timezone.utc).isoformat()})
+
             while True:
-                try:
-                    # Usar timeout para no bloquear indefinidamente
-                    msg = sse_queue.get(timeout=30)
-                    yield f"data: {json.dumps(msg)}\n\n"
-                except queue.Empty:
+                # Usar timeout para no bloquear indefinidamente
+                frames = subscriber.get(timeout=30)
+                if frames:
+                    yield "".join(frames)
+                else:
                     # Si no hay mensajes en 30 segundos, enviar heartbeat
-                    yield f"data: {json.dumps({'type': 'heartbeat', 'message': 'latido', 'timestamp': datetime.now(timezone.utc).isoformat()})}\n\n"
+                    yield format_event(None, {'type': 'heartbeat', 'message': 'latido', 'timestamp': datetime.now(timezone.utc).isoformat()})
         except GeneratorExit:
             # Manejo correcto de cuando el cliente desconecta
             pass
         except Exception as e:
             print(f"Error en SSE: {e}")
             pass
+        finally:
+            subscriber.close()
 
-    return Response(stream_with_context(event_stream()), mimetype="text/event-stream")
+    return Response(stream_with_context(event_stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.route("/me")
 @auth_required()
 def me():
-    try:
-        user = mongo.db.users.find_one({"_id": ObjectId(request.user_id)})
-        if not user:
-            return jsonify({"error": "user not found"}), 404
-
-        return jsonify({
-            "username": user["username"],
-            "role": user["role"]
-        })
-
-    except Exception as e:
-        print("error en /me:", e)
-        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "username": request.user["username"],
+        "role": request.user["role"]
+    })
 
 
 # -------------------
 # Admin Users CRUD
 # -------------------
+USERS_MAX_LIMIT = 200
+# con filtros el total se cuenta hasta acá (alcanza para "más de N")
+USER_COUNT_CAP = int(os.getenv("USER_COUNT_CAP", "10000"))
+
+
 @app.route("/admin/users", methods=["GET"])
 @auth_required(role="admin")
 def list_users():
-    """Lista todos los usuarios"""
-    users = list(mongo.db.users.find())
-    return jsonify([serialize_user(u) for u in users])
+    """
+    Lista usuarios ordenados por username (o por email con ?by=email), sin
+    distinguir mayúsculas. Parámetros opcionales:
+      ?q=<prefijo>          prefijo del username (o del email con by=email), sin
+                            distinguir mayúsculas
+      ?role=admin|user      ?is_active=true|false
+      ?after=<cursor>&limit=N  paginación por cursor sobre el campo de orden
+    El siguiente cursor (opaco) va en X-Next-After y el total (estimado,
+    cacheado) en X-Total-Count; X-Total-Capped indica que hay más de USER_COUNT_CAP.
+    """
+    by = request.args.get("by", "username")
+    if by not in ("username", "email"):
+        return jsonify({"error": "by must be username or email"}), 400
+    query = {}
+    if request.args.get("role"):
+        query["role"] = request.args["role"]
+    if request.args.get("is_active"):
+        value = request.args["is_active"].lower()
+        if value not in ("true", "false", "1", "0"):
+            return jsonify({"error": "is_active must be true or false"}), 400
+        # los usuarios sin el campo cuentan como activos (igual que el admin)
+        query["is_active"] = {"$ne": False} if value in ("true", "1") else False
+
+    # búsqueda y orden sobre la copia sin mayúsculas (username_lc / email_lc),
+    # con _id de desempate: "Bob" y "bob" tienen la misma clave
+    key = f"{by}_lc"
+    condition = {}
+    if request.args.get("q"):
+        # prefijo anclado y sensible a mayúsculas sobre la clave: usa los límites del índice
+        condition["$regex"] = "^" + re.escape(search_key(request.args["q"]))
+    if by == "email":
+        # el email es opcional: sin él no hay cursor posible
+        condition["$type"] = "string"
+    if condition:
+        query[key] = condition
+    total = count_users(query)
+
+    if request.args.get("after"):
+        after = decode_cursor(request.args["after"])
+        if after is None:
+            return jsonify({"error": "invalid after cursor"}), 400
+        value, last_id = after
+        query = {**query, key: {**condition, "$gte": value}, "$nor": [{key: value, "_id": {"$lte": last_id}}]}
+    limit = int_arg("limit", 50, 1, USERS_MAX_LIMIT)
+    users = list(read_db().users.find(query, USER_PUBLIC_FIELDS).sort([(key, 1), ("_id", 1)]).limit(limit))
+
+    headers = {"X-Total-Count": str(total)}
+    if len(users) == limit:
+        headers["X-Next-After"] = encode_cursor(search_key(users[-1][by]), users[-1]["_id"])
+    if total >= USER_COUNT_CAP:
+        headers["X-Total-Capped"] = "true"
+    return jsonify(users), 200, headers
+
+
+def encode_cursor(value, last_id):
+    """(clave, _id) del último usuario; el username/email puede no ser latin-1: va en base64 url-safe"""
+    raw = app.json.dumps_bytes([value, str(last_id)])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(clave, ObjectId) o None si el cursor no es uno de encode_cursor"""
+    try:
+        raw = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True)
+        value, last_id = app.json.loads(raw)
+        if not isinstance(value, str):
+            return None
+        return value, ObjectId(last_id)
+    except (binascii.Error, ValueError, TypeError, InvalidId):
+        return None
+
+
+def count_users(query):
+    """Sin filtros, la estimación de la colección; con filtros, un conteo acotado; cacheado"""
+    key = repr(sorted(query.items()))
+    total = user_counts.get(key)
+    if total is None:
+        users = read_db().users
+        total = users.count_documents(query, limit=USER_COUNT_CAP) if query else users.estimated_document_count()
+        user_counts.put(key, total)
+    return total
 
 
 @app.route("/admin/users", methods=["POST"])
@@ -414,6 +1161,8 @@ def create_user():
     user_id = mongo.db.users.insert_one({
         "username": data["username"],
         "email": data["email"],
+        "username_lc": search_key(data["username"]),
+        "email_lc": search_key(data["email"]),
         "password_hash": hashed,
         "role": data.get("role", "user"),
         "is_active": data.get("is_active", True),
@@ -421,6 +1170,7 @@ def create_user():
         "last_login": None,
         "api_key_enc": None
     }).inserted_id
+    invalidate_user(str(user_id))
     
     log_action("success", f"Usuario '{data['username']}' creado", "users", str(user_id), {"email": data["email"], "role": data.get("role", "user")})
     
@@ -436,12 +1186,12 @@ def get_user(user_id):
     except:
         return jsonify({"error": "invalid user id"}), 400
     
-    user = mongo.db.users.find_one({"_id": oid})
+    user = mongo.db.users.find_one({"_id": oid}, USER_PUBLIC_FIELDS)
     
     if not user:
         return jsonify({"error": "user not found"}), 404
     
-    return jsonify(serialize_user(user))
+    return jsonify(user)
 
 
 @app.route("/admin/users/<user_id>", methods=["PUT"])
@@ -469,8 +1219,10 @@ def update_user(user_id):
     
     if "username" in data:
         update_data["username"] = data["username"]
+        update_data["username_lc"] = search_key(data["username"])
     if "email" in data:
         update_data["email"] = data["email"]
+        update_data["email_lc"] = search_key(data["email"])
     if "role" in data:
         update_data["role"] = data["role"]
     if "is_active" in data:
@@ -481,6 +1233,7 @@ def update_user(user_id):
         update_data["password_hash"] = hash_password(data["password"])
     
     mongo.db.users.update_one({"_id": oid}, {"$set": update_data})
+    invalidate_user(user_id)
     
     log_action("info", f"Usuario '{user['username']}' actualizado", "users", user_id, update_data)
     
@@ -506,25 +1259,694 @@ def delete_user(user_id):
         return jsonify({"error": "user not found"}), 404
     
     result = mongo.db.users.delete_one({"_id": oid})
-    
     if result.deleted_count == 0:
         return jsonify({"error": "failed to delete user"}), 500
+    invalidate_user(user_id)
     
     log_action("warning", f"Usuario '{user['username']}' eliminado", "users", user_id, {"email": user.get("email")})
     
     return jsonify({"message": "user deleted"})
 
 
+# -------------------
+# Auditoría
+# -------------------
+AUDIT_MAX_LIMIT = 500
+AUDIT_FILTERS = {"user": "who_user_id", "action": "action", "resource_type": "resource_type", "result": "result"}
+
+
+def parse_time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def audit_cursor(entry):
+    created_at = entry["created_at"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return f"{int(created_at.timestamp() * 1000)}_{entry['_id']}"
+
+
+def parse_audit_cursor(cursor):
+    ms, oid = cursor.split("_", 1)
+    return datetime.fromtimestamp(int(ms) / 1000, timezone.utc), ObjectId(oid)
+
+
+@app.route("/admin/audit", methods=["GET"])
+@auth_required(role="admin")
+def list_audit():
+    """
+    Registros de auditoría, más nuevos primero. Parámetros opcionales:
+      ?user=<id>&action=..&resource_type=..&result=..   filtros exactos
+      ?since=<ISO 8601>&until=<ISO 8601>                rango de created_at
+      ?after=<cursor>&limit=N                           paginación (cursor en X-Next-After)
+    Cada filtro tiene su índice (filtro, created_at, _id), así que una página
+    cuesta lo mismo con mil registros que con cincuenta millones.
+    """
+    query = {field: request.args[arg] for arg, field in AUDIT_FILTERS.items() if request.args.get(arg)}
+    try:
+        since, until = parse_time_arg("since"), parse_time_arg("until")
+        after = parse_audit_cursor(request.args["after"]) if request.args.get("after") else None
+    except ValueError:
+        return jsonify({"error": "invalid since, until or after"}), 400
+    except Exception:
+        return jsonify({"error": "invalid after cursor"}), 400
+
+    created_at = {}
+    if since:
+        created_at["$gte"] = since
+    if until:
+        created_at["$lt"] = until
+    if created_at:
+        query["created_at"] = created_at
+    if after:
+        query["$or"] = [
+            {"created_at": {"$lt": after[0]}},
+            {"created_at": after[0], "_id": {"$lt": after[1]}},
+        ]
+
+    limit = int_arg("limit", 50, 1, AUDIT_MAX_LIMIT)
+    entries = list(read_db().audit_log.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit))
+
+    headers = {}
+    if len(entries) == limit:
+        headers["X-Next-After"] = audit_cursor(entries[-1])
+    return jsonify(entries), 200, headers
+
+
+# -------------------
+# Eventos: resultados y puntaje
+# -------------------
+@app.route("/admin/events/<event_id>/results", methods=["POST"])
+@auth_required(role="admin")
+def publish_results(event_id):
+    """
+    Carga (o corrige) los resultados de un evento y los puntúa.
+    Body: {"results": [{"pilot_id" | "car_number", "position", "dnf"}]}
+    """
+    try:
+        oid = ObjectId(event_id)
+    except:
+        return jsonify({"error": "invalid event id"}), 400
+
+    if not mongo.db.events.find_one({"_id": oid}, {"_id": 1}):
+        return jsonify({"error": "event not found"}), 404
+
+    results = (request.json or {}).get("results") or []
+    car_numbers = [r["car_number"] for r in results if "car_number" in r]
+    by_number = {p["car_number"]: p["_id"] for p in
+                 mongo.db.pilots.find({"car_number": {"$in": car_numbers}}, {"car_number": 1})}
+
+    ops = []
+    for r in results:
+        try:
+            pilot_id = ObjectId(r["pilot_id"]) if "pilot_id" in r else by_number[r.get("car_number")]
+        except Exception:
+            return jsonify({"error": f"unknown pilot in result {r}"}), 400
+        ops.append(UpdateOne(
+            {"event_id": oid, "pilot_id": pilot_id},
+            {"$set": {"position": r.get("position"), "dnf": bool(r.get("dnf", False))}},
+            upsert=True,
+        ))
+    if ops:
+        mongo.db.event_results.bulk_write(ops, ordered=False)
+
+    try:
+        summary = score_event(oid)
+    except ScoringInProgress:
+        return jsonify({"error": "event is already being scored"}), 409
+
+    log_action("success", f"Resultados publicados para el evento {event_id}", "events", event_id, summary)
+    # si el evento ya terminó, el scheduler lo pasa a published y libera los rosters
+    event_bus.publish("schedule", {"event_id": event_id})
+
+    return jsonify(summary)
+
+
+def persist_leaderboard():
+    """
+    Snapshot del leaderboard y recién después el aviso a los demás workers:
+    lo cargan del disco en vez de recorrer fantasy_teams cada uno
+    """
+    leaderboard.persist(LEADERBOARD_SNAPSHOT, lambda version: event_bus.publish("leaderboard", {"version": version}))
+
+
+def score_event(event_id):
+    """Puntúa el evento y difunde los puntajes nuevos (lo usan la API y el scheduler)"""
+    summary = scoring_engine.publish_event(event_id)
+    if summary.get("ranking_version"):
+        leaderboard.applied(summary["ranking_version"])
+        socketio.start_background_task(persist_leaderboard)
+
+    invalidate_collection("pilots")
+    msg = {"type": "results_published", "event_id": str(event_id), **summary}
+    broadcast("results_published", msg)
+    publish_score_deltas(event_id, summary)
+    return summary
+
+
+def notify_event_status(event, old, new, summary=None):
+    """Transición del ciclo de vida: consola de admin, Socket.IO y room "events" """
+    event_id = str(event["_id"])
+    details = {"from": old, "to": new, **(summary or {})}
+    log_action("info", f"Evento {event.get('name') or event_id}: {old} → {new}", "events", event_id, details)
+    broadcast("event_status", {"event_id": event_id, "status": new, "previous": old})
+    # locked/published también significan rosters congelados/liberados
+    publish_delta("events", event_id, OP_UPSERT, {"status": new})
+    if new == PUBLISHED:
+        # el puntaje oficial reemplaza al provisorio
+        event_bus.publish("live_end", {"event_id": event_id})
+
+
+def publish_score_deltas(event_id, summary):
+    """Puntajes nuevos de los pilotos del evento y del top del leaderboard"""
+    if not summary.get("pilots"):
+        return
+    pilot_ids = mongo.db.event_results.distinct("pilot_id", {"event_id": event_id})
+    for p in mongo.db.pilots.find({"_id": {"$in": pilot_ids}}, {"current_score": 1, "stats": 1}):
+        publish_delta("pilots", str(p["_id"]), OP_UPSERT, {"current_score": p.get("current_score", 0), "stats": p.get("stats")})
+    if summary.get("fantasy_teams"):
+        for e in leaderboard.page(0, LEADERBOARD_DELTA_TOP):
+            publish_delta("leaderboard", e["fantasy_team_id"], OP_UPSERT, {"rank": e["rank"], "total_score": e["total_score"]})
+
+
+# -------------------
+# Importación masiva (NDJSON / CSV)
+# -------------------
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+
+def run_import(kind, collection, parse, on_batch=None):
+    """
+    Lee el body en streaming y lo aplica por lotes. Cada lote deja un único
+    registro de auditoría y un único mensaje SSE con su resumen.
+    ValueError si el formato pedido no es válido.
+    """
+    fmt = detect_format(request.content_type, request.args.get("format"))
+
+    def batch_done(batch, keys):
+        log_action("success", f"Importación de {kind}: lote {batch['batch']}", collection.name, None, batch)
+        if on_batch:
+            on_batch(batch, keys)
+
+    importer = BulkImport(collection, parse, batch_size=IMPORT_BATCH_SIZE)
+    return importer.run(read_rows(request.stream, fmt), batch_done)
+
+
+@app.route("/admin/import/teams", methods=["POST"])
+@auth_required(role="admin")
+def import_teams():
+    """Filas: name, base_country. Upsert por nombre."""
+    def on_batch(batch, keys):
+        invalidate_collection("teams")
+        publish_delta("teams", "*", OP_RELOAD)
+
+    try:
+        return jsonify(run_import("equipos", mongo.db.teams, team_parser(), on_batch))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/admin/import/pilots", methods=["POST"])
+@auth_required(role="admin")
+def import_pilots():
+    """Filas: car_number, name, team (nombre). Upsert por car_number."""
+    team_ids = {t["name"]: t["_id"] for t in mongo.db.teams.find({"deleting": {"$ne": True}}, {"name": 1})}
+
+    def on_batch(batch, keys):
+        invalidate_collection("pilots")
+        publish_delta("pilots", "*", OP_RELOAD)
+
+    try:
+        return jsonify(run_import("pilotos", mongo.db.pilots, pilot_parser(team_ids), on_batch))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/admin/import/results", methods=["POST"])
+@auth_required(role="admin")
+def import_results():
+    """
+    Filas: event_id, car_number | pilot_id, position, dnf. Upsert por
+    (evento, piloto). Con ?score=1 se puntúan los eventos tocados al final.
+    """
+    pilot_ids = {p["car_number"]: p["_id"] for p in mongo.db.pilots.find({}, {"car_number": 1})}
+    known_events = {}
+
+    def event_exists(oid):
+        if oid not in known_events:
+            known_events[oid] = mongo.db.events.find_one({"_id": oid}, {"_id": 1}) is not None
+        return known_events[oid]
+
+    touched = set()
+
+    def on_batch(batch, keys):
+        touched.update(event_id for event_id, _ in keys)
+
+    try:
+        summary = run_import("resultados", mongo.db.event_results, result_parser(pilot_ids, event_exists), on_batch)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.args.get("score") != "1" or not touched:
+        return jsonify(summary)
+
+    summary["scoring"] = {}
+    for oid in sorted(touched):
+        try:
+            scored = scoring_engine.publish_event(oid)
+        except ScoringInProgress:
+            summary["scoring"][str(oid)] = {"error": "event is already being scored"}
+            continue
+        if scored.get("ranking_version"):
+            leaderboard.applied(scored["ranking_version"])
+        publish_score_deltas(oid, scored)
+        event_bus.publish("schedule", {"event_id": str(oid)})
+        summary["scoring"][str(oid)] = scored
+    socketio.start_background_task(persist_leaderboard)
+    invalidate_collection("pilots")
+    return jsonify(summary)
+
+
+# -------------------
+# Telemetría en vivo y puntaje provisorio
+# -------------------
+# car_number → pilot_id. Un número desconocido recarga el mapa como mucho una
+# vez cada CAR_NUMBERS_REFRESH_S: una tanda de números basura no escanea pilots
+# en cada update
+CAR_NUMBERS_REFRESH_S = float(os.getenv("CAR_NUMBERS_REFRESH_S", "30"))
+car_numbers = {"by_number": {}, "loaded_at": None}
+
+# rangos de lo que entra en los arrays int16 de live_race
+LIVE_MAX_POSITION = int(os.getenv("LIVE_MAX_POSITION", "999"))
+LIVE_MAX_LAP = 32767
+
+
+def pilot_for_car(number):
+    if number is None:
+        return None
+    pilot_id = car_numbers["by_number"].get(number)
+    now = time.monotonic()
+    loaded_at = car_numbers["loaded_at"]
+    if pilot_id is None and (loaded_at is None or now - loaded_at >= CAR_NUMBERS_REFRESH_S):
+        car_numbers["loaded_at"] = now
+        car_numbers["by_number"] = {
+            p["car_number"]: str(p["_id"])
+            for p in mongo.db.pilots.find({"car_number": {"$ne": None}}, {"car_number": 1})
+        }
+        pilot_id = car_numbers["by_number"].get(number)
+    return pilot_id
+
+
+def is_int(value, low, high):
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+
+def live_update(u):
+    """Valida un item de updates: (pilot_id o car_number, datos) o None si está mal formado"""
+    if not isinstance(u, dict):
+        return None
+    pilot_id, number = u.get("pilot_id"), u.get("car_number")
+    if pilot_id is not None and not isinstance(pilot_id, str):
+        return None
+    if number is not None and not is_int(number, 0, 2**31 - 1):
+        return None
+    if u.get("position") is not None and not is_int(u["position"], 1, LIVE_MAX_POSITION):
+        return None
+    if u.get("lap") is not None and not is_int(u["lap"], 0, LIVE_MAX_LAP):
+        return None
+    if u.get("dnf") is not None and not isinstance(u["dnf"], bool):
+        return None
+    return pilot_id, number, {k: u[k] for k in ("position", "lap", "dnf") if u.get(k) is not None}
+
+
+@app.route("/admin/live/<event_id>", methods=["POST"])
+@auth_required(role="admin")
+def ingest_live(event_id):
+    """
+    Body: {"updates": [{"pilot_id" | "car_number", "position", "lap", "dnf"}]}
+    (o la lista sola). Sólo con el evento en curso; responde sin esperar el lote.
+    Los items mal formados (tipos, posición/vuelta fuera de rango) se cuentan en
+    "rejected" y no frenan al resto.
+    """
+    try:
+        oid = ObjectId(event_id)
+    except Exception:
+        return jsonify({"error": "invalid event id"}), 400
+    status = live_events.get(event_id)
+    if status is None:
+        event = mongo.db.events.find_one({"_id": oid}, {"status": 1})
+        if event is None:
+            return jsonify({"error": "event not found"}), 404
+        status = event.get("status")
+        live_events.put(event_id, status)
+    if status != LIVE:
+        return jsonify({"error": f"event is {status}, not live"}), 409
+
+    data = request.get_json(silent=True)
+    updates = data.get("updates") if isinstance(data, dict) else data
+    if not isinstance(updates, list):
+        return jsonify({"error": "updates must be a list"}), 400
+    accepted, unknown, rejected = 0, 0, 0
+    for u in updates:
+        parsed = live_update(u)
+        if parsed is None:
+            rejected += 1
+            continue
+        pilot_id, number, fields = parsed
+        pilot_id = pilot_id or pilot_for_car(number)
+        if not pilot_id:
+            unknown += 1
+            continue
+        live_ingest.add(event_id, pilot_id, OP_UPSERT, fields)
+        accepted += 1
+    return jsonify({"accepted": accepted, "unknown": unknown, "rejected": rejected}), 202
+
+
+@app.route("/live/<event_id>", methods=["GET"])
+def get_live(event_id):
+    """Clasificación provisoria; con ?fantasy_team_id= también los puntos provisorios del equipo"""
+    state = next((r for r in live_board.races() if r.event_id == event_id), None)
+    if state is None:
+        return jsonify({"error": "no live data for this event"}), 404
+    body = {"event_id": event_id, "laps": state.laps, "length_km": state.length_km, "standings": state.standings()}
+    team_id = request.args.get("fantasy_team_id")
+    if team_id:
+        body["fantasy_team"] = {"fantasy_team_id": team_id, "live_points": state.team_points_of(team_id)}
+    return jsonify(body)
+
+
+def apply_live(message):
+    """Lote de telemetría del bus → copia local de la carrera → deltas a los rooms de este worker"""
+    state, pilots, teams = live_board.apply(
+        message["topic"], [(c["id"], c.get("data") or {}) for c in message["changes"]]
+    )
+    if state is None:
+        return
+    for i in pilots:
+        delta_publisher.add("live", state.pilot_ids[i], OP_UPSERT, state.pilot_entry(i))
+    if len(teams):
+        changed = {state.team_ids[j] for j in teams}
+        for room in open_fantasy_rooms():
+            team_id = room[len(FANTASY_TEAM_ROOM):]
+            if team_id in changed:
+                delta_publisher.add(room, team_id, OP_UPSERT, {
+                    "event_id": state.event_id, "live_points": state.team_points_of(team_id),
+                })
+
+
+# -------------------
+# Leaderboard
+# -------------------
+LEADERBOARD_MAX_LIMIT = 200
+# filas del top que viajan como delta al room "leaderboard"
+LEADERBOARD_DELTA_TOP = int(os.getenv("LEADERBOARD_DELTA_TOP", "50"))
+
+
+def current_leaderboard():
+    return leaderboard.sync(read_db(), LEADERBOARD_SNAPSHOT)
+
+
+def int_arg(name, default, low, high):
+    try:
+        return max(low, min(int(request.args.get(name, default)), high))
+    except ValueError:
+        return default
+
+
+@app.route("/leaderboard", methods=["GET"])
+def get_leaderboard():
+    """Top-K / página: ?offset=0&limit=50"""
+    board = current_leaderboard()
+    offset = int_arg("offset", 0, 0, max(len(board), 0))
+    limit = int_arg("limit", 50, 1, LEADERBOARD_MAX_LIMIT)
+    return jsonify({"total": len(board), "offset": offset, "entries": board.page(offset, limit)})
+
+
+@app.route("/leaderboard/team/<team_id>", methods=["GET"])
+def get_leaderboard_team(team_id):
+    """Posición de un fantasy team con ?around=N vecinos"""
+    board = current_leaderboard()
+    rank, entries = board.around(team_id, int_arg("around", 5, 0, 50))
+    if rank is None:
+        return jsonify({"error": "fantasy team not found"}), 404
+    return jsonify({"total": len(board), "rank": rank, "entries": entries})
+
+
+@app.route("/leaderboard/me", methods=["GET"])
+@auth_required()
+def get_leaderboard_me():
+    board = current_leaderboard()
+    team_id = board.team_of_user(request.user_id)
+    if team_id is None:
+        return jsonify({"error": "user has no fantasy team"}), 404
+    rank, entries = board.around(team_id, int_arg("around", 5, 0, 50))
+    return jsonify({"total": len(board), "rank": rank, "fantasy_team_id": team_id, "entries": entries})
+
+
+# -------------------
+# Fantasy teams y rosters
+# -------------------
+def expected_version():
+    """Versión que el cliente cree vigente: If-Match o "version" en el body (opcional)"""
+    raw = request.headers.get("If-Match") or (request.get_json(silent=True) or {}).get("version")
+    if raw in (None, "", "*"):
+        return None
+    try:
+        return int(str(raw).strip().strip('"').removeprefix("W/").strip('"'))
+    except ValueError:
+        raise RosterError("invalid version", 400)
+
+
+def oid_arg(value, what):
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise RosterError(f"invalid {what} id", 400)
+
+
+def my_team_id():
+    doc = mongo.db.fantasy_teams.find_one({"user_id": ObjectId(request.user_id)}, {"_id": 1})
+    if doc is None:
+        raise RosterError("user has no fantasy team", 404)
+    return doc["_id"]
+
+
+def roster_response(doc, status=200):
+    body = serialize_team(doc, roster_service.budget)
+    response = jsonify(body)
+    response.status_code = status
+    response.headers["ETag"] = f'"{body["version"]}"'
+    return response
+
+
+def apply_fantasy_team(message):
+    """Alta, rename o baja de un fantasy team en el leaderboard de este worker"""
+    if message["op"] == OP_DELETE:
+        leaderboard.remove(message["id"])
+    else:
+        leaderboard.set(message["id"], message["total_score"], message["name"], message["user_id"])
+    if message.get("version"):
+        leaderboard.applied(message["version"])
+
+
+def fantasy_team_changed(message):
+    """
+    Sube la versión del ranking, aplica el cambio acá y en los demás workers y
+    guarda el snapshot: un worker que arranque después no ve el equipo viejo
+    """
+    message = {**message, "version": scoring_engine.refresh_ranking(critical_db())}
+    apply_fantasy_team(message)
+    event_bus.publish("fantasy_team", message)
+    socketio.start_background_task(persist_leaderboard)
+
+
+def roster_changed(doc, action, details=None):
+    """Auditoría y delta al room del equipo; sin SSE: en cierre de mercado son miles por minuto"""
+    team_id = str(doc["_id"])
+    audit_log(action, "fantasy_teams", team_id, details)
+    body = serialize_team(doc, roster_service.budget)
+    publish_delta(FANTASY_TEAM_ROOM + team_id, team_id, OP_UPSERT, {
+        "version": body["version"], "spent": body["spent"], "pilots": body["pilots"],
+    })
+
+
+@app.route("/fantasy-teams", methods=["POST"])
+@auth_required()
+def create_fantasy_team():
+    name = ((request.json or {}).get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "name is required"}), 400
+    doc = roster_service.create(ObjectId(request.user_id), name)
+    team_id = str(doc["_id"])
+    audit_log("fantasy_team_create", "fantasy_teams", team_id, {"name": name})
+    fantasy_team_changed({
+        "op": OP_UPSERT, "id": team_id, "total_score": 0, "name": name, "user_id": request.user_id,
+    })
+    return roster_response(doc, 201)
+
+
+@app.route("/fantasy-teams/me", methods=["GET"])
+@auth_required()
+def get_my_fantasy_team():
+    return roster_response(roster_service.of_user(ObjectId(request.user_id)))
+
+
+@app.route("/fantasy-teams/<team_id>", methods=["GET"])
+def get_fantasy_team(team_id):
+    return roster_response(roster_service.get(oid_arg(team_id, "fantasy team")))
+
+
+@app.route("/fantasy-teams/me", methods=["PATCH"])
+@auth_required()
+def rename_fantasy_team():
+    name = ((request.json or {}).get("name") or "").strip()
+    if not name:
+        return jsonify({"error": "name is required"}), 400
+    doc = roster_service.rename(my_team_id(), name, expected_version())
+    roster_changed(doc, "fantasy_team_rename", {"name": name})
+    fantasy_team_changed({
+        "op": OP_UPSERT, "id": str(doc["_id"]), "total_score": doc.get("total_score", 0),
+        "name": name, "user_id": request.user_id,
+    })
+    return roster_response(doc)
+
+
+@app.route("/fantasy-teams/me", methods=["DELETE"])
+@auth_required()
+def delete_fantasy_team():
+    doc = roster_service.delete(my_team_id(), expected_version())
+    team_id = str(doc["_id"])
+    audit_log("fantasy_team_delete", "fantasy_teams", team_id)
+    fantasy_team_changed({"op": OP_DELETE, "id": team_id})
+    publish_delta(FANTASY_TEAM_ROOM + team_id, team_id, OP_DELETE)
+    return jsonify({"ok": True})
+
+
+@app.route("/fantasy-teams/me/pilots", methods=["POST"])
+@auth_required()
+def add_roster_pilot():
+    pilot_id = oid_arg((request.json or {}).get("pilot_id"), "pilot")
+    doc = roster_service.add(my_team_id(), pilot_id, expected_version())
+    roster_changed(doc, "roster_add", {"pilot_id": str(pilot_id)})
+    return roster_response(doc)
+
+
+@app.route("/fantasy-teams/me/pilots/<pilot_id>", methods=["DELETE"])
+@auth_required()
+def remove_roster_pilot(pilot_id):
+    doc = roster_service.remove(my_team_id(), oid_arg(pilot_id, "pilot"), expected_version())
+    roster_changed(doc, "roster_remove", {"pilot_id": pilot_id})
+    return roster_response(doc)
+
+
+@app.route("/fantasy-teams/me/transfers", methods=["POST"])
+@auth_required()
+@rate_limited("transfers", key=lambda: request.user_id)
+def transfer_pilot():
+    """Body: {"pilot_out", "pilot_in", "version"?}; la versión también puede ir en If-Match"""
+    data = request.json or {}
+    out_id = oid_arg(data.get("pilot_out"), "pilot_out")
+    in_id = oid_arg(data.get("pilot_in"), "pilot_in")
+    doc = roster_service.transfer(my_team_id(), out_id, in_id, expected_version())
+    roster_changed(doc, "roster_transfer", {"pilot_out": str(out_id), "pilot_in": str(in_id)})
+    return roster_response(doc)
+
+
 # -------------------
 # WebSocket
 # -------------------
+DELTA_TOPICS = ("pilots", "teams", "leaderboard", "events", "live")
+FANTASY_TEAM_ROOM = "fantasy_team:"
+
+
 @socketio.on("connect")
 def ws_connect():
     emit("message", {"msg": "connected to tc2000 fantasy ws"})
 
 
+def valid_topic(topic):
+    if not isinstance(topic, str):
+        return False
+    if topic.startswith(FANTASY_TEAM_ROOM):
+        return ObjectId.is_valid(topic[len(FANTASY_TEAM_ROOM):])
+    return topic in DELTA_TOPICS
+
+
+@socketio.on("subscribe")
+def ws_subscribe(data):
+    """{"topics": ["pilots", "fantasy_team:<id>"]} → se une a los rooms y devuelve la secuencia actual"""
+    topics = [t for t in (data or {}).get("topics", []) if valid_topic(t)]
+    for topic in topics:
+        join_room(topic)
+    return {"epoch": delta_publisher.epoch, "seq": {t: delta_publisher.seq(t) for t in topics}}
+
+
+@socketio.on("unsubscribe")
+def ws_unsubscribe(data):
+    for topic in (data or {}).get("topics", []):
+        if valid_topic(topic):
+            leave_room(topic)
+
+
+@socketio.on("resync")
+def ws_resync(data):
+    """
+    Snapshot completo de un tópico para el cliente que detectó un salto de
+    secuencia. Los deltas con seq mayor al del snapshot se aplican encima.
+    """
+    topic = (data or {}).get("topic")
+    if not valid_topic(topic):
+        emit("snapshot", {"topic": topic, "error": "unknown topic"})
+        return
+    seq = delta_publisher.seq(topic)
+    # mismo formato que la API REST (ObjectId y fechas vía el provider de la app)
+    data = app.json.loads(app.json.dumps_bytes(topic_snapshot(topic)))
+    emit("snapshot", {"topic": topic, "seq": seq, "epoch": delta_publisher.epoch, "data": data})
+
+
+def topic_snapshot(topic):
+    # los snapshots salen del primario: un secundario atrasado perdería
+    # cambios cuyo delta ya quedó antes del seq del snapshot
+    if topic == "pilots":
+        return build_pilots(parse_pilot_query({}), mongo.db)
+    if topic == "teams":
+        return build_teams(mongo.db)
+    if topic == "live":
+        return [e for r in live_board.races() for e in r.standings()]
+    if topic == "events":
+        return list(mongo.db.events.find({}, {"name": 1, "start_at": 1, "status": 1, "results_published": 1})
+                    .sort("start_at", 1))
+    board = current_leaderboard()
+    if topic == "leaderboard":
+        return board.page(0, LEADERBOARD_DELTA_TOP)
+    _, entries = board.around(topic[len(FANTASY_TEAM_ROOM):], 0)
+    return entries
+
+
+def open_fantasy_rooms():
+    return [r for r in socketio.server.manager.rooms.get("/", {})
+            if isinstance(r, str) and r.startswith(FANTASY_TEAM_ROOM)]
+
+
+def fantasy_team_deltas():
+    """Posición y puntaje vigentes a los rooms fantasy_team:<id> abiertos en este worker"""
+    rooms = open_fantasy_rooms()
+    if not rooms:
+        return
+    board = leaderboard.sync(mongo.db, LEADERBOARD_SNAPSHOT, min_interval=0)
+    for room in rooms:
+        team_id = room[len(FANTASY_TEAM_ROOM):]
+        rank, entries = board.around(team_id, 0)
+        if rank is not None:
+            delta_publisher.add(room, team_id, OP_UPSERT, {"rank": rank, "total_score": entries[0]["total_score"]})
+
+
 # -------------------
 # Main
 # -------------------
 if __name__ == "__main__":
+    # Servidor de desarrollo; en producción usar serve.py
     socketio.run(app, host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,327 @@
+"""
+Métricas en formato Prometheus y profiler por muestreo.
+
+Los contadores e histogramas no usan locks: cada serie es una lista de
+enteros que se incrementa in situ. Con gevent (un hilo por worker) eso es
+exacto; con hilos, el GIL hace que lo peor que pueda pasar sea perder algún
+incremento suelto bajo mucha contención, a cambio de no serializar los
+requests sobre un lock global. Las series se crean con setdefault.
+
+Lo que ya lleva su propia cuenta (hub SSE, audit writer, pool de bcrypt,
+caches) no se duplica: se lee en cada scrape desde un collector.
+
+Cada worker de serve.py lleva sus propias cuentas y un scrape por el puerto
+compartido (SO_REUSEPORT) cae en cualquiera de ellos: por eso todas las
+series salen con la etiqueta `pid` del worker que respondió. Las series de
+workers distintos no se pisan y se suman en la consulta, p. ej.
+`sum without (pid) (rate(http_requests_total[5m]))`; para ver todos los
+workers a la vez hay que scrapear cada uno (o repetir el scrape).
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BCRYPT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _with_label(labels, extra):
+    """Agrega `extra` al bloque de etiquetas ya armado de una muestra"""
+    return labels[:-1] + "," + extra + "}" if labels else "{" + extra + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series = {}
+
+    def inc(self, *labels, amount=1):
+        cell = self._series.get(labels)
+        if cell is None:
+            cell = self._series.setdefault(labels, [0])
+        cell[0] += amount
+
+    def samples(self):
+        for labels, cell in list(self._series.items()):
+            yield self.name, _labels(self.label_names, labels), cell[0]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, *labels):
+        # [conteo por bucket..., +Inf, suma]
+        cell = self._series.get(labels)
+        if cell is None:
+            cell = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        for labels, cell in list(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), cell):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", _labels(self.label_names, labels, f'le="{le}"'), cumulative
+            yield self.name + "_sum", _labels(self.label_names, labels), cell[-1]
+            yield self.name + "_count", _labels(self.label_names, labels), cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "t0")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        fn() → [(nombre, tipo, ayuda, valor)] leído en cada scrape. Sirve de
+        decorador.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        pid = os.getpid()
+        worker = f'pid="{pid}"'
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(
+                f"{name}{_with_label(labels, worker)} {value}" for name, labels, value in metric.samples()
+            )
+        lines.append("# HELP process_pid Worker que respondió este scrape")
+        lines.append("# TYPE process_pid gauge")
+        lines.append(f"process_pid{{{worker}}} {pid}")
+        for collect in self._collectors:
+            for name, kind, help, value in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{{{worker}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Tiempo por comando de Mongo; usa duration_micros del evento (sin relojes propios)"""
+
+    def __init__(self, registry):
+        self.duration = registry.histogram(
+            "mongodb_command_duration_seconds", "Duración de comandos de MongoDB", ("command",)
+        )
+        self.failures = registry.counter(
+            "mongodb_command_failures_total", "Comandos de MongoDB fallidos", ("command",)
+        )
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.duration.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        self.duration.observe(event.duration_micros / 1e6, event.command_name)
+        self.failures.inc(event.command_name)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """
+    Estado del pool de conexiones de pymongo (todos los nodos sumados):
+    conexiones abiertas, en uso y requests esperando una. En uso igual a
+    maxPoolSize con gente esperando es un pool saturado; los checkouts que
+    vencen waitQueueTimeoutMS se cuentan con reason="timeout".
+    """
+
+    def __init__(self, registry, max_pool_size=None):
+        self.max_pool_size = max_pool_size
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.wait = registry.histogram(
+            "mongodb_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool"
+        )
+        self.failures = registry.counter(
+            "mongodb_pool_checkout_failures_total", "Checkouts fallidos del pool", ("reason",)
+        )
+        self.cleared = registry.counter("mongodb_pool_cleared_total", "Pools vaciados por errores de red")
+        registry.collector(self.collect)
+
+    def collect(self):
+        rows = [
+            ("mongodb_pool_connections", "gauge", "Conexiones abiertas", self.open),
+            ("mongodb_pool_in_use", "gauge", "Conexiones prestadas a una operación", self.in_use),
+            ("mongodb_pool_waiting", "gauge", "Operaciones esperando una conexión", self.waiting),
+        ]
+        if self.max_pool_size:
+            rows.append(("mongodb_pool_saturation", "gauge", "Conexiones en uso / maxPoolSize",
+                         self.in_use / self.max_pool_size))
+        return rows
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.cleared.inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        self.waiting -= 1
+        self.failures.inc(str(event.reason))
+        self.wait.observe(event.duration)
+
+    def connection_checked_out(self, event):
+        self.waiting -= 1
+        self.in_use += 1
+        self.wait.observe(event.duration)
+
+    def connection_checked_in(self, event):
+        self.in_use -= 1
+
+
+# -------------------
+# Profiler por muestreo
+# -------------------
+def _real_thread_tools():
+    """start_new_thread y sleep de verdad aunque gevent haya parcheado threading/time"""
+    if "gevent" in sys.modules:
+        from gevent import monkey
+        return monkey.get_original("_thread", "start_new_thread"), monkey.get_original("time", "sleep")
+    import _thread
+    return _thread.start_new_thread, time.sleep
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Toma la pila de todos los hilos `hz` veces por segundo desde un hilo real
+    del sistema operativo y devuelve el resultado en formato "folded"
+    (pila;separada;por;puntos_y_coma cantidad), que abren flamegraph.pl y
+    speedscope. Con gevent se ve el greenlet que está corriendo en cada
+    muestra, que es justamente el que consume CPU.
+    """
+
+    def __init__(self, hz=100):
+        self.hz = hz
+        self.running = False
+        self._lock = threading.Lock()
+
+    def profile(self, seconds, wait=time.sleep, hz=None):
+        # chequear y tomar el profiler (y cambiar hz) es una sola operación:
+        # dos requests a la vez no pueden cambiarle la frecuencia al que corre
+        with self._lock:
+            if self.running:
+                raise RuntimeError("profiler already running")
+            self.running = True
+            if hz is not None:
+                self.hz = hz
+        start_thread, sleep = _real_thread_tools()
+        result = {"stacks": _Tally(), "samples": 0, "done": False}
+
+        def sample():
+            me = None
+            try:
+                import _thread
+                me = _thread.get_ident()
+                deadline = time.monotonic() + seconds
+                while time.monotonic() < deadline:
+                    for ident, frame in sys._current_frames().items():
+                        if ident != me:
+                            result["stacks"][_stack(frame)] += 1
+                    result["samples"] += 1
+                    sleep(1.0 / self.hz)
+            finally:
+                result["done"] = True
+
+        try:
+            start_thread(sample, ())
+            while not result["done"]:
+                wait(0.05)
+        finally:
+            self.running = False
+        return result
+
+    @staticmethod
+    def folded(result):
+        return "".join(f"{stack} {n}\n" for stack, n in result["stacks"].most_common())
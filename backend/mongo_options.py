@@ -0,0 +1,135 @@
+"""
+Conexión a Mongo: pool, timeouts y compresión del cliente, y a qué nodo lee
+y con qué write concern escribe cada clase de operación.
+
+Clases de escritura:
+  default   todo lo que no dice otra cosa (MONGO_W, majority por defecto)
+  audit     audit_log: w:1 sin journal; el AuditWriter ya tolera perder un
+            lote, así que no vale la pena esperar a la mayoría
+  critical  rosters, puntaje y lease del scheduler: majority con wtimeout,
+            una transferencia confirmada no puede desaparecer en un failover
+
+Lecturas pesadas (/pilots, /teams, leaderboard, auditoría): van a un
+secundario con staleness acotada (MONGO_READ_PREFERENCE, secondaryPreferred
+por defecto, y MONGO_MAX_STALENESS_S). Lo que se lee para después escribir
+(rosters, login, scheduler) sigue en el primario.
+
+Las opciones que ya vengan en MONGO_URI tienen prioridad sobre los valores
+por defecto de acá.
+"""
+import importlib.util
+import os
+from urllib.parse import parse_qsl, urlsplit
+
+from pymongo import WriteConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+_READ_PREFERENCES = {
+    "primary": Primary,
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# compresor del protocolo → módulo que necesita pymongo
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def _w(value):
+    return int(value) if value.isdigit() else value
+
+
+def _uri_options(uri):
+    return {k.lower() for k, _ in parse_qsl(urlsplit(uri).query)}
+
+
+def available_compressors(names):
+    """Los compresores pedidos cuyo módulo está instalado, en el mismo orden"""
+    return [n for n in names if n in _COMPRESSOR_MODULES and importlib.util.find_spec(_COMPRESSOR_MODULES[n])]
+
+
+def client_options(uri):
+    """kwargs para PyMongo / MongoClient"""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "300000")),
+        "maxConnecting": int(os.getenv("MONGO_MAX_CONNECTING", "2")),
+        # sin conexión libre en este tiempo el request falla en vez de encolarse sin límite
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+        "retryWrites": os.getenv("MONGO_RETRY_WRITES", "1") == "1",
+        "retryReads": os.getenv("MONGO_RETRY_READS", "1") == "1",
+        "w": _w(os.getenv("MONGO_W", "majority")),
+        "wTimeoutMS": int(os.getenv("MONGO_WTIMEOUT_MS", "5000")),
+        "appname": os.getenv("MONGO_APPNAME", "tc2000-fantasy"),
+    }
+    compressors = available_compressors(
+        [c.strip() for c in os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib").split(",") if c.strip()]
+    )
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+        options["zlibCompressionLevel"] = int(os.getenv("MONGO_ZLIB_LEVEL", "6"))
+    in_uri = _uri_options(uri)
+    return {k: v for k, v in options.items() if k.lower() not in in_uri}
+
+
+def read_preference():
+    mode = os.getenv("MONGO_READ_PREFERENCE", "secondaryPreferred").lower()
+    cls = _READ_PREFERENCES.get(mode)
+    if cls is None:
+        raise ValueError(f"MONGO_READ_PREFERENCE inválida: {mode}")
+    if cls is Primary:
+        return Primary()
+    # pymongo exige al menos 90 s (o -1 = sin límite)
+    return cls(max_staleness=max(90, int(os.getenv("MONGO_MAX_STALENESS_S", "90"))))
+
+
+def write_concerns():
+    timeout = int(os.getenv("MONGO_WTIMEOUT_MS", "5000"))
+    return {
+        "default": None,
+        "audit": WriteConcern(w=_w(os.getenv("MONGO_AUDIT_W", "1")), j=False),
+        "critical": WriteConcern(w=_w(os.getenv("MONGO_CRITICAL_W", "majority")), wtimeout=timeout),
+    }
+
+
+class MongoRouting:
+    """Vistas de una Database con el read preference / write concern de cada clase"""
+
+    def __init__(self, read_preference=None, write_concerns=None):
+        self.read_preference = read_preference or Primary()
+        self.write_concerns = write_concerns or {}
+        self._views = {}
+
+    @property
+    def secondary_reads(self):
+        return self.read_preference.mode != Primary().mode
+
+    def _view(self, db, name, **options):
+        # la vista se arma una vez por base (with_options crea un objeto nuevo)
+        cached = self._views.get(name)
+        if cached is None or cached[0] is not db:
+            options = {k: v for k, v in options.items() if v is not None}
+            try:
+                view = db.with_options(**options) if options else db
+            except NotImplementedError:
+                # mongomock (benchmarks) no implementa write_concern en with_options
+                view = db
+            cached = (db, view)
+            self._views[name] = cached
+        return cached[1]
+
+    def reads(self, db):
+        """Para lecturas pesadas que toleran datos de hasta MONGO_MAX_STALENESS_S"""
+        return self._view(db, "reads", read_preference=self.read_preference)
+
+    def writes(self, db, kind):
+        return self._view(db, kind, write_concern=self.write_concerns.get(kind))
+
+
+def from_env(uri):
+    return client_options(uri), MongoRouting(read_preference(), write_concerns())
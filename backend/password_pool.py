@@ -0,0 +1,139 @@
+"""
+Pool de procesos para bcrypt.
+
+hash_password / check_password corren en procesos dedicados (uno por core
+por defecto), así un pico de logins no ocupa los hilos que atienden /pilots o
+/sse. La admisión está acotada: si ya hay max_pending operaciones en curso
+se rechaza al instante con PasswordPoolBusy (el handler responde 429 con
+Retry-After) en vez de encolar trabajo que va a vencer igual.
+
+El costo (rounds) es configurable; needs_rehash() indica si un hash guardado
+se hizo con otro costo para re-hashearlo de forma transparente en el login.
+"""
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+class PasswordPoolBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("password hashing is saturated")
+        self.retry_after = retry_after
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_rounds(hashed: bytes):
+    """Costo de un hash bcrypt ($2b$12$...) o None si no se reconoce"""
+    try:
+        return int(bytes(hashed)[4:6])
+    except (TypeError, ValueError):
+        return None
+
+
+def make_executor(kind, workers):
+    """
+    "process": procesos (modo threading).
+    "gevent": hilos nativos del hub de gevent; bcrypt suelta el GIL, así que
+    el event loop sigue atendiendo mientras se hashea.
+    """
+    if kind == "gevent":
+        from gevent.threadpool import ThreadPoolExecutor
+        return ThreadPoolExecutor(workers)
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+
+
+class PasswordPool:
+    def __init__(self, workers=None, max_pending=None, rounds=12, executor="process"):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(1, self.workers) * 4
+        self.rounds = rounds
+        self.rejected = 0
+        self.completed = 0
+        self._avg_seconds = 0.25
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._executor = None
+        self._kind = executor
+
+    def start(self):
+        """
+        Levanta los procesos. Conviene llamarlo antes de arrancar otros hilos:
+        con fork, los hijos se crean todos en el primer submit.
+        """
+        with self._start_lock:
+            if self.workers > 0 and self._executor is None:
+                executor = make_executor(self._kind, self.workers)
+                executor.submit(int).result()
+                self._executor = executor
+        return self
+
+    def shutdown(self):
+        with self._start_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def hash(self, password: str) -> bytes:
+        return self._run(_hashpw, password.encode("utf-8"), self.rounds)
+
+    def check(self, password: str, hashed: bytes) -> bool:
+        if not hashed:
+            return False
+        return self._run(_checkpw, password.encode("utf-8"), bytes(hashed))
+
+    def needs_rehash(self, hashed: bytes) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    def pending(self):
+        return self._pending
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                waves = self._pending / max(1, self.workers)
+                raise PasswordPoolBusy(max(1, math.ceil(waves * self._avg_seconds)))
+            self._pending += 1
+
+    def _run(self, fn, *args):
+        self._admit()
+        t0 = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            try:
+                return self.start()._executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # Un worker murió: se rearma el pool y se reintenta una vez
+                self.shutdown()
+                return self.start()._executor.submit(fn, *args).result()
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self._avg_seconds = 0.9 * self._avg_seconds + 0.1 * elapsed
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "avg_ms": self._avg_seconds * 1000,
+        }
@@ -0,0 +1,178 @@
+"""
+Límites de tasa (token bucket) y backoff progresivo de logins fallidos.
+
+Cada regla es "N pedidos cada S segundos" por clave (IP, usuario o username):
+un bucket de capacidad N que se recarga a N/S tokens por segundo. El backoff
+cuenta fallos por clave; pasados `free` fallos bloquea la clave base·2^k
+segundos (hasta `cap`) y se olvida tras `window` segundos sin fallos o con un
+login correcto.
+
+El estado vive en un store con celdas de tres floats por clave, protegidas
+por locks repartidos en franjas (la clave elige la franja), así que dos
+requests sólo compiten si caen en la misma franja:
+
+  MemoryStore         por proceso (dict por franja)
+  SharedMemoryStore   compartido entre los workers de serve.py: una tabla de
+                      hash en memoria compartida creada por el maestro antes
+                      del fork (con sus locks), sin idas y vueltas a otro
+                      proceso. Si un lock no se consigue en 50 ms (un worker
+                      murió con él tomado) se deja pasar el pedido.
+
+Rechazar cuesta un par de microsegundos y ocurre antes de tocar bcrypt o
+Mongo.
+"""
+import hashlib
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RateLimited(Exception):
+    def __init__(self, rule, retry_after):
+        super().__init__(f"rate limit exceeded ({rule})")
+        self.rule = rule
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+def parse_rule(spec):
+    """"N/S" → (tokens por segundo, capacidad)"""
+    count, seconds = spec.split("/")
+    return float(count) / float(seconds), float(count)
+
+
+# -------------------
+# Stores
+# -------------------
+class MemoryStore:
+    def __init__(self, stripes=64, max_keys=200000):
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+        self._max_per_stripe = max(1, max_keys // stripes)
+
+    @contextmanager
+    def cell(self, key):
+        data, lock = self._stripes[hash(key) % len(self._stripes)]
+        with lock:
+            cell = data.get(key)
+            if cell is None:
+                if len(data) >= self._max_per_stripe:
+                    # el más viejo de la franja; como mucho reaparece con el bucket lleno
+                    del data[next(iter(data))]
+                cell = data[key] = [0.0, 0.0, 0.0]
+            yield cell
+
+
+class SharedMemoryStore:
+    """
+    Tabla de `slots` celdas (hash de la clave + tres floats) en memoria
+    compartida. Cada franja es un tramo contiguo de la tabla con su propio
+    lock; dentro se prueban `probe` celdas y si no hay lugar se reemplaza la
+    usada hace más tiempo. Hay que crearla antes del fork.
+    """
+    SLOT = struct.Struct("<Qddd")
+
+    def __init__(self, slots=65536, stripes=64, probe=4):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        self._per_stripe = max(probe, slots // stripes)
+        self._stripes = stripes
+        self._probe = probe
+        self._shm = shared_memory.SharedMemory(create=True, size=self._per_stripe * stripes * self.SLOT.size)
+        self._shm.buf[:] = bytes(len(self._shm.buf))
+        self._locks = [multiprocessing.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def cell(self, key):
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+        stripe = h % self._stripes
+        lock = self._locks[stripe]
+        if not lock.acquire(timeout=0.05):
+            yield [0.0, 0.0, 0.0]  # sin lock: el cambio se descarta
+            return
+        try:
+            buf, size = self._shm.buf, self.SLOT.size
+            first = stripe * self._per_stripe
+            start = (h // self._stripes) % self._per_stripe
+            offset, oldest = None, None
+            for i in range(self._probe):
+                at = (first + (start + i) % self._per_stripe) * size
+                slot_hash, a, b, c = self.SLOT.unpack_from(buf, at)
+                if slot_hash == h:
+                    offset, cell = at, [a, b, c]
+                    break
+                if slot_hash == 0 and offset is None:
+                    offset, cell = at, [0.0, 0.0, 0.0]
+                elif oldest is None or b < oldest[1]:
+                    oldest = (at, b)
+            if offset is None:
+                offset, cell = oldest[0], [0.0, 0.0, 0.0]
+            yield cell
+            self.SLOT.pack_into(buf, offset, h, *cell)
+        finally:
+            lock.release()
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+# el maestro de serve.py deja acá el store compartido antes de hacer fork
+shared_store = None
+
+
+# -------------------
+# Limitador
+# -------------------
+class RateLimiter:
+    def __init__(self, store, rules, backoff=(3, 1.0, 900.0, 900.0), enabled=True, clock=time.monotonic):
+        """
+        rules: nombre → (tokens por segundo, capacidad).
+        backoff: (fallos libres, base, cap, window) en segundos.
+        """
+        self.store = store
+        self.rules = dict(rules)
+        self.free, self.base, self.cap, self.window = backoff
+        self.enabled = enabled
+        self.clock = clock
+
+    def hit(self, rule, key, cost=1.0):
+        """Consume `cost` tokens del bucket (rule, key) o levanta RateLimited"""
+        if not self.enabled or key is None:
+            return
+        rate, burst = self.rules[rule]
+        now = self.clock()
+        with self.store.cell(f"b:{rule}:{key}") as cell:
+            # celda: [tokens, actualizado, usada]
+            tokens = burst if not cell[2] else min(burst, cell[0] + (now - cell[1]) * rate)
+            allowed = tokens >= cost
+            cell[0], cell[1], cell[2] = (tokens - cost if allowed else tokens), now, 1.0
+        if not allowed:
+            raise RateLimited(rule, (cost - tokens) / rate)
+
+    def check_backoff(self, rule, key):
+        """RateLimited si la clave está bloqueada por fallos recientes"""
+        if not self.enabled or key is None:
+            return
+        now = self.clock()
+        with self.store.cell(f"f:{rule}:{key}") as cell:
+            # celda: [fallos, bloqueada hasta, último fallo]
+            blocked_until = cell[1]
+        if blocked_until > now:
+            raise RateLimited(rule, blocked_until - now)
+
+    def failure(self, rule, key):
+        if not self.enabled or key is None:
+            return
+        now = self.clock()
+        with self.store.cell(f"f:{rule}:{key}") as cell:
+            failures = 0.0 if now - cell[2] > self.window else cell[0]
+            failures += 1
+            cell[0], cell[2] = failures, now
+            if failures > self.free:
+                cell[1] = now + min(self.cap, self.base * 2 ** min(failures - self.free - 1, 32))
+
+    def success(self, rule, key):
+        if not self.enabled or key is None:
+            return
+        with self.store.cell(f"f:{rule}:{key}") as cell:
+            cell[0] = cell[1] = cell[2] = 0.0
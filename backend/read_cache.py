@@ -0,0 +1,123 @@
+"""
+Cache de lectura versionado para GET /pilots y GET /teams.
+
+Se guarda el JSON ya serializado (bytes) junto con su ETag. Cada nombre de
+cache tiene un contador de generación: las escrituras locales lo incrementan
+con bump() y un change stream de Mongo hace lo mismo con las escrituras de
+otros workers. Una entrada sólo es válida si se construyó con la generación
+vigente, así que nunca se sirve un listado viejo después de un bump.
+
+Si el change stream no está disponible (mongod standalone), las entradas
+expiran a los max_age segundos para acotar cuánto puede durar un dato viejo
+escrito por otro proceso. Con always_expire también expiran con el change
+stream activo: si el listado se arma leyendo de un secundario puede ser
+anterior al bump que lo invalidó.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger("read_cache")
+
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "generation", "created", "headers", "variants")
+
+    def __init__(self, body: bytes, generation: int, headers=None):
+        self.body = body
+        self.headers = headers
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.generation = generation
+        self.created = time.monotonic()
+        # cuerpo comprimido por encoding (br, gzip), calculado la primera vez que se pide
+        self.variants = {}
+
+    def variant(self, encoding, compress):
+        body = self.variants.get(encoding)
+        if body is None:
+            body = self.variants[encoding] = compress(self.body, encoding)
+        return body
+
+
+class ReadCache:
+    def __init__(self, max_entries=64, max_age=None, dependencies=None, always_expire=False):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.always_expire = always_expire
+        # colección de Mongo -> nombres de cache que dependen de ella
+        self.dependencies = dependencies or {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._generations = defaultdict(int)
+        self._entries = defaultdict(OrderedDict)
+        self._watcher = None
+        self._watching = False
+
+    def generation(self, name):
+        return self._generations[name]
+
+    def bump(self, *names):
+        """Invalida todo lo cacheado bajo esos nombres"""
+        with self._lock:
+            for name in names:
+                self._generations[name] += 1
+                self._entries[name].clear()
+
+    def bump_collection(self, collection):
+        self.bump(*self.dependencies.get(collection, (collection,)))
+
+    def get(self, name, key=""):
+        with self._lock:
+            entry = self._entries[name].get(key)
+            if entry is None or entry.generation != self._generations[name] or self._expired(entry):
+                self.misses += 1
+                return None
+            self._entries[name].move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, name, key, body: bytes, generation: int, headers=None) -> CacheEntry:
+        """Guarda el cuerpo si la generación no cambió mientras se construía"""
+        entry = CacheEntry(body, generation, headers)
+        with self._lock:
+            if generation == self._generations[name]:
+                entries = self._entries[name]
+                entries[key] = entry
+                entries.move_to_end(key)
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+        return entry
+
+    def _expired(self, entry):
+        if (self._watching and not self.always_expire) or not self.max_age:
+            return False
+        return time.monotonic() - entry.created > self.max_age
+
+    # -------------------
+    # Change stream
+    # -------------------
+    def watch(self, db, collections):
+        """Arranca un hilo que invalida ante escrituras de otros workers"""
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(db, list(collections)), name="read-cache-watch", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch_loop(self, db, collections):
+        pipeline = [{"$match": {"ns.coll": {"$in": collections}}}]
+        try:
+            with db.watch(pipeline, full_document=None) as stream:
+                self._watching = True
+                # Lo escrito antes de abrir el stream pudo perderse
+                self.bump(*{n for c in collections for n in self.dependencies.get(c, (c,))})
+                for change in stream:
+                    self.bump_collection(change["ns"]["coll"])
+        except Exception as e:
+            logger.warning("change stream no disponible, se usa expiración por tiempo: %s", e)
+        finally:
+            self._watching = False
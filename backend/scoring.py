@@ -0,0 +1,230 @@
+"""
+Motor de puntaje del fantasy.
+
+Al publicar los resultados de un evento:
+  1. se calculan los puntos de cada piloto (vectorizado con NumPy),
+  2. se aplican como $inc sobre pilots.current_score / pilots.stats,
+  3. se suman a los fantasy_teams que tienen a esos pilotos en su roster,
+  4. se actualiza el ranking global en derived_stats ("ranking").
+
+Todo es incremental: sólo se leen las filas de team_roster de los pilotos
+que sumaron algo, y cada fila de event_results guarda lo que ya aportó
+("scored"), así que republicar un evento corregido aplica sólo la diferencia.
+
+El evento se toma con un lease (events.scoring: dueño + vencimiento): si el
+proceso muere a mitad de camino, pasado el lease otro lo puede retomar. Antes
+de tocar nada se guarda la pasada en events.scoring_pass (id + diferencias por
+piloto) y cada $inc es condicional a que el documento no tenga ya esa pasada
+(scored_events.<evento>), así que retomar una pasada interrumpida no suma dos
+veces lo que ya se aplicó.
+"""
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger("scoring")
+
+# Puntos por posición (índice = posición final; 0 = sin posición)
+POINTS_BY_POSITION = np.array([0, 20, 15, 12, 10, 8, 6, 4, 3, 2, 1], dtype=np.int64)
+STAT_FIELDS = ("points", "podiums", "wins", "DNF")
+RANKING_TOP = 1000
+
+
+def score_rows(positions, dnf, points_table=POINTS_BY_POSITION):
+    """
+    Devuelve una matriz (n, 4) con puntos, podio, victoria y abandono por fila.
+    positions: array de int (0 si no terminó / sin dato); dnf: array de bool.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    dnf = np.asarray(dnf, dtype=bool)
+    valid = (positions > 0) & (positions < len(points_table)) & ~dnf
+    points = np.where(valid, points_table[np.clip(positions, 0, len(points_table) - 1)], 0)
+    finished = ~dnf & (positions > 0)
+    podium = finished & (positions <= 3)
+    win = finished & (positions == 1)
+    return np.stack([points, podium, win, dnf], axis=1).astype(np.int64)
+
+
+def roster_deltas(roster_team_idx, roster_pilot_idx, pilot_points, n_teams):
+    """Suma los puntos de cada piloto a los equipos que lo tienen en el roster"""
+    weights = pilot_points[roster_pilot_idx]
+    return np.bincount(roster_team_idx, weights=weights, minlength=n_teams).astype(np.int64)
+
+
+class ScoringInProgress(Exception):
+    """Otro worker está puntuando el mismo evento"""
+
+
+class ScoringEngine:
+    def __init__(self, get_db, points_table=POINTS_BY_POSITION, ranking_top=RANKING_TOP, on_team_deltas=None,
+                 lease_seconds=300):
+        self._get_db = get_db
+        self.on_team_deltas = on_team_deltas
+        self.points_table = points_table
+        self.ranking_top = ranking_top
+        self.lease = timedelta(seconds=lease_seconds)
+        self._lock = threading.Lock()
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    def publish_event(self, event_id: ObjectId) -> dict:
+        """Aplica los resultados del evento. Idempotente: republicar suma sólo la diferencia."""
+        db = self.db
+        owner = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        # libre (o el True de versiones anteriores, sin dueño) o con el lease vencido
+        claimed = db.events.find_one_and_update(
+            {"_id": event_id, "$or": [{"scoring": {"$not": {"$type": "object"}}}, {"scoring.until": {"$lt": now}}]},
+            {"$set": {"scoring": {"owner": owner, "until": now + self.lease}}},
+            projection={"scoring_pass": 1},
+        )
+        if claimed is None:
+            raise ScoringInProgress(str(event_id))
+
+        try:
+            with self._lock:
+                summary = self._apply(db, event_id, owner, claimed.get("scoring_pass"))
+            db.events.update_one(
+                {"_id": event_id},
+                {"$set": {"results_published": True, "scored_at": datetime.now(timezone.utc)}},
+            )
+            return summary
+        finally:
+            db.events.update_one({"_id": event_id, "scoring.owner": owner}, {"$unset": {"scoring": ""}})
+
+    def _plan(self, db, event_id, owner):
+        """Calcula las diferencias a aplicar y las guarda como pasada pendiente del evento"""
+        rows = list(db.event_results.find(
+            {"event_id": event_id}, {"pilot_id": 1, "position": 1, "dnf": 1, "scored": 1}
+        ))
+        if not rows:
+            return None
+        positions = [r.get("position") or 0 for r in rows]
+        dnf = [bool(r.get("dnf")) for r in rows]
+        new = score_rows(positions, dnf, self.points_table)
+        old = np.array([[r.get("scored", {}).get(f, 0) for f in STAT_FIELDS] for r in rows], dtype=np.int64)
+        delta = new - old
+        changed = np.flatnonzero(delta.any(axis=1))
+        if len(changed) == 0:
+            return None
+
+        scoring_pass = {
+            "id": uuid.uuid4().hex,
+            "rows": [{
+                "result_id": rows[i]["_id"],
+                "pilot_id": rows[i]["pilot_id"],
+                "new": [int(v) for v in new[i]],
+                "delta": [int(v) for v in delta[i]],
+            } for i in changed],
+        }
+        # sólo si seguimos siendo dueños y no quedó otra pasada a medias
+        recorded = db.events.update_one(
+            {"_id": event_id, "scoring.owner": owner, "scoring_pass": {"$exists": False}},
+            {"$set": {"scoring_pass": scoring_pass}},
+        )
+        if recorded.matched_count == 0:
+            raise ScoringInProgress(str(event_id))
+        return scoring_pass
+
+    def _apply(self, db, event_id, owner, pending=None):
+        resumed = pending is not None
+        scoring_pass = pending or self._plan(db, event_id, owner)
+        if scoring_pass is None:
+            return {"pilots": 0, "fantasy_teams": 0}
+        if resumed:
+            logger.warning("evento %s: retomando la pasada de puntaje %s", event_id, scoring_pass["id"])
+        pass_id, rows = scoring_pass["id"], scoring_pass["rows"]
+        marker = f"scored_events.{event_id}"
+
+        # 1) pilotos: cada $inc una sola vez por pasada
+        db.pilots.bulk_write([
+            UpdateOne({"_id": r["pilot_id"], marker: {"$ne": pass_id}}, {
+                "$inc": {
+                    "current_score": r["delta"][0],
+                    "stats.podiums": r["delta"][1],
+                    "stats.wins": r["delta"][2],
+                    "stats.DNF": r["delta"][3],
+                },
+                "$set": {marker: pass_id},
+            }) for r in rows
+        ], ordered=False)
+        db.event_results.bulk_write([
+            UpdateOne({"_id": r["result_id"]}, {"$set": {"scored": dict(zip(STAT_FIELDS, r["new"]))}})
+            for r in rows
+        ], ordered=False)
+
+        # 2) fantasy teams afectados (sólo filas de roster de pilotos con delta en puntos)
+        scored = [r for r in rows if r["delta"][0] != 0]
+        team_ids, team_delta = self._fantasy_deltas(
+            db, [r["pilot_id"] for r in scored], np.array([r["delta"][0] for r in scored], dtype=np.int64)
+        )
+        if team_ids and resumed:
+            # los que ya recibieron esta pasada antes de la interrupción
+            done = {t["_id"] for t in db.fantasy_teams.find({"_id": {"$in": team_ids}, marker: pass_id}, {"_id": 1})}
+            keep = [i for i, tid in enumerate(team_ids) if tid not in done]
+            team_ids, team_delta = [team_ids[i] for i in keep], team_delta[keep]
+        if team_ids:
+            ops = [
+                UpdateOne({"_id": tid, marker: {"$ne": pass_id}}, {"$inc": {"total_score": int(d)}, "$set": {marker: pass_id}})
+                for tid, d in zip(team_ids, team_delta) if d
+            ]
+            if ops:
+                db.fantasy_teams.bulk_write(ops, ordered=False)
+            if self.on_team_deltas:
+                self.on_team_deltas(team_ids, team_delta)
+
+        # 3) ranking
+        version = self.refresh_ranking(db)
+        db.events.update_one({"_id": event_id, "scoring_pass.id": pass_id}, {"$unset": {"scoring_pass": ""}})
+
+        logger.info("evento %s: %d pilotos y %d fantasy teams actualizados", event_id, len(rows), len(team_ids))
+        return {"pilots": len(rows), "fantasy_teams": len(team_ids), "ranking_version": version}
+
+    def _fantasy_deltas(self, db, pilot_ids, pilot_points):
+        if not pilot_ids:
+            return [], np.array([], dtype=np.int64)
+
+        pilot_index = {pid: i for i, pid in enumerate(pilot_ids)}
+        team_index = {}
+        roster_team_idx, roster_pilot_idx = [], []
+        for r in db.team_roster.find({"pilot_id": {"$in": pilot_ids}}, {"_id": 0, "fantasy_team_id": 1, "pilot_id": 1}):
+            tid = r["fantasy_team_id"]
+            roster_team_idx.append(team_index.setdefault(tid, len(team_index)))
+            roster_pilot_idx.append(pilot_index[r["pilot_id"]])
+
+        deltas = roster_deltas(
+            np.array(roster_team_idx, dtype=np.int64),
+            np.array(roster_pilot_idx, dtype=np.int64),
+            np.asarray(pilot_points, dtype=np.int64),
+            len(team_index),
+        )
+        return list(team_index), deltas
+
+    def refresh_ranking(self, db=None):
+        """Guarda el top del ranking en derived_stats (key='ranking') y devuelve su nueva versión"""
+        if db is None:
+            db = self.db
+        top = list(db.fantasy_teams.find({}, {"name": 1, "user_id": 1, "total_score": 1})
+                   .sort([("total_score", -1), ("_id", 1)]).limit(self.ranking_top))
+        ranking = [{
+            "rank": i + 1,
+            "fantasy_team_id": str(t["_id"]),
+            "user_id": str(t["user_id"]) if t.get("user_id") else None,
+            "name": t.get("name"),
+            "total_score": t.get("total_score", 0),
+        } for i, t in enumerate(top)]
+        doc = db.derived_stats.find_one_and_update(
+            {"key": "ranking"},
+            {"$set": {"json_value": ranking, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+            projection={"version": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["version"]
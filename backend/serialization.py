@@ -0,0 +1,189 @@
+"""
+Serialización y compresión de las respuestas de la API.
+
+FastJSONProvider reemplaza al provider JSON de Flask: con orjson (si está
+instalado) serializa en C y entiende datetime (ISO 8601, las fechas naive de
+pymongo se marcan UTC), arrays/escalares de NumPy y, vía `default`,
+ObjectId, Decimal128 y bytes; sin orjson usa json de la biblioteca estándar
+con el mismo `default`. Así las vistas devuelven los documentos tal cual,
+sin convertir campo por campo.
+
+Si el cliente pide application/msgpack (o application/x-msgpack) en Accept y
+el paquete msgpack está instalado, jsonify responde MessagePack con los
+mismos tipos (fechas como texto ISO 8601, ids como texto).
+
+Compressor comprime en after_request los cuerpos de JSON/MessagePack/texto de
+más de `min_size` bytes con brotli o gzip según Accept-Encoding. El ETag
+pasa a débil (como hace nginx): el contenido es el mismo, los bytes no.
+"""
+import base64
+import gzip
+import json
+from datetime import date, datetime, timezone
+
+from bson import Decimal128, ObjectId
+from flask import request
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # sin orjson: json de la biblioteca estándar
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # sin msgpack siempre se responde JSON
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # sin brotli sólo gzip
+    brotli = None
+
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE = (JSON_MIMETYPE,) + MSGPACK_MIMETYPES + ("text/plain", "text/csv", "text/html")
+
+
+def default(obj):
+    """Tipos que ni orjson ni json conocen"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(obj)).decode("ascii")
+    if hasattr(obj, "tolist"):  # escalares y arrays de NumPy (sólo sin orjson)
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _default_with_dates(obj):
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            obj = obj.replace(tzinfo=timezone.utc)
+        return obj.isoformat()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    return default(obj)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj):
+        return json.dumps(obj, default=_default_with_dates, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps_msgpack(obj):
+    return msgpack.packb(obj, default=_default_with_dates, use_bin_type=True, datetime=False)
+
+
+def wants_msgpack():
+    if msgpack is None:
+        return False
+    accept = request.accept_mimetypes
+    best = accept.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return best in MSGPACK_MIMETYPES
+
+
+class FastJSONProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode("utf-8")
+
+    def dumps_bytes(self, obj):
+        return dumps_bytes(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_msgpack():
+            response = self._app.response_class(dumps_msgpack(obj), mimetype=MSGPACK_MIMETYPES[0])
+        else:
+            response = self._app.response_class(dumps_bytes(obj), mimetype=JSON_MIMETYPE)
+        if msgpack is not None:
+            response.vary.add("Accept")
+        return response
+
+
+# -------------------
+# Compresión
+# -------------------
+def accepted_encodings(accept_encoding):
+    """Accept-Encoding → {encoding: q}; un q ilegible cuenta como 0"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def pick_encoding(accept_encoding):
+    """br o gzip según lo que acepta el cliente (q=0 descarta)"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class Compressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.saved_bytes = 0
+        self.compressed = 0
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, self.gzip_level, mtime=0)
+
+    def count(self, data, compressed):
+        self.compressed += 1
+        self.saved_bytes += len(data) - len(compressed)
+
+    def encoding_for(self, body_size):
+        """Encoding para un cuerpo de ese tamaño en el request actual (o None)"""
+        if body_size < self.min_size:
+            return None
+        return pick_encoding(request.headers.get("Accept-Encoding", ""))
+
+    def apply(self, response):
+        """Comprime la respuesta si corresponde (after_request)"""
+        response.vary.add("Accept-Encoding")
+        if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+                or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE):
+            return response
+        data = response.get_data()
+        encoding = self.encoding_for(len(data))
+        if encoding is None:
+            return response
+        compressed = self.compress(data, encoding)
+        self.count(data, compressed)
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,191 @@
+"""
+Entrada de producción del backend.
+
+Levanta N procesos worker (pre-fork) que comparten el mismo socket de escucha.
+Cada worker corre main.app sobre el event loop de gevent: una conexión SSE o
+WebSocket ociosa es un greenlet de pocos KB y no un hilo del sistema.
+
+El broker del bus (Unix socket), por el que los workers se reenvían los
+eventos SSE y Socket.IO, corre en un proceso propio. El maestro no levanta
+hilos: sólo forkea y reinicia workers (y el broker) caídos, así que cada fork,
+también el de un reinicio, sale de un proceso con un único hilo.
+
+Uso:
+    python serve.py --workers 4 --port 5000
+    python serve.py --workers 1            # un proceso, bus local
+
+Para main.py en modo desarrollo (threading, debug) seguir usando
+`python main.py`.
+"""
+import argparse
+import logging
+import os
+import resource
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+
+def raise_fd_limit():
+    """Cada conexión abierta es un descriptor: subir el límite blando al duro"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def make_listener(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(listener):
+    """Cuerpo de cada worker: parchear con gevent ANTES de importar main"""
+    from gevent import monkey
+    monkey.patch_all()
+
+    from gevent.pywsgi import WSGIServer
+
+    # El socket se creó antes del parche: se envuelve en uno cooperativo
+    listener = socket.socket(listener.family, listener.type, fileno=listener.detach())
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    handler_class = None
+    try:
+        from geventwebsocket.handler import WebSocketHandler
+        handler_class = WebSocketHandler
+    except ImportError:
+        # Sin gevent-websocket Socket.IO usa long-polling
+        pass
+
+    # access log por el pipeline de main (canal "access", muestreado); errores al root
+    kwargs = {"log": logging.getLogger("access"), "error_log": logging.getLogger("gevent")}
+    if handler_class is not None:
+        kwargs["handler_class"] = handler_class
+    server = WSGIServer(listener, main.app, **kwargs)
+    server.serve_forever()
+
+
+def spawn(listener):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # un reinicio se forkea con los handlers del maestro ya instalados
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            run_worker(listener)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def spawn_broker(path, listener):
+    """El broker en un proceso aparte: sus hilos y sockets no se heredan en los forks del maestro"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            listener.close()
+            from event_bus import UnixSocketBroker
+            broker = UnixSocketBroker(path).start()
+
+            def stop(signum, frame):
+                broker.close()
+                os._exit(0)
+
+            signal.signal(signal.SIGTERM, stop)
+            # Ctrl-C llega a todo el grupo: el broker espera el SIGTERM del maestro
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            while True:
+                signal.pause()
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--bus-path", default=os.getenv("BUS_SOCKET", os.path.join(tempfile.gettempdir(), "tc2000-bus.sock")))
+    args = parser.parse_args()
+
+    os.environ["ASYNC_MODE"] = "gevent"
+    if args.workers > 1:
+        os.environ.setdefault("EVENT_BUS_URL", f"unix://{args.bus_path}")
+    # Con varios workers el cache se invalida por el bus además del change stream
+    print(f"límite de descriptores: {raise_fd_limit()}")
+
+    listener = make_listener(args.host, args.port, args.backlog)
+    if args.workers <= 1:
+        run_worker(listener)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Buckets de límite de tasa compartidos: la memoria y sus locks se heredan en el fork
+    shared_limits = None
+    if os.getenv("RATE_LIMIT_BACKEND", "shared") == "shared":
+        import rate_limit
+        shared_limits = rate_limit.shared_store = rate_limit.SharedMemoryStore(
+            slots=int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+        )
+
+    # El maestro nunca tiene otro hilo: el broker va en su proceso y los
+    # workers (y sus reinicios) se forkean de acá
+    broker = spawn_broker(args.bus_path, listener)
+    workers = {spawn(listener) for _ in range(args.workers)}
+    print(f"{len(workers)} workers en {args.host}:{args.port}, bus en {args.bus_path} (pid {broker})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid == broker:
+            if not stopping:
+                print(f"broker {pid} terminó ({status}), se reinicia")
+                time.sleep(0.5)
+                broker = spawn_broker(args.bus_path, listener)
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"worker {pid} terminó ({status}), se reinicia")
+            time.sleep(0.5)
+            workers.add(spawn(listener))
+
+    try:
+        os.kill(broker, signal.SIGTERM)
+        os.waitpid(broker, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
+    if shared_limits is not None:
+        shared_limits.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Hub de difusión SSE.
+
+Cada cliente conectado a /sse tiene su propio buffer circular acotado, de modo
+que todos los eventos llegan a todas las consolas abiertas. Publicar nunca
+bloquea: si un suscriptor es lento se descarta su mensaje más viejo (o se
+descarta el pendiente con la misma clave de coalescencia, y el nuevo va al
+final con su id: los ids llegan siempre en orden).
+
+Un buffer de replay compartido permite reanudar con el header Last-Event-ID.
+"""
+import json
+import threading
+from collections import deque
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COALESCE = "coalesce"
+
+
+def format_event(event_id, message: dict) -> str:
+    """Arma el frame SSE (id + data) una sola vez por evento"""
+    data = json.dumps(message, default=str)
+    if event_id is None:
+        return f"data: {data}\n\n"
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+class Subscriber:
+    """Buffer acotado de un cliente SSE"""
+
+    def __init__(self, hub, maxlen, policy):
+        self.hub = hub
+        self.policy = policy
+        self.dropped = 0
+        self._maxlen = maxlen
+        self._buffer = deque()
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def push(self, entry):
+        """entry = [event_id, coalesce_key, frame]. Nunca bloquea."""
+        with self._cond:
+            key = entry[1]
+            if self.policy == POLICY_COALESCE and key is not None:
+                pending = self._pending.pop(key, None)
+                if pending is not None:
+                    # Sacar el pendiente: el nuevo va al final, así el cliente
+                    # no ve un id menor después de uno mayor
+                    self._discard(pending)
+                    self.dropped += 1
+            if len(self._buffer) >= self._maxlen:
+                old = self._buffer.popleft()
+                if old[1] is not None:
+                    self._pending.pop(old[1], None)
+                self.dropped += 1
+            entry = list(entry)
+            self._buffer.append(entry)
+            if key is not None:
+                self._pending[key] = entry
+            self._cond.notify()
+
+    def _discard(self, entry):
+        # por identidad: dos entries pueden ser iguales como listas
+        for i, e in enumerate(self._buffer):
+            if e is entry:
+                del self._buffer[i]
+                return
+
+    def get(self, timeout=None):
+        """Devuelve la lista de frames pendientes, o [] si venció el timeout"""
+        with self._cond:
+            if not self._buffer and not self._closed:
+                self._cond.wait(timeout)
+            frames = [e[2] for e in self._buffer]
+            self._buffer.clear()
+            self._pending.clear()
+            return frames
+
+    def depth(self):
+        return len(self._buffer)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.hub.unsubscribe(self)
+
+
+class SSEHub:
+    """Difunde cada evento a todos los suscriptores sin bloquear al emisor"""
+
+    def __init__(self, subscriber_buffer=256, replay_size=1000, policy=POLICY_DROP_OLDEST):
+        self.subscriber_buffer = subscriber_buffer
+        self.policy = policy
+        self.published = 0
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._replay = deque(maxlen=replay_size)
+        self._next_id = 1
+
+    def publish(self, message: dict, coalesce_key=None, event_id=None) -> int:
+        """Publica un mensaje; devuelve el id asignado (o el que vino del bus)"""
+        with self._lock:
+            if event_id is None:
+                event_id = self._next_id
+            self._next_id = max(self._next_id, event_id + 1)
+            entry = (event_id, coalesce_key, format_event(event_id, message))
+            self._replay.append(entry)
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        for sub in subscribers:
+            sub.push(entry)
+        return event_id
+
+    def subscribe(self, last_event_id=None) -> Subscriber:
+        """Registra un cliente; con last_event_id reenvía lo que se perdió"""
+        sub = Subscriber(self, self.subscriber_buffer, self.policy)
+        with self._lock:
+            if last_event_id is not None:
+                for entry in self._replay:
+                    if entry[0] > last_event_id:
+                        sub.push(entry)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "replay_size": len(self._replay),
+            "max_depth": max((s.depth() for s in subscribers), default=0),
+            "dropped": sum(s.dropped for s in subscribers),
+        }
+
+
+def parse_last_event_id(value):
+    """Convierte el header Last-Event-ID a int (None si no es válido)"""
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,310 @@
+"""
+Pipeline de archivos estáticos del frontend.
+
+Al arrancar:
+- cada JS/CSS (y los íconos/imágenes que referencian las páginas) se copia a
+  cache_dir con el hash del contenido en el nombre (main.3f2a9c1b7e.js) y se
+  sirve desde /assets/ con Cache-Control inmutable por un año;
+- las referencias entre archivos (import './components.js', url(...), los
+  src/href de index.html y admin.html) se reescriben a los nombres con hash,
+  así que cambiar un archivo cambia la URL de todo lo que depende de él;
+- de cada archivo de texto se guarda también la versión .gz y .br (si está el
+  paquete brotli) y se elige según Accept-Encoding;
+- las páginas HTML mantienen su nombre y se sirven con no-cache + ETag.
+
+Las imágenes subidas (logos de equipos) se sirven desde /media/<variante>/
+como miniaturas WebP (o el formato original si el cliente no acepta WebP)
+generadas una sola vez con Pillow y guardadas en disco. Si Pillow no está
+instalado se sirve el original.
+
+Los archivos salen por send_file, que usa wsgi.file_wrapper (sendfile en
+servidores que lo soportan); con USE_X_SENDFILE=1 se delega a nginx/apache.
+"""
+import base64
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+from serialization import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # sin brotli sólo se precomprime gzip
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # sin Pillow no hay miniaturas: se sirve el original
+    Image = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MEDIA_MAX_AGE = "public, max-age=86400"
+
+HASHED_EXTENSIONS = {".js", ".css", ".ico", ".png", ".jpg", ".jpeg", ".svg", ".webp", ".woff2"}
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".ico"}
+MEDIA_VARIANTS = {"thumb": 128, "card": 512}
+# nombre con hash de contenido (logo-<16 hex>.png): el archivo nunca cambia
+CONTENT_HASHED = re.compile(r"-[0-9a-f]{16}\.[a-z0-9]+$")
+
+_HTML_REF = re.compile(r'\b(src|href)="([^"]+)"')
+_JS_IMPORT = re.compile(r"""(\bfrom\s*|\bimport\s*\(?\s*)(['"])(\.{1,2}/[^'"]+)\2""")
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF8", "gif"),
+)
+
+
+class AssetError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def content_hash(data, size=10):
+    return hashlib.blake2b(data, digest_size=8).hexdigest()[:size]
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _local_ref(ref):
+    """Referencia relativa a un archivo propio (no http://, //, data:, #)"""
+    return not re.match(r"^([a-z]+:|//|#|/)", ref, re.I)
+
+
+class AssetPipeline:
+    def __init__(self, root, cache_dir, uploads_dir=None, pages=("index.html", "admin.html")):
+        self.root = os.path.abspath(root)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.uploads_dir = os.path.abspath(uploads_dir or os.path.join(self.root, "resources", "uploads"))
+        self.pages = pages
+        self.manifest = {}   # ruta lógica → ruta con hash
+        self.built = {}      # ruta con hash → archivo en cache_dir
+        self.page_etags = {}
+
+    # -------------------
+    # Build
+    # -------------------
+    def build(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if os.path.abspath(dirpath).startswith(self.uploads_dir):
+                dirnames[:] = []
+                continue
+            for name in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/")
+                if os.path.splitext(name)[1].lower() in HASHED_EXTENSIONS:
+                    self._build_asset(rel, set())
+        for page in self.pages:
+            if os.path.exists(os.path.join(self.root, page)):
+                self._build_page(page)
+        return self
+
+    def _build_asset(self, rel, building):
+        if rel in self.manifest:
+            return self.manifest[rel]
+        path = os.path.join(self.root, rel)
+        ext = os.path.splitext(rel)[1].lower()
+        if ext not in HASHED_EXTENSIONS or rel in building or not os.path.isfile(path):
+            return None
+        building.add(rel)
+        with open(path, "rb") as f:
+            data = f.read()
+        if ext == ".js":
+            data = self._rewrite(data, rel, _JS_IMPORT, 3, building)
+        elif ext == ".css":
+            data = self._rewrite(data, rel, _CSS_URL, 2, building)
+        stem, _ = os.path.splitext(rel)
+        hashed = f"{stem}.{content_hash(data)}{ext}"
+        self._store(hashed, data, ext in COMPRESSIBLE)
+        self.manifest[rel] = hashed
+        building.discard(rel)
+        return hashed
+
+    def _rewrite(self, data, rel, pattern, group, building):
+        """Reemplaza las referencias locales por la versión con hash (relativa al archivo)"""
+        base = posixpath.dirname(rel)
+
+        def replace(m):
+            ref = m.group(group)
+            target = posixpath.normpath(posixpath.join(base, ref.split("?")[0].split("#")[0]))
+            hashed = self._build_asset(target, building) if _local_ref(ref) else None
+            if not hashed:
+                return m.group(0)
+            new = posixpath.relpath(hashed, base or ".")
+            if not new.startswith("."):
+                new = "./" + new
+            start, end = m.span(group)
+            return m.group(0)[:start - m.start()] + new + m.group(0)[end - m.start():]
+
+        return pattern.sub(replace, data.decode("utf-8")).encode("utf-8")
+
+    def _build_page(self, page):
+        with open(os.path.join(self.root, page), "rb") as f:
+            html = f.read().decode("utf-8")
+
+        def replace(m):
+            ref = m.group(2)
+            if not _local_ref(ref):
+                return m.group(0)
+            target = posixpath.normpath(ref.replace("\\", "/"))
+            hashed = self._build_asset(target, set())
+            return f'{m.group(1)}="/assets/{hashed}"' if hashed else m.group(0)
+
+        data = _HTML_REF.sub(replace, html).encode("utf-8")
+        self.page_etags[page] = content_hash(data, 16)
+        self._store(f"_pages/{page}", data, True)
+
+    def _store(self, name, data, compress):
+        path = os.path.join(self.cache_dir, name)
+        self.built[name] = path
+        if os.path.exists(path) and not name.startswith("_pages/"):
+            return  # mismo hash → mismo contenido, ya está construido
+        _write_atomic(path, data)
+        if compress:
+            _write_atomic(path + ".gz", gzip.compress(data, 9, mtime=0))
+            if brotli is not None:
+                _write_atomic(path + ".br", brotli.compress(data, quality=11))
+
+    # -------------------
+    # Servir
+    # -------------------
+    def url(self, rel):
+        hashed = self.manifest.get(rel)
+        return f"/assets/{hashed}" if hashed else f"/{rel}"
+
+    def send_asset(self, hashed):
+        path = self.built.get(hashed)
+        if path is None:
+            abort(404)
+        return self._send(path, hashed, IMMUTABLE, etag=hashed)
+
+    def send_page(self, page):
+        name = f"_pages/{page}"
+        if name not in self.built:
+            abort(404)
+        return self._send(self.built[name], page, REVALIDATE, etag=self.page_etags[page])
+
+    def _send(self, path, name, cache_control, etag):
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        encoding = self._pick_encoding(path)
+        suffix = {"br": ".br", "gzip": ".gz"}.get(encoding, "")
+        resp = send_file(path + suffix, mimetype=mimetype, conditional=True, etag=f"{etag}{suffix}")
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = cache_control
+        return resp
+
+    @staticmethod
+    def _pick_encoding(path):
+        """El precomprimido con mayor q que acepte el cliente (q=0 lo descarta; br gana los empates)"""
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        options = [(accepted.get(encoding, 0), encoding == "br", encoding)
+                   for encoding, suffix in (("br", ".br"), ("gzip", ".gz")) if os.path.exists(path + suffix)]
+        q, _, encoding = max(options, default=(0, False, None))
+        return encoding if q > 0 else None
+
+    # -------------------
+    # Media (imágenes subidas)
+    # -------------------
+    def send_media(self, variant, rel):
+        src = safe_join(self.uploads_dir, rel)
+        if src is None or not os.path.isfile(src):
+            abort(404)
+        if variant != "orig" and variant not in MEDIA_VARIANTS:
+            abort(404)
+
+        path = src
+        webp = "image/webp" in request.headers.get("Accept", "")
+        if variant != "orig" and Image is not None:
+            try:
+                path = self._media_variant(src, rel, variant, webp)
+            except (OSError, Image.DecompressionBombError):
+                # no es una imagen que Pillow sepa leer (UnidentifiedImageError es un OSError)
+                abort(404)
+
+        cache_control = IMMUTABLE if CONTENT_HASHED.search(rel) else MEDIA_MAX_AGE
+        resp = send_file(path, conditional=True)
+        resp.headers["Vary"] = "Accept"
+        resp.headers["Cache-Control"] = cache_control
+        return resp
+
+    def _media_variant(self, src, rel, variant, webp):
+        st = os.stat(src)
+        fmt = "webp" if webp else os.path.splitext(rel)[1].lstrip(".").lower()
+        key = content_hash(f"{rel}:{st.st_mtime_ns}:{st.st_size}".encode(), 16)
+        out = os.path.join(self.cache_dir, "_media", variant, f"{key}.{fmt}")
+        if os.path.exists(out):
+            return out
+        size = MEDIA_VARIANTS[variant]
+        with Image.open(src) as img:
+            img.thumbnail((size, size))
+            if fmt in ("jpg", "jpeg") and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(out))
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, format="WEBP" if webp else Image.registered_extensions().get(f".{fmt}", "PNG"),
+                         quality=80)
+            os.replace(tmp, out)
+        return out
+
+    def store_logo(self, value, folder="equipos"):
+        """
+        Guarda un logo recibido embebido (bytes, base64 o data URI) como archivo
+        con hash de contenido y devuelve su URL en /media/. Si `value` ya es una
+        URL o ruta se devuelve tal cual. AssetError si lo embebido no es PNG,
+        JPEG, GIF ni WebP (texto que por casualidad es base64 válido).
+        """
+        data = decode_image(value)
+        if data is None:
+            return value or None
+        if image_extension(data) == "bin":
+            raise AssetError("logo must be a png, jpeg, gif or webp image or a URL")
+        rel = f"{folder}/logo-{content_hash(data, 16)}.{image_extension(data)}"
+        path = os.path.join(self.uploads_dir, rel)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        return f"/media/thumb/{rel}"
+
+
+def decode_image(value):
+    """bytes de la imagen, o None si value es una referencia (URL/ruta) o está vacío"""
+    if not value:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    value = str(value).strip()
+    if value.startswith("data:"):
+        value = value.split(",", 1)[-1]
+    elif re.match(r"^([a-z]+:|/|\.)", value, re.I):
+        return None
+    try:
+        return base64.b64decode(value, validate=True)
+    except ValueError:
+        return None
+
+
+def image_extension(data):
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
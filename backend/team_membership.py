@@ -0,0 +1,183 @@
+"""
+Pertenencia de pilotos a equipos reales.
+
+pilots.team_id es la fuente de verdad; pilots.team guarda una copia del
+nombre del equipo para que los listados de pilotos no necesiten $lookup. Lo
+que cambia esa relación (alta de piloto, rename y borrado de equipo) escribe
+las dos cosas:
+
+  - con transactions=True (replica set) el cambio del equipo y el
+    update_many de sus pilotos van en una misma transacción;
+  - sin transacciones el orden de las escrituras deja siempre un estado que
+    el verificador sabe terminar: el borrado marca el equipo (deleting), suelta
+    a los pilotos y recién al final borra el documento; el rename cambia el
+    equipo y después la copia en los pilotos.
+
+check() recorre los pilotos por lotes (cursor por _id) y corrige lo que haya
+quedado desfasado: borrados a medio terminar, nombres viejos, team_id que
+apuntan a equipos que ya no existen y el texto libre `team` de pilotos viejos
+sin team_id (si coincide con un equipo se adopta, si no se limpia). Los
+equipos de cada lote se releen después de leer sus pilotos, así que el nombre
+con el que se compara nunca es más viejo que el del piloto, y cada corrección
+es condicional sobre el team_id/team que se leyó del piloto: si un rename o un
+alta lo cambia en el medio, la corrección no aplica y queda para la próxima
+pasada. Un team_id cuenta como colgado sólo si el equipo ya no existe; los que
+están a medio borrar los termina el borrado.
+"""
+import logging
+import threading
+import time
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("team_membership")
+
+ACTIVE = {"deleting": {"$ne": True}}
+
+
+class TeamError(Exception):
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+class TeamMembership:
+    def __init__(self, get_db, transactions=False, batch_size=1000, start_task=None, sleep=time.sleep):
+        self._get_db = get_db
+        self.transactions = transactions
+        self.batch_size = batch_size
+        self._start_task = start_task or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._sleep = sleep
+        self.repaired = 0
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    def _run(self, write):
+        if self.transactions:
+            with self.db.client.start_session() as session:
+                return session.with_transaction(write)
+        return write()
+
+    # -------------------
+    # Operaciones
+    # -------------------
+    def resolve(self, team_id=None, team=None):
+        """Campos de equipo de un piloto a partir del id o del nombre"""
+        if team_id:
+            try:
+                query = {"_id": ObjectId(team_id)}
+            except Exception:
+                raise TeamError("invalid team id", 400)
+        elif team:
+            query = {"name": team}
+        else:
+            return {"team_id": None, "team": None}
+        doc = self.db.teams.find_one({**query, **ACTIVE}, {"name": 1})
+        if doc is None:
+            raise TeamError("unknown team")
+        return {"team_id": doc["_id"], "team": doc["name"]}
+
+    def rename(self, team_id, name):
+        """Devuelve los _id de los pilotos del equipo (para los deltas)"""
+        def write(session=None):
+            db = self.db
+            try:
+                team = db.teams.find_one_and_update(
+                    {"_id": team_id, **ACTIVE}, {"$set": {"name": name}},
+                    return_document=ReturnDocument.AFTER, session=session,
+                )
+            except DuplicateKeyError:
+                raise TeamError("team name already exists", 409)
+            if team is None:
+                raise TeamError("team not found", 404)
+            pilots = [p["_id"] for p in db.pilots.find({"team_id": team_id}, {"_id": 1}, session=session)]
+            db.pilots.update_many({"team_id": team_id, "team": {"$ne": name}}, {"$set": {"team": name}}, session=session)
+            return pilots
+        return self._run(write)
+
+    def delete(self, team_id):
+        """Borra el equipo y deja sin equipo a sus pilotos; devuelve sus _id"""
+        def write(session=None):
+            db = self.db
+            team = db.teams.find_one_and_update({"_id": team_id}, {"$set": {"deleting": True}}, session=session)
+            if team is None:
+                raise TeamError("team not found", 404)
+            pilots = self._release(db, team_id, session)
+            db.teams.delete_one({"_id": team_id}, session=session)
+            return pilots
+        return self._run(write)
+
+    @staticmethod
+    def _release(db, team_id, session=None):
+        pilots = [p["_id"] for p in db.pilots.find({"team_id": team_id}, {"_id": 1}, session=session)]
+        if pilots:
+            db.pilots.update_many({"team_id": team_id}, {"$set": {"team_id": None, "team": None}}, session=session)
+        return pilots
+
+    # -------------------
+    # Verificador
+    # -------------------
+    def check(self):
+        """Corrige desfasajes; devuelve cuántos pilotos se tocaron por motivo"""
+        db = self.db
+        fixed = {"deleted": 0, "renamed": 0, "dangling": 0, "free_text": 0}
+        for team in db.teams.find({"deleting": True}, {"_id": 1}):
+            fixed["deleted"] += len(self._release(db, team["_id"]))
+            db.teams.delete_one({"_id": team["_id"], "deleting": True})
+
+        last = None
+        while True:
+            query = {"_id": {"$gt": last}} if last else {}
+            batch = list(db.pilots.find(query, {"team_id": 1, "team": 1}).sort("_id", 1).limit(self.batch_size))
+            if not batch:
+                break
+            last = batch[-1]["_id"]
+            teams, by_name = self._teams_of(db, batch)
+            ops = []
+            for p in batch:
+                team_id, team = p.get("team_id"), p.get("team")
+                if team_id is not None and team_id in teams:
+                    current = teams[team_id]
+                    if current.get("deleting") or team == current["name"]:
+                        continue
+                    reason, update = "renamed", {"team": current["name"]}
+                elif team_id is not None:
+                    reason, update = "dangling", {"team_id": None, "team": None}
+                elif team is not None:
+                    adopted = by_name.get(team)
+                    reason, update = "free_text", {"team_id": adopted, "team": team if adopted else None}
+                else:
+                    continue
+                fixed[reason] += 1
+                ops.append(UpdateOne({"_id": p["_id"], "team_id": team_id, "team": team}, {"$set": update}))
+            if ops:
+                db.pilots.bulk_write(ops, ordered=False)
+        self.repaired += sum(fixed.values())
+        return fixed
+
+    @staticmethod
+    def _teams_of(db, batch):
+        """Equipos que nombra el lote, leídos recién (incluidos los que se están borrando)"""
+        ids = {p["team_id"] for p in batch if p.get("team_id") is not None}
+        names = {p["team"] for p in batch if p.get("team_id") is None and p.get("team") is not None}
+        teams = {t["_id"]: t for t in db.teams.find({"_id": {"$in": list(ids)}}, {"name": 1, "deleting": 1})} if ids else {}
+        by_name = {t["name"]: t["_id"] for t in db.teams.find({"name": {"$in": list(names)}, **ACTIVE}, {"name": 1})} if names else {}
+        return teams, by_name
+
+    def start(self, interval):
+        """Corre check() cada `interval` segundos en segundo plano"""
+        def loop():
+            while True:
+                self._sleep(interval)
+                try:
+                    fixed = self.check()
+                    if any(fixed.values()):
+                        logger.warning("equipos: pilotos corregidos %s", fixed)
+                except Exception:
+                    logger.exception("equipos: falló la verificación")
+        self._start_task(loop)
+        return self
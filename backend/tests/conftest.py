@@ -0,0 +1,46 @@
+"""
+Fixtures comunes de los tests: una base mongomock nueva por test y main.py
+importado una sola vez (sin change streams, scheduler ni checkers de fondo).
+
+    py -m pip install -r tests/requirements.txt
+    py -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("CACHE_CHANGE_STREAM", "0")
+os.environ.setdefault("EVENT_SCHEDULER", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TEAM_CHECK_INTERVAL_S", "0")
+os.environ.setdefault("ROSTER_CHECK_INTERVAL_S", "0")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# el snapshot del ranking no debe ir a parar al del backend
+os.environ.setdefault("LEADERBOARD_SNAPSHOT", os.path.join(tempfile.mkdtemp(prefix="tests_"), "leaderboard.snapshot"))
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().tc2000_test
+
+
+@pytest.fixture(scope="session")
+def main():
+    import main
+    return main
+
+
+@pytest.fixture
+def app(main, db, monkeypatch):
+    """main.app apuntado a la base del test"""
+    monkeypatch.setattr(main.mongo, "db", db)
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,99 @@
+import io
+
+import pytest
+from bson import ObjectId
+
+from bulk_import import (
+    FORMAT_CSV, FORMAT_NDJSON, BulkImport, detect_format, pilot_parser, read_rows, result_parser, team_parser,
+)
+
+
+def stream(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_detect_format():
+    assert detect_format("text/csv; charset=utf-8") == FORMAT_CSV
+    assert detect_format("application/x-ndjson") == FORMAT_NDJSON
+    assert detect_format(None) == FORMAT_NDJSON
+    assert detect_format("text/csv", explicit=FORMAT_NDJSON) == FORMAT_NDJSON
+    with pytest.raises(ValueError):
+        detect_format(None, explicit="xml")
+
+
+def test_read_rows_csv_strips_bom_and_spaces():
+    rows = list(read_rows(stream("﻿name , base_country\n Fiat , Argentina\nHonda,\n"), FORMAT_CSV))
+    assert rows == [(2, {"name": "Fiat", "base_country": "Argentina"}), (3, {"name": "Honda", "base_country": ""})]
+
+
+def test_read_rows_ndjson_marks_malformed_lines():
+    rows = list(read_rows(stream('{"name": "Fiat"}\n\nnope\n[1, 2]\n{"name": "Honda"}\n'), FORMAT_NDJSON))
+    assert rows == [(1, {"name": "Fiat"}), (3, None), (4, None), (5, {"name": "Honda"})]
+
+
+def test_pilot_parser(db):
+    team_id = ObjectId()
+    parse = pilot_parser({"Fiat": team_id})
+    key, op = parse({"car_number": "7", "name": "Ana", "team": "Fiat", "price": "25"})
+    assert key == 7
+    db.pilots.bulk_write([op])
+    pilot = db.pilots.find_one({"car_number": 7}, {"_id": 0, "created_at": 0})
+    assert pilot == {"car_number": 7, "name": "Ana", "team_id": team_id, "team": "Fiat", "price": 25,
+                     "current_score": 0, "stats": {"podiums": 0, "wins": 0, "DNF": 0}}
+
+    for row, message in [
+        ({"name": "Ana"}, "car_number is required"),
+        ({"car_number": "x", "name": "Ana"}, "invalid car_number"),
+        ({"car_number": 7}, "name is required"),
+        ({"car_number": 7, "name": "Ana", "team": "Otro"}, "unknown team 'Otro'"),
+    ]:
+        with pytest.raises(ValueError, match=message):
+            parse(row)
+
+
+def test_result_parser(db):
+    event_id, pilot_id = ObjectId(), ObjectId()
+    parse = result_parser({7: pilot_id}, lambda oid: oid == event_id)
+
+    def stored(row):
+        key, op = parse(row)
+        db.event_results.bulk_write([op])
+        return key, db.event_results.find_one({"event_id": event_id, "pilot_id": pilot_id}, {"_id": 0})
+
+    key, result = stored({"event_id": str(event_id), "car_number": "7", "position": "1"})
+    assert key == (event_id, pilot_id)
+    assert result == {"event_id": event_id, "pilot_id": pilot_id, "position": 1, "dnf": False}
+    # un abandono no lleva posición
+    _, result = stored({"event_id": str(event_id), "pilot_id": str(pilot_id), "dnf": "sí"})
+    assert result == {"event_id": event_id, "pilot_id": pilot_id, "position": None, "dnf": True}
+    assert db.event_results.count_documents({}) == 1
+
+    for row, message in [
+        ({"event_id": "x", "car_number": 7, "position": 1}, "invalid event_id"),
+        ({"event_id": str(ObjectId()), "car_number": 7, "position": 1}, "unknown event"),
+        ({"event_id": str(event_id), "car_number": 8, "position": 1}, "unknown car_number 8"),
+        ({"event_id": str(event_id), "car_number": 7}, "position is required"),
+    ]:
+        with pytest.raises(ValueError, match=message):
+            parse(row)
+
+
+def test_bulk_import_batches_and_reports_errors(db):
+    batches = []
+    job = BulkImport(db.teams, team_parser(), batch_size=2)
+    summary = job.run(read_rows(stream(
+        '{"name": "Fiat"}\n{"name": "Fiat", "base_country": "Italia"}\n{"base_country": "Argentina"}\n'
+        'roto\n{"name": "Honda"}\n{"name": "Toyota"}\n'
+    ), FORMAT_NDJSON), on_batch=lambda result, keys: batches.append(keys))
+
+    assert summary["rows"] == 6
+    assert summary["invalid"] == 2
+    assert summary["errors"] == [{"line": 3, "error": "name is required"}, {"line": 4, "error": "malformed row"}]
+    assert summary["upserted"] == 3
+    # la fila repetida dentro del lote queda con la última versión
+    assert batches == [["Fiat", "Honda"], ["Toyota"]]
+    assert db.teams.find_one({"name": "Fiat"})["base_country"] == "Italia"
+
+    again = BulkImport(db.teams, team_parser()).run(read_rows(stream('{"name": "Fiat"}\n'), FORMAT_NDJSON))
+    assert again["upserted"] == 0 and again["matched"] == 1
+    assert db.teams.count_documents({}) == 3
@@ -0,0 +1,107 @@
+import pytest
+from bson import ObjectId
+
+from event_scheduler import LIVE, freeze_rosters, release_rosters
+from fantasy_roster import RosterError, RosterService, VersionConflict
+
+
+@pytest.fixture
+def service(db):
+    return RosterService(lambda: db, budget=100, max_pilots=3, max_per_team=2)
+
+
+@pytest.fixture
+def pilots(db):
+    """Tres pilotos de un equipo real y uno sin equipo, 20 de precio cada uno"""
+    team_id = ObjectId()
+    docs = [{"name": f"P{i}", "price": 20, "team_id": team_id} for i in range(3)]
+    docs.append({"name": "Libre", "price": 20})
+    return db.pilots.insert_many(docs).inserted_ids
+
+
+@pytest.fixture
+def team(service):
+    return service.create(ObjectId(), "Equipo")["_id"]
+
+
+def rows(db, team_id):
+    return {r["pilot_id"] for r in db.team_roster.find({"fantasy_team_id": team_id})}
+
+
+def status(call, *args, **kwargs):
+    with pytest.raises(RosterError) as e:
+        call(*args, **kwargs)
+    return e.value.status
+
+
+def test_add_and_remove_keep_rows_in_sync(db, service, pilots, team):
+    service.add(team, pilots[0])
+    doc = service.add(team, pilots[3])
+    assert doc["size"] == 2 and doc["spent"] == 40 and doc["version"] == 3
+    assert rows(db, team) == {pilots[0], pilots[3]}
+
+    service.remove(team, pilots[0])
+    assert rows(db, team) == {pilots[3]}
+
+
+def test_roster_rules(service, pilots, team):
+    service.add(team, pilots[0])
+    assert status(service.add, team, pilots[0]) == 422
+    service.add(team, pilots[1])
+    # el tercero del mismo equipo real
+    assert status(service.add, team, pilots[2]) == 422
+    service.add(team, pilots[3])
+    assert status(service.add, team, ObjectId()) == 404
+
+
+def test_stale_version_is_a_conflict(service, pilots, team):
+    doc = service.add(team, pilots[0])
+    with pytest.raises(VersionConflict) as e:
+        service.add(team, pilots[1], version=doc["version"] - 1)
+    assert e.value.status == 409
+    assert e.value.current == doc["version"]
+
+
+def test_locked_rosters_reject_every_write(db, service, pilots, team):
+    service.add(team, pilots[0])
+    event_id = ObjectId()
+    freeze_rosters(db, event_id)
+
+    assert status(service.add, team, pilots[1]) == 423
+    assert status(service.remove, team, pilots[0]) == 423
+    assert status(service.transfer, team, pilots[0], pilots[3]) == 423
+    assert status(service.rename, team, "Otro") == 423
+    assert status(service.delete, team) == 423
+    assert service.get(team)["name"] == "Equipo"
+
+    release_rosters(db, event_id)
+    service.transfer(team, pilots[0], pilots[3])
+    service.rename(team, "Otro")
+    service.delete(team)
+    assert db.fantasy_teams.count_documents({}) == 0
+    assert rows(db, team) == set()
+
+
+def test_team_created_during_a_live_event_is_locked(db, service, pilots):
+    db.events.insert_one({"name": "Ronda", "status": LIVE})
+    team_id = service.create(ObjectId(), "Tarde")["_id"]
+    assert status(service.add, team_id, pilots[0]) == 423
+
+
+def test_check_repairs_drift_and_finishes_deletes(db, service, pilots, team):
+    service.add(team, pilots[0])
+    service.add(team, pilots[3])
+    # escritura cortada entre el documento y team_roster, y una fila de más
+    db.team_roster.delete_one({"fantasy_team_id": team, "pilot_id": pilots[0]})
+    db.team_roster.insert_one({"fantasy_team_id": team, "pilot_id": pilots[1]})
+    # un borrado que no llegó a terminar
+    gone = service.create(ObjectId(), "Borrado")["_id"]
+    service.add(gone, pilots[2])
+    db.fantasy_teams.update_one({"_id": gone}, {"$set": {"deleting": True}})
+    assert status(service.get, gone) == 404
+
+    assert service.check() == {"deleted": 1, "missing": 1, "extra": 1}
+    assert rows(db, team) == {pilots[0], pilots[3]}
+    assert db.fantasy_teams.count_documents({"_id": gone}) == 0
+    assert service.check() == {"deleted": 0, "missing": 0, "extra": 0}
+    assert service.repaired == 3
@@ -0,0 +1,128 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from leaderboard import SNAPSHOT_MAGIC, Leaderboard
+
+
+def add_team(db, score, name=None):
+    return db.fantasy_teams.insert_one({
+        "name": name, "user_id": ObjectId(), "total_score": score,
+    }).inserted_id
+
+
+def bump(db, version, age=0):
+    db.derived_stats.update_one({"key": "ranking"}, {"$set": {
+        "version": version, "updated_at": datetime.now(timezone.utc) - timedelta(seconds=age),
+    }}, upsert=True)
+
+
+def ids(board):
+    return [e["fantasy_team_id"] for e in board.page(0, 100)]
+
+
+def test_snapshot_round_trip():
+    board = Leaderboard()
+    board.load([(str(ObjectId()), score, f"T{score}", str(ObjectId())) for score in (5, 30, 12)])
+    board.set(str(ObjectId()), 12, None, None)
+    board.version = 7
+
+    copy = Leaderboard()
+    copy.loads(board.dumps())
+    assert copy.version == 7
+    assert copy.page(0, 10) == board.page(0, 10)
+    assert [e["total_score"] for e in copy.page(0, 10)] == [30, 12, 12, 5]
+
+
+def test_sync_reads_db_once_and_saves_snapshot(db, tmp_path):
+    path = str(tmp_path / "lb.snapshot")
+    first, second = add_team(db, 10), add_team(db, 20)
+    bump(db, 3, age=600)
+
+    board = Leaderboard().sync(db, path, min_interval=0)
+    assert ids(board) == [str(second), str(first)]
+    assert Leaderboard.snapshot_version(path) == 3
+
+    # otro worker arranca con el snapshot: no recorre fantasy_teams
+    db.fantasy_teams.delete_many({})
+    other = Leaderboard().sync(db, path, min_interval=0)
+    assert other.version == 3
+    assert ids(other) == ids(board)
+
+
+def test_restart_sees_teams_created_and_deleted_after_snapshot(db, tmp_path):
+    path = str(tmp_path / "lb.snapshot")
+    old = add_team(db, 10)
+    bump(db, 1, age=600)
+    Leaderboard().sync(db, path, min_interval=0)
+
+    # alta y baja de equipos que subieron la versión sin llegar al snapshot
+    db.fantasy_teams.delete_one({"_id": old})
+    new = add_team(db, 5)
+    bump(db, 3)
+
+    board = Leaderboard().sync(db, path, min_interval=0)
+    assert board.version == 3
+    assert ids(board) == [str(new)]
+    assert Leaderboard.snapshot_version(path) == 3
+
+
+def test_loaded_worker_waits_for_snapshot_within_grace(db, tmp_path):
+    path = str(tmp_path / "lb.snapshot")
+    first = add_team(db, 10)
+    bump(db, 1, age=600)
+    board = Leaderboard().sync(db, path, min_interval=0)
+
+    add_team(db, 50)
+    bump(db, 2)
+    board.sync(db, path, min_interval=0, snapshot_grace=30)
+    assert board.version == 1
+    assert ids(board) == [str(first)]
+
+    # pasada la gracia sin snapshot nuevo, recorre la colección
+    bump(db, 2, age=60)
+    board.sync(db, path, min_interval=0, snapshot_grace=30)
+    assert board.version == 2
+    assert len(board) == 2
+
+
+def test_corrupt_snapshot_falls_back_to_db(db, tmp_path):
+    path = tmp_path / "lb.snapshot"
+    team = add_team(db, 10)
+    bump(db, 4, age=600)
+    snapshot = Leaderboard()
+    snapshot.load([(str(ObjectId()), i, None, None) for i in range(1000)])
+    snapshot.version = 5
+    # versión legible en la cabecera, cuerpo cortado
+    data = snapshot.dumps()
+    path.write_bytes(data[:len(data) // 2])
+    assert Leaderboard.snapshot_version(str(path)) == 5
+
+    board = Leaderboard().sync(db, str(path), min_interval=0)
+    assert ids(board) == [str(team)]
+    assert board.version == 4
+
+    path.write_bytes(b"basura")
+    assert Leaderboard.snapshot_version(str(path)) is None
+    assert ids(Leaderboard().sync(db, str(path), min_interval=0)) == [str(team)]
+
+
+def test_concurrent_saves_leave_a_valid_snapshot(tmp_path):
+    path = str(tmp_path / "lb.snapshot")
+    boards = []
+    for version in range(1, 9):
+        board = Leaderboard()
+        board.load([(str(ObjectId()), i, None, None) for i in range(200)])
+        board.version = version
+        boards.append(board)
+    threads = [threading.Thread(target=b.save_snapshot, args=(path,)) for b in boards]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    loaded = Leaderboard()
+    loaded.load_snapshot(path)
+    assert len(loaded) == 200
+    assert list(tmp_path.iterdir()) == [tmp_path / "lb.snapshot"]
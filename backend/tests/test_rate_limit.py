@@ -0,0 +1,121 @@
+import pytest
+from bson import ObjectId
+
+from rate_limit import MemoryStore, RateLimited, RateLimiter, parse_rule
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limiter(main, monkeypatch):
+    """Límites chicos para poder agotarlos en un test"""
+    limiter = RateLimiter(MemoryStore(), {
+        "login_ip": parse_rule("2/3600"),
+        "login_user": parse_rule("100/3600"),
+        "register_ip": parse_rule("100/3600"),
+        "user": parse_rule("2/3600"),
+        "transfers": parse_rule("100/3600"),
+    })
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture
+def behind_proxy(main, monkeypatch):
+    monkeypatch.setattr(main, "TRUSTED_PROXIES", main.parse_networks("10.0.0.0/8, 192.168.1.1"))
+
+
+def ip_of(main, remote_addr, forwarded=None):
+    headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+    with main.app.test_request_context("/", headers=headers, environ_base={"REMOTE_ADDR": remote_addr}):
+        return main.client_ip()
+
+
+def test_bucket_refills_with_time():
+    clock = Clock()
+    limiter = RateLimiter(MemoryStore(), {"r": parse_rule("2/10")}, clock=clock)
+    limiter.hit("r", "k")
+    limiter.hit("r", "k")
+    with pytest.raises(RateLimited) as e:
+        limiter.hit("r", "k")
+    assert e.value.retry_after == 5
+    limiter.hit("r", "otra")
+    clock.now += 5
+    limiter.hit("r", "k")
+
+
+def test_backoff_after_free_failures():
+    clock = Clock()
+    limiter = RateLimiter(MemoryStore(), {}, backoff=(2, 1.0, 60.0, 900.0), clock=clock)
+    for _ in range(3):
+        limiter.check_backoff("login_user", "ana")
+        limiter.failure("login_user", "ana")
+    with pytest.raises(RateLimited):
+        limiter.check_backoff("login_user", "ana")
+    limiter.success("login_user", "ana")
+    limiter.check_backoff("login_user", "ana")
+
+
+def test_client_ip_ignores_forwarded_for_without_trusted_proxies(main):
+    assert ip_of(main, "10.1.2.3", "1.2.3.4") == "10.1.2.3"
+
+
+def test_client_ip_behind_trusted_proxies(main, behind_proxy):
+    # el de más a la izquierda lo escribe el cliente: no vale
+    assert ip_of(main, "10.1.2.3", "6.6.6.6, 1.2.3.4, 192.168.1.1") == "1.2.3.4"
+    assert ip_of(main, "10.1.2.3", "1.2.3.4") == "1.2.3.4"
+    # un par que no es proxy no puede elegir su IP
+    assert ip_of(main, "5.5.5.5", "1.2.3.4") == "5.5.5.5"
+    # todo el camino es de confianza: el primer salto
+    assert ip_of(main, "10.1.2.3", "10.9.9.9") == "10.9.9.9"
+
+
+def test_login_limit_is_per_client_behind_proxy(client, limiter, behind_proxy):
+    def login(ip, n):
+        return client.post("/login", json={"username": f"u{n}", "password": "x"},
+                           headers={"X-Forwarded-For": ip}, environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code
+
+    assert [login("1.1.1.1", n) for n in range(3)] == [401, 401, 429]
+    assert login("2.2.2.2", 3) == 401
+
+
+def user_token(main, db, role="user", token_role=None):
+    user_id = db.users.insert_one({
+        "username": f"u{ObjectId()}", "email": "u@example.com", "role": role, "is_active": True,
+    }).inserted_id
+    return {"Authorization": f"Bearer {main.create_jwt(str(user_id), token_role or role)}"}
+
+
+@pytest.fixture
+def profile_reads(main, monkeypatch):
+    calls = []
+    real = main.get_user_profile
+
+    def counting(user_id):
+        calls.append(user_id)
+        return real(user_id)
+
+    monkeypatch.setattr(main, "get_user_profile", counting)
+    return calls
+
+
+def test_user_limit_applies_before_loading_profile(main, db, client, limiter, profile_reads):
+    headers = user_token(main, db)
+    statuses = [client.get("/me", headers=headers).status_code for _ in range(4)]
+    assert statuses[2:] == [429, 429]
+    assert 429 not in statuses[:2]
+    assert len(profile_reads) == 2
+
+
+def test_admins_are_not_limited_but_stale_admin_tokens_are(main, db, client, limiter, profile_reads):
+    admin = user_token(main, db, role="admin")
+    assert 429 not in [client.get("/me", headers=admin).status_code for _ in range(4)]
+
+    demoted = user_token(main, db, role="user", token_role="admin")
+    assert [client.get("/me", headers=demoted).status_code for _ in range(3)][2] == 429
@@ -0,0 +1,129 @@
+import base64
+import io
+import os
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+from PIL import Image
+from werkzeug.exceptions import NotFound
+
+from static_assets import IMMUTABLE, AssetError, AssetPipeline, decode_image, image_extension
+
+
+def png(size=(300, 200)):
+    out = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return AssetPipeline(str(tmp_path / "static"), str(tmp_path / "cache"), uploads_dir=str(tmp_path / "uploads"))
+
+
+@pytest.fixture
+def flask_app():
+    return Flask(__name__)
+
+
+def media(flask_app, pipeline, variant, rel, accept=""):
+    with flask_app.test_request_context("/", headers={"Accept": accept}):
+        resp = pipeline.send_media(variant, rel)
+        resp.direct_passthrough = False
+        return resp
+
+
+def test_decode_image():
+    data = png()
+    assert decode_image(base64.b64encode(data).decode()) == data
+    assert decode_image("data:image/png;base64," + base64.b64encode(data).decode()) == data
+    assert decode_image("https://example.com/logo.png") is None
+    assert decode_image("/media/thumb/equipos/logo.png") is None
+    assert decode_image("no es base64!") is None
+    assert decode_image("") is None
+
+
+def test_image_extension():
+    assert image_extension(png()) == "png"
+    assert image_extension(b"\xff\xd8\xff\xe0rest") == "jpg"
+    assert image_extension(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    # RIFF sin WEBP es otro formato (WAV, AVI)
+    assert image_extension(b"RIFF\x00\x00\x00\x00WAVEfmt ") == "bin"
+
+
+def test_store_logo(pipeline):
+    data = png()
+    url = pipeline.store_logo(base64.b64encode(data).decode())
+    assert url.startswith("/media/thumb/equipos/logo-") and url.endswith(".png")
+    rel = url[len("/media/thumb/"):]
+    with open(os.path.join(pipeline.uploads_dir, rel), "rb") as f:
+        assert f.read() == data
+    # mismo contenido, mismo archivo
+    assert pipeline.store_logo(data) == url
+    assert pipeline.store_logo("https://example.com/logo.png") == "https://example.com/logo.png"
+    assert pipeline.store_logo(None) is None
+
+
+def test_store_logo_rejects_text_that_decodes_as_base64(pipeline):
+    # "Fiat" es base64 válido, pero no es una imagen
+    with pytest.raises(AssetError) as e:
+        pipeline.store_logo("Fiat")
+    assert e.value.status == 400
+    assert not os.path.exists(pipeline.uploads_dir) or not os.listdir(pipeline.uploads_dir)
+
+
+def test_send_media_thumbnail_and_webp(flask_app, pipeline):
+    rel = pipeline.store_logo(png())[len("/media/thumb/"):]
+
+    resp = media(flask_app, pipeline, "thumb", rel)
+    assert resp.status_code == 200
+    assert resp.headers["Cache-Control"] == IMMUTABLE
+    assert resp.headers["Vary"] == "Accept"
+    with Image.open(io.BytesIO(resp.get_data())) as img:
+        assert img.format == "PNG" and max(img.size) == 128
+
+    resp = media(flask_app, pipeline, "card", rel, accept="image/webp,*/*")
+    with Image.open(io.BytesIO(resp.get_data())) as img:
+        assert img.format == "WEBP"
+
+    assert media(flask_app, pipeline, "orig", rel).get_data() == png()
+
+
+@pytest.mark.parametrize("variant, rel", [
+    ("thumb", "equipos/no-existe.png"),
+    ("huge", "equipos/logo.png"),
+    ("orig", "../static/index.html"),
+    # un archivo que Pillow no sabe leer
+    ("thumb", "equipos/roto.png"),
+])
+def test_send_media_not_found(flask_app, pipeline, variant, rel):
+    os.makedirs(os.path.join(pipeline.uploads_dir, "equipos"), exist_ok=True)
+    for name, data in (("logo.png", png()), ("roto.png", b"esto no es un png")):
+        with open(os.path.join(pipeline.uploads_dir, "equipos", name), "wb") as f:
+            f.write(data)
+    with pytest.raises(NotFound):
+        media(flask_app, pipeline, variant, rel)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip, br;q=0.5", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("GZIP;q=0.8, br;q=0.9", "br"),
+    ("identity", None),
+])
+def test_pick_encoding_honours_q_values(flask_app, tmp_path, header, expected):
+    path = str(tmp_path / "app.js")
+    for suffix in ("", ".br", ".gz"):
+        open(path + suffix, "wb").close()
+    with flask_app.test_request_context("/", headers={"Accept-Encoding": header}):
+        assert AssetPipeline._pick_encoding(path) == expected
+
+
+def test_create_team_rejects_non_image_logo(main, db, client):
+    admin_id = db.users.insert_one({"username": "admin", "email": "a@example.com", "role": "admin", "is_active": True}).inserted_id
+    headers = {"Authorization": f"Bearer {main.create_jwt(str(admin_id), 'admin')}"}
+    resp = client.post("/teams", json={"name": f"Fiat {ObjectId()}", "logo_png": "Fiat"}, headers=headers)
+    assert resp.status_code == 400
+    assert db.teams.count_documents({}) == 0
@@ -0,0 +1,708 @@
+# migrate.py
+# Migraciones versionadas y seeds idempotentes para TC2000 Fantasy
+# Requisitos: pip install pymongo dnspython (bcrypt para --synthetic, mongomock para --mongomock)
+#
+# Uso:
+#   python migrate.py                       aplica las migraciones pendientes
+#   python migrate.py --status              lista aplicadas / pendientes
+#   python migrate.py --dry-run             muestra lo que haría sin escribir
+#   python migrate.py --synthetic 100000    agrega usuarios/fantasy teams/resultados de prueba
+#   python migrate.py --mongomock ...       contra una base en memoria (pruebas)
+#   python migrate.py --reset               borra todo y arranca de cero (sólo desarrollo)
+#
+# Cada paso aplicado queda registrado en la colección schema_migrations; volver
+# a correr el script sólo ejecuta los que falten. Los seeds son upserts por
+# clave natural, así que tampoco duplican datos ni pisan cambios hechos desde
+# la app (contraseña del admin, puntajes, etc).
+
+import argparse
+import base64
+import hashlib
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.binary import Binary
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# ---------- CONFIG ----------
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME = os.getenv("DB_NAME", "tc2000_fantasy")
+MIGRATIONS_COLLECTION = "schema_migrations"
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "resources", "uploads"))
+BATCH_SIZE = 5000
+# mismos valores por defecto que main.py (RosterService)
+DEFAULT_PILOT_PRICE = int(os.getenv("FANTASY_DEFAULT_PRICE", "15"))
+MAX_PER_TEAM = int(os.getenv("FANTASY_MAX_PER_TEAM", "2"))
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+# ---------- CONTEXTO ----------
+class Context:
+    """
+    Operaciones que usan las migraciones. En dry-run no se escribe nada: sólo
+    se cuenta y se informa lo que se haría.
+    """
+
+    def __init__(self, db, dry_run=False, verbose=True):
+        self.db = db
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.counts = {"indexes": 0, "upserts": 0, "inserts": 0}
+
+    def log(self, msg):
+        if self.verbose:
+            print(("[dry-run] " if self.dry_run else "") + msg)
+
+    def create_index(self, collection, keys, **options):
+        self.counts["indexes"] += 1
+        self.log(f"índice {collection} {keys} {options or ''}".rstrip())
+        if not self.dry_run:
+            self.db[collection].create_index(keys, **options)
+
+    def upsert_many(self, collection, key_fields, docs, set_fields=()):
+        """
+        Inserta los docs que no existan (por key_fields). Sólo set_fields se
+        actualiza en los que ya están; el resto queda como lo dejó la app.
+        """
+        ops = []
+        for doc in docs:
+            doc = dict(doc)
+            key = {k: doc[k] for k in key_fields}
+            update = {"$setOnInsert": {k: v for k, v in doc.items() if k not in set_fields}}
+            fields = {k: doc[k] for k in set_fields if k in doc}
+            if fields:
+                update["$set"] = fields
+                for k in fields:
+                    update["$setOnInsert"].pop(k, None)
+            ops.append(UpdateOne(key, update, upsert=True))
+        self.counts["upserts"] += len(ops)
+        self.log(f"upsert {collection}: {len(ops)} documentos por {'+'.join(key_fields)}")
+        if ops and not self.dry_run:
+            self.db[collection].bulk_write(ops, ordered=False)
+
+    def insert_stream(self, collection, docs, batch_size=BATCH_SIZE):
+        """Inserta un iterable en lotes (memoria acotada); devuelve cuántos se escribieron"""
+        total, batch = 0, []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                total += self._insert(collection, batch)
+                batch = []
+        if batch:
+            total += self._insert(collection, batch)
+        self.counts["inserts"] += total
+        self.log(f"insert {collection}: {total} documentos")
+        return total
+
+    def _insert(self, collection, batch):
+        if self.dry_run:
+            # ids de mentira para que lo que depende de este lote también se cuente
+            for doc in batch:
+                doc.setdefault("_id", ObjectId())
+            return len(batch)
+        try:
+            return len(self.db[collection].insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            return e.details.get("nInserted", 0)
+
+    def drop_index(self, collection, name):
+        if name not in self.db[collection].index_information():
+            return
+        self.log(f"drop índice {collection} {name}")
+        if not self.dry_run:
+            self.db[collection].drop_index(name)
+
+    def ids_by(self, collection, field):
+        return {d[field]: d["_id"] for d in self.db[collection].find({}, {field: 1}) if field in d}
+
+
+# ---------- ÍNDICES ----------
+# Estado actual de los índices, el que dejan todas las migraciones aplicadas;
+# el generador sintético lo usa para reconstruir los índices diferidos. Las
+# migraciones no lo aplican: cada una crea su propia lista, fija, así que
+# cambiar algo acá exige una migración nueva con ese mismo cambio.
+INDEXES = {
+    "users": [
+        ([("username", ASCENDING)], {"unique": True}),
+        ([("email", ASCENDING)], {"unique": True}),
+        # /admin/users busca y ordena por la copia sin mayúsculas (+ _id de desempate)
+        ([("username_lc", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("email_lc", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("role", ASCENDING), ("username_lc", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("is_active", ASCENDING), ("username_lc", ASCENDING), ("_id", ASCENDING)], {}),
+    ],
+    "roles": [([("name", ASCENDING)], {"unique": True})],
+    "pilots": [
+        ([("team_id", ASCENDING)], {}),
+        ([("car_number", ASCENDING)], {"unique": True}),
+    ],
+    "teams": [([("name", ASCENDING)], {"unique": True})],
+    "circuits": [([("name", ASCENDING)], {"unique": True})],
+    "events": [
+        ([("start_at", ASCENDING)], {}),
+        # no único: las bases cargadas con init_db_mongo.py pueden tener nombres repetidos
+        ([("name", ASCENDING)], {}),
+        # el scheduler levanta al arrancar los eventos no publicados
+        ([("status", ASCENDING), ("start_at", ASCENDING)], {}),
+    ],
+    "event_results": [([("event_id", ASCENDING), ("pilot_id", ASCENDING)], {"unique": True})],
+    # un piloto una sola vez por equipo; el prefijo sirve para "roster de un equipo"
+    "team_roster": [
+        ([("pilot_id", ASCENDING)], {}),
+        ([("fantasy_team_id", ASCENDING), ("pilot_id", ASCENDING)], {"unique": True}),
+    ],
+    # un fantasy team por usuario (las altas concurrentes chocan en el índice)
+    "fantasy_teams": [
+        ([("total_score", DESCENDING), ("_id", ASCENDING)], {}),
+        ([("user_id", ASCENDING)], {"unique": True}),
+    ],
+    "derived_stats": [([("key", ASCENDING)], {"unique": True})],
+    # /admin/audit pagina por (created_at, _id) descendente con un filtro de igualdad opcional
+    "audit_log": [
+        ([("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("who_user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("action", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("resource_type", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("result", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    ],
+}
+
+
+def ensure_indexes(ctx, spec, collections=None):
+    for collection, specs in spec.items():
+        if collections is None or collection in collections:
+            for keys, options in specs:
+                ctx.create_index(collection, keys, **options)
+
+
+# ---------- SEEDS ----------
+ADMIN_PASSWORD_HASH = "JDJiJDEyJGxRN1ZxWWZ1LmF5OER4RVJxVk5mWS5aRW90OE95TmIyNTJJNHVWczJtb1pzcFVPUWg3d3VH"
+
+TEAMS = [
+    ("Toyota Gazoo Racing YPF Infinia", "Argentina"),
+    ("Honda Racing Team", "Argentina"),
+    ("YPF Elaion AURO Pro Racing", "Argentina"),
+    ("Axion Energy Sport", "Argentina"),
+    ("Fiat", "Argentina"),
+    ("Chevrolet", "Argentina"),
+]
+
+# (nombre, número, índice del equipo en TEAMS)
+PILOTS = [
+    ("Matías Rossi", 163, 0),
+    ("Emiliano Stang", 137, 0),
+    ("Franco Vivian", 132, 2),
+    ("Leonel Pernía", 106, 1),
+    ("Franco Morillo", 84, 1),
+    ("Facundo Aldrighetti", 68, 2),
+    ("Ulises Campillay", 72, 2),
+    ("Gabriel P. de León", 74, 0),
+    ("Marcelo Ciarrocchi", 76, 0),
+    ("Tiago Pernía", 46, 1),
+    ("Matías Capurro", 38, 3),
+    ("Nicolás Palau", 26, 4),
+    ("Mateo Polakovich", 30, 4),
+    ("Figgo Bessone", 22, 5),
+]
+
+CIRCUITS = [
+    {"name": "Autódromo Oscar Cabalén", "location": "Córdoba, Argentina", "length_km": 3.2, "laps": 20},
+    {"name": "Autódromo Termas de Río Hondo", "location": "Santiago del Estero, Argentina", "length_km": 4.8, "laps": 25},
+]
+
+EVENTS = [
+    ("Ronda Córdoba", 0, datetime(2025, 11, 10, 14, 0)),
+    ("Ronda Termas", 1, datetime(2025, 11, 24, 14, 0)),
+]
+
+
+# ---------- MIGRACIONES ----------
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+# los índices tal como los creó 0001; no se tocan (los cambios van en migraciones nuevas).
+# events.name no es único: init_db_mongo.py no lo tenía y en una base cargada
+# dos veces hay eventos repetidos, con lo que el índice único hacía fallar 0001
+INDEXES_0001 = {
+    "users": [
+        ([("username", ASCENDING)], {"unique": True}),
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "roles": [([("name", ASCENDING)], {"unique": True})],
+    "pilots": [
+        ([("team_id", ASCENDING)], {}),
+        ([("car_number", ASCENDING)], {"unique": True}),
+    ],
+    "teams": [([("name", ASCENDING)], {"unique": True})],
+    "circuits": [([("name", ASCENDING)], {"unique": True})],
+    "events": [
+        ([("start_at", ASCENDING)], {}),
+        ([("name", ASCENDING)], {}),
+    ],
+    "event_results": [([("event_id", ASCENDING), ("pilot_id", ASCENDING)], {"unique": True})],
+    "team_roster": [
+        ([("pilot_id", ASCENDING)], {}),
+        ([("fantasy_team_id", ASCENDING)], {}),
+    ],
+    "fantasy_teams": [
+        ([("total_score", DESCENDING), ("_id", ASCENDING)], {}),
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "derived_stats": [([("key", ASCENDING)], {"unique": True})],
+    "audit_log": [
+        ([("who_user_id", ASCENDING)], {}),
+        ([("action", ASCENDING)], {}),
+        ([("created_at", ASCENDING)], {}),
+    ],
+}
+
+
+@migration("0001", "índices base (antes de los seeds: los upserts se apoyan en las claves únicas)")
+def m0001_indexes(ctx):
+    ensure_indexes(ctx, INDEXES_0001)
+
+
+@migration("0002", "roles y usuario admin")
+def m0002_roles_admin(ctx):
+    ctx.upsert_many("roles", ["name"], [{"name": r} for r in ("admin", "user", "visitor")])
+    # el hash sólo se escribe al crear: no pisa una contraseña ya cambiada
+    ctx.upsert_many("users", ["username"], [{
+        "username": "admin",
+        "email": "admin@tc2000.local",
+        "password_hash": Binary(base64.b64decode(ADMIN_PASSWORD_HASH), subtype=0),
+        "role": "admin",
+        "is_active": True,
+        "api_key_enc": None,
+        "created_at": utcnow(),
+        "last_login": None,
+    }])
+
+
+@migration("0003", "equipos y pilotos")
+def m0003_teams_pilots(ctx):
+    ctx.upsert_many("teams", ["name"], [
+        {"name": name, "base_country": country, "logo_png": None, "created_at": utcnow()}
+        for name, country in TEAMS
+    ], set_fields=("base_country",))
+    team_ids = ctx.ids_by("teams", "name")
+    ctx.upsert_many("pilots", ["car_number"], [{
+        "name": name,
+        "team_id": team_ids.get(TEAMS[team][0]),
+        "car_number": number,
+        "avatar_png": None,
+        "current_score": 0,
+        "created_at": utcnow(),
+        "stats": {"podiums": 0, "wins": 0, "DNF": 0},
+    } for name, number, team in PILOTS], set_fields=("name", "team_id"))
+
+
+@migration("0004", "circuitos y eventos")
+def m0004_circuits_events(ctx):
+    ctx.upsert_many("circuits", ["name"], [{**c, "created_at": utcnow()} for c in CIRCUITS])
+    circuit_ids = ctx.ids_by("circuits", "name")
+    ctx.upsert_many("events", ["name"], [{
+        "name": name,
+        "circuit_id": circuit_ids.get(CIRCUITS[circuit]["name"]),
+        "start_at": start_at,
+        "status": "scheduled",
+        "results_published": False,
+    } for name, circuit, start_at in EVENTS])
+
+
+@migration("0005", "documento de ranking")
+def m0005_ranking(ctx):
+    ctx.upsert_many("derived_stats", ["key"], [{"key": "ranking", "json_value": [], "version": 0, "updated_at": utcnow()}])
+
+
+@migration("0006", "audit_log: índices compuestos para /admin/audit (reemplazan a los de un solo campo)")
+def m0006_audit_indexes(ctx):
+    ensure_indexes(ctx, {"audit_log": [
+        ([("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("who_user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("action", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("resource_type", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("result", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    ]})
+    for name in ("who_user_id_1", "action_1", "created_at_1"):
+        ctx.drop_index("audit_log", name)
+
+
+_IMAGE_SIGNATURES = ((b"\x89PNG\r\n\x1a\n", "png"), (b"\xff\xd8\xff", "jpg"), (b"GIF8", "gif"), (b"RIFF", "webp"))
+
+
+@migration("0007", "logos de equipos: de logo_png embebido a archivos en uploads/ + logo_url")
+def m0007_team_logos(ctx):
+    # mismo esquema de nombres que static_assets.store_logo: logo-<hash de contenido>.<ext>
+    for team in ctx.db.teams.find({"logo_png": {"$exists": True}}, {"logo_png": 1, "logo_url": 1}):
+        value, url = team["logo_png"], team.get("logo_url")
+        if isinstance(value, str) and value.startswith(("/", ".", "http")):
+            url = url or value
+        elif value:
+            if isinstance(value, str):
+                value = base64.b64decode(value.split(",", 1)[-1])
+            data = bytes(value)
+            ext = next((e for sig, e in _IMAGE_SIGNATURES if data.startswith(sig)), "bin")
+            rel = f"equipos/logo-{hashlib.blake2b(data, digest_size=8).hexdigest()}.{ext}"
+            ctx.log(f"logo {team['_id']} → {rel} ({len(data)} bytes)")
+            if not ctx.dry_run:
+                path = os.path.join(UPLOADS_DIR, rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+            url = f"/media/thumb/{rel}"
+        if not ctx.dry_run:
+            ctx.db.teams.update_one({"_id": team["_id"]}, {"$set": {"logo_url": url}, "$unset": {"logo_png": ""}})
+
+
+@migration("0008", "rosters: precio de pilotos, roster embebido en fantasy_teams e índices únicos")
+def m0008_rosters(ctx):
+    db = ctx.db
+    ctx.log("pilotos sin precio → %d" % DEFAULT_PILOT_PRICE)
+    if not ctx.dry_run:
+        db.pilots.update_many({"price": {"$exists": False}}, {"$set": {"price": DEFAULT_PILOT_PRICE}})
+
+    # los de un solo campo se reemplazan por los únicos de abajo
+    for collection, name in (("fantasy_teams", "user_id_1"), ("team_roster", "fantasy_team_id_1")):
+        info = db[collection].index_information().get(name)
+        if info and not info.get("unique"):
+            ctx.drop_index(collection, name)
+
+    # roster embebido (fuente de verdad de las transferencias) a partir de team_roster
+    pilots = {p["_id"]: p for p in db.pilots.find({}, {"price": 1, "team_id": 1})}
+    ops, done = [], 0
+    for team in db.fantasy_teams.find({"version": {"$exists": False}}, {"_id": 1}):
+        roster, counts = {}, {}
+        for row in db.team_roster.find({"fantasy_team_id": team["_id"]}, {"pilot_id": 1}):
+            p = pilots.get(row["pilot_id"])
+            if p is None:
+                continue
+            roster[str(p["_id"])] = {"price": p.get("price") or DEFAULT_PILOT_PRICE, "team_id": p.get("team_id"), "added_at": utcnow()}
+            if p.get("team_id"):
+                counts[str(p["team_id"])] = counts.get(str(p["team_id"]), 0) + 1
+        ops.append(UpdateOne({"_id": team["_id"]}, {"$set": {
+            "roster": roster, "size": len(roster), "spent": sum(e["price"] for e in roster.values()),
+            "team_counts": counts, "version": 1,
+        }}))
+        if len(ops) >= BATCH_SIZE:
+            done += _flush(ctx, "fantasy_teams", ops)
+    done += _flush(ctx, "fantasy_teams", ops)
+    ctx.log(f"rosters embebidos: {done} fantasy teams")
+    ensure_indexes(ctx, {
+        "fantasy_teams": [([("user_id", ASCENDING)], {"unique": True})],
+        "team_roster": [([("fantasy_team_id", ASCENDING), ("pilot_id", ASCENDING)], {"unique": True})],
+    })
+
+
+def _flush(ctx, collection, ops):
+    n = len(ops)
+    if ops and not ctx.dry_run:
+        ctx.db[collection].bulk_write(ops, ordered=False)
+    ops.clear()
+    return n
+
+
+@migration("0009", "eventos: índice (status, start_at) para el scheduler")
+def m0009_event_status_index(ctx):
+    ensure_indexes(ctx, {"events": [([("status", ASCENDING), ("start_at", ASCENDING)], {})]})
+
+
+@migration("0010", "pilotos: nombre del equipo copiado en pilots.team (sin $lookup al listar)")
+def m0010_pilot_team_names(ctx):
+    db = ctx.db
+    teams = {t["_id"]: t["name"] for t in db.teams.find({}, {"name": 1})}
+    by_name = {name: tid for tid, name in teams.items()}
+    ops, done = [], 0
+    for p in db.pilots.find({}, {"team_id": 1, "team": 1}):
+        team_id = p.get("team_id")
+        if team_id not in teams:
+            # equipo borrado, o piloto viejo con el equipo en texto libre
+            team_id = by_name.get(p.get("team")) if team_id is None else None
+        name = teams.get(team_id)
+        if team_id != p.get("team_id") or name != p.get("team"):
+            ops.append(UpdateOne({"_id": p["_id"]}, {"$set": {"team_id": team_id, "team": name}}))
+        if len(ops) >= BATCH_SIZE:
+            done += _flush(ctx, "pilots", ops)
+    done += _flush(ctx, "pilots", ops)
+    ctx.log(f"pilotos actualizados: {done}")
+
+
+@migration("0011", "usuarios: índices (role, username) e (is_active, username) para /admin/users")
+def m0011_user_list_indexes(ctx):
+    ensure_indexes(ctx, {"users": [
+        ([("role", ASCENDING), ("username", ASCENDING)], {}),
+        ([("is_active", ASCENDING), ("username", ASCENDING)], {}),
+    ]})
+
+
+def search_key(value):
+    """Lo mismo que main.search_key: username_lc / email_lc"""
+    return value.casefold() if isinstance(value, str) else None
+
+
+@migration("0012", "usuarios: username_lc/email_lc para buscar sin distinguir mayúsculas, con sus índices")
+def m0012_user_search_keys(ctx):
+    db = ctx.db
+    ops, done = [], 0
+    missing = {"$or": [{"username_lc": {"$exists": False}}, {"email_lc": {"$exists": False}}]}
+    for u in db.users.find(missing, {"username": 1, "email": 1}):
+        ops.append(UpdateOne({"_id": u["_id"]}, {"$set": {
+            "username_lc": search_key(u.get("username")), "email_lc": search_key(u.get("email")),
+        }}))
+        if len(ops) >= BATCH_SIZE:
+            done += _flush(ctx, "users", ops)
+    done += _flush(ctx, "users", ops)
+    ctx.log(f"usuarios actualizados: {done}")
+    ensure_indexes(ctx, {"users": [
+        ([("username_lc", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("email_lc", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("role", ASCENDING), ("username_lc", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("is_active", ASCENDING), ("username_lc", ASCENDING), ("_id", ASCENDING)], {}),
+    ]})
+    # los de 0011 ordenaban por username: ya no los usa ninguna consulta
+    ctx.drop_index("users", "role_1_username_1")
+    ctx.drop_index("users", "is_active_1_username_1")
+
+
+@migration("0013", "eventos: índice por nombre no único (las bases con 0001 viejo lo tienen único)")
+def m0013_event_name_index(ctx):
+    db = ctx.db
+    duplicated = list(db.events.aggregate([
+        {"$group": {"_id": "$name", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ]))
+    for d in duplicated:
+        ctx.log(f"evento repetido {d['_id']!r}: {', '.join(str(i) for i in d['ids'])}")
+    info = db.events.index_information().get("name_1")
+    if info and info.get("unique"):
+        ctx.drop_index("events", "name_1")
+    ensure_indexes(ctx, {"events": [([("name", ASCENDING)], {})]})
+
+
+# ---------- RUNNER ----------
+def applied_versions(db):
+    return {d["_id"]: d for d in db[MIGRATIONS_COLLECTION].find()}
+
+
+def migrate(db, target=None, dry_run=False, verbose=True):
+    """Aplica en orden las migraciones pendientes hasta target (inclusive)"""
+    ctx = Context(db, dry_run=dry_run, verbose=verbose)
+    done = applied_versions(db)
+    ran = []
+    for version, description, fn in sorted(MIGRATIONS):
+        if target is not None and version > target:
+            break
+        if version in done:
+            continue
+        ctx.log(f"==> {version} {description}")
+        t0 = time.perf_counter()
+        fn(ctx)
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        if not dry_run:
+            db[MIGRATIONS_COLLECTION].insert_one({
+                "_id": version,
+                "description": description,
+                "applied_at": utcnow(),
+                "duration_ms": round(elapsed_ms, 1),
+            })
+        ran.append(version)
+    return ran, ctx.counts
+
+
+def status(db):
+    done = applied_versions(db)
+    for version, description, _ in sorted(MIGRATIONS):
+        applied = done.get(version)
+        mark = applied["applied_at"].strftime("%Y-%m-%d %H:%M") if applied else "pendiente"
+        print(f"{version}  {mark:16}  {description}")
+
+
+# ---------- DATOS SINTÉTICOS ----------
+SYNTHETIC_PASSWORD = "synthetic"
+
+
+def roster_capacity(pilots):
+    """Máximo de pilotos que entran en un roster sin pasar MAX_PER_TEAM por equipo"""
+    per_team, free = {}, 0
+    for p in pilots:
+        if p.get("team_id"):
+            per_team[str(p["team_id"])] = per_team.get(str(p["team_id"]), 0) + 1
+        else:
+            free += 1
+    return free + sum(min(n, MAX_PER_TEAM) for n in per_team.values())
+
+
+def synthetic_roster(rng, pilots, size, now):
+    """
+    Campos del roster embebido con `size` pilotos al azar (respeta MAX_PER_TEAM).
+    Se recorren los pilotos en orden aleatorio salteando los de equipos ya
+    llenos: termina siempre, y si no alcanza es ValueError.
+    """
+    picked, counts = [], {}
+    for p in rng.sample(pilots, len(pilots)):
+        if len(picked) == size:
+            break
+        team = str(p["team_id"]) if p.get("team_id") else None
+        if team is not None:
+            if counts.get(team, 0) >= MAX_PER_TEAM:
+                continue
+            counts[team] = counts.get(team, 0) + 1
+        picked.append(p)
+    if len(picked) < size:
+        raise ValueError(f"no entran {size} pilotos en un roster con MAX_PER_TEAM={MAX_PER_TEAM} (máximo {len(picked)})")
+    roster = {str(p["_id"]): {"price": p.get("price") or DEFAULT_PILOT_PRICE, "team_id": p.get("team_id"), "added_at": now}
+              for p in picked}
+    return {"roster": roster, "size": size, "spent": sum(e["price"] for e in roster.values()),
+            "team_counts": counts, "version": 1}
+
+
+def generate(db, users=0, events=0, roster_size=5, seed=1, dry_run=False, verbose=True):
+    """
+    Agrega datos de prueba marcados con synthetic=True hasta llegar a `users`
+    usuarios (cada uno con su fantasy team y roster) y `events` eventos con
+    resultados de todos los pilotos. Correrlo dos veces con los mismos números
+    no agrega nada.
+
+    Las colecciones que están vacías se cargan sin sus índices secundarios y
+    los índices se construyen al final (más rápido que mantenerlos fila a fila);
+    los únicos se dejan siempre porque garantizan la idempotencia.
+    """
+    ctx = Context(db, dry_run=dry_run, verbose=verbose)
+    rng = random.Random(seed)
+    pilots = list(db.pilots.find({}, {"price": 1, "team_id": 1}))
+    if not pilots:
+        raise SystemExit("no hay pilotos: correr las migraciones antes de generar datos")
+    pilot_ids = [p["_id"] for p in pilots]
+
+    targets = ("fantasy_teams", "team_roster", "event_results")
+    deferred = [c for c in targets if db[c].estimated_document_count() == 0]
+    if not dry_run:
+        for c in deferred:
+            for index in list(db[c].list_indexes()):
+                if index["name"] != "_id_" and not index.get("unique"):
+                    db[c].drop_index(index["name"])
+
+    # usuarios + fantasy teams + rosters, de a BATCH_SIZE usuarios por vez
+    existing = db.users.count_documents({"synthetic": True})
+    if users > existing:
+        import bcrypt
+        password_hash = bcrypt.hashpw(SYNTHETIC_PASSWORD.encode("utf-8"), bcrypt.gensalt(4))
+        size = min(roster_size, len(pilots))
+        if size > roster_capacity(pilots):
+            raise SystemExit(f"--roster-size {roster_size}: con MAX_PER_TEAM={MAX_PER_TEAM} entran como "
+                             f"mucho {roster_capacity(pilots)} pilotos por roster")
+        now = utcnow()
+        for first in range(existing, users, BATCH_SIZE):
+            user_docs = [{
+                "username": f"synthetic_{i}",
+                "email": f"synthetic_{i}@tc2000.local",
+                "username_lc": f"synthetic_{i}",
+                "email_lc": f"synthetic_{i}@tc2000.local",
+                "password_hash": password_hash,
+                "role": "user",
+                "is_active": True,
+                "synthetic": True,
+                "created_at": now,
+                "last_login": None,
+            } for i in range(first, min(first + BATCH_SIZE, users))]
+            ctx.insert_stream("users", user_docs)
+            team_docs = [{
+                "name": f"Synthetic FC {u['username'][len('synthetic_'):]}",
+                "user_id": u["_id"],
+                "total_score": 0,
+                **synthetic_roster(rng, pilots, size, now),
+                "synthetic": True,
+                "created_at": now,
+            } for u in user_docs if "_id" in u]
+            ctx.insert_stream("fantasy_teams", team_docs)
+            ctx.insert_stream("team_roster", (
+                {"fantasy_team_id": t["_id"], "pilot_id": ObjectId(pid)}
+                for t in team_docs for pid in t["roster"]
+            ))
+
+    # eventos + resultados
+    existing = db.events.count_documents({"synthetic": True})
+    if events > existing:
+        start = datetime(2026, 1, 1, 14, 0)
+        event_docs = [{
+            "name": f"Synthetic Round {i}",
+            "start_at": start + timedelta(days=7 * i),
+            "status": "finished",
+            "results_published": False,
+            "synthetic": True,
+        } for i in range(existing, events)]
+        ctx.insert_stream("events", event_docs)
+
+        def results():
+            for e in event_docs:
+                order = rng.sample(pilot_ids, len(pilot_ids))
+                for position, pid in enumerate(order, 1):
+                    dnf = rng.random() < 0.05
+                    yield {"event_id": e["_id"], "pilot_id": pid, "position": None if dnf else position, "dnf": dnf}
+        ctx.insert_stream("event_results", results())
+
+    if deferred:
+        ensure_indexes(ctx, INDEXES, deferred)
+    return ctx.counts
+
+
+# ---------- CLI ----------
+def connect(args):
+    if args.mongomock:
+        import mongomock
+        return mongomock.MongoClient()[args.db]
+    return MongoClient(args.uri)[args.db]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migraciones y seeds de TC2000 Fantasy")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--mongomock", action="store_true", help="base en memoria (no persiste)")
+    parser.add_argument("--dry-run", action="store_true", help="no escribe nada, sólo informa")
+    parser.add_argument("--status", action="store_true", help="lista migraciones aplicadas y pendientes")
+    parser.add_argument("--target", help="aplica hasta esta versión inclusive")
+    parser.add_argument("--reset", action="store_true", help="borra las colecciones antes de migrar (sólo desarrollo)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="USERS", help="usuarios sintéticos a generar")
+    parser.add_argument("--events", type=int, default=0, help="eventos sintéticos con resultados")
+    parser.add_argument("--roster-size", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    db = connect(args)
+    if args.status:
+        status(db)
+        return
+
+    t0 = time.perf_counter()
+    if args.reset:
+        for collection in [*INDEXES, "fantasy_teams", "team_roster", MIGRATIONS_COLLECTION]:
+            print(("[dry-run] " if args.dry_run else "") + f"drop {collection}")
+            if not args.dry_run:
+                db.drop_collection(collection)
+    ran, counts = migrate(db, target=args.target, dry_run=args.dry_run)
+    label = "Migraciones a aplicar" if args.dry_run else "Migraciones aplicadas"
+    print(f"{label}: {', '.join(ran) or 'ninguna (al día)'} {counts}")
+
+    if args.synthetic or args.events:
+        counts = generate(db, users=args.synthetic, events=args.events, roster_size=args.roster_size,
+                          seed=args.seed, dry_run=args.dry_run)
+        print(f"Datos sintéticos: {counts}")
+    print(f"Listo en {time.perf_counter() - t0:.1f}s (DB '{args.db}')")
+
+
+if __name__ == "__main__":
+    main()
@@ -389,6 +389,16 @@ document.addEventListener("DOMContentLoaded", async () => {
     const saveUserBtn = document.getElementById('saveUserBtn');
     const cancelEditBtn = document.getElementById('cancelEditBtn');
     const usersList = document.getElementById('usersList');
+    const usersSearch = document.getElementById('usersSearch');
+    const usersSearchBy = document.getElementById('usersSearchBy');
+    const usersRoleFilter = document.getElementById('usersRoleFilter');
+    const usersActiveFilter = document.getElementById('usersActiveFilter');
+    const usersMoreBtn = document.getElementById('usersMoreBtn');
+    const usersTotal = document.getElementById('usersTotal');
+    const USERS_PAGE_SIZE = 50;
+    // usuarios ya cargados y cursor de la página siguiente (X-Next-After)
+    let loadedUsers = [];
+    let usersNextAfter = null;
 
     function escapeHtml(s) {
         // helper para escapar html y prevenir xss
@@ -428,11 +438,19 @@ document.addEventListener("DOMContentLoaded", async () => {
     // Funciones de la API de Usuarios
     // ====================================
 
-    async function loadUsers() {
+    // Sin `more` vuelve a la primera página con los filtros actuales
+    async function loadUsers(more = false) {
         if (!usersList) return;
         
         try {
-            const response = await fetch(`${API_BASE}/admin/users`, {
+            const params = new URLSearchParams({ limit: USERS_PAGE_SIZE });
+            if (usersSearch && usersSearch.value.trim()) params.set('q', usersSearch.value.trim());
+            if (usersSearchBy) params.set('by', usersSearchBy.value);
+            if (usersRoleFilter && usersRoleFilter.value) params.set('role', usersRoleFilter.value);
+            if (usersActiveFilter && usersActiveFilter.value) params.set('is_active', usersActiveFilter.value);
+            if (more && usersNextAfter) params.set('after', usersNextAfter);
+
+            const response = await fetch(`${API_BASE}/admin/users?${params}`, {
                 headers: { "Authorization": "Bearer " + localStorage.getItem("tc2000_token") }
             });
             
@@ -441,7 +459,15 @@ document.addEventListener("DOMContentLoaded", async () => {
             }
             
             const users = await response.json();
-            renderUsers(users);
+            loadedUsers = more ? loadedUsers.concat(users) : users;
+            usersNextAfter = response.headers.get('X-Next-After');
+            if (usersMoreBtn) usersMoreBtn.style.display = usersNextAfter ? '' : 'none';
+            if (usersTotal) {
+                const total = response.headers.get('X-Total-Count');
+                const capped = response.headers.get('X-Total-Capped') ? 'más de ' : '';
+                usersTotal.textContent = total !== null ? `(${loadedUsers.length} de ${capped}${total})` : '';
+            }
+            renderUsers(loadedUsers);
         } catch (error) {
             console.error('Error:', error);
             toast('Error al cargar usuarios: ' + error.message, 'error');
@@ -622,6 +648,19 @@ document.addEventListener("DOMContentLoaded", async () => {
         resetUserForm();
     }
 
+    // Búsqueda y filtros de usuarios: vuelven a la primera página
+    let usersSearchTimer = null;
+    if (usersSearch) {
+        usersSearch.addEventListener('input', () => {
+            clearTimeout(usersSearchTimer);
+            usersSearchTimer = setTimeout(() => loadUsers(), 300);
+        });
+    }
+    [usersSearchBy, usersRoleFilter, usersActiveFilter].forEach(el => {
+        if (el) el.addEventListener('change', () => loadUsers());
+    });
+    if (usersMoreBtn) usersMoreBtn.addEventListener('click', () => loadUsers(true));
+
     // Configuración de pestañas
     setupTabs();
     
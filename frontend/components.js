@@ -93,7 +93,7 @@ export function createTeamCard(team = {}) {
     const country = escapeHtml(team.base_country || "");
 
     // obtiene la url del logo con fallback
-    const logoSrc = resolveImageUrl(team.logo_png);
+    const logoSrc = resolveImageUrl(team.logo_url || team.logo_png);
 
     // crea el html de la tarjeta de equipo con fallback de imagen
     div.innerHTML = `
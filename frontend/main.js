@@ -357,6 +357,36 @@ document.addEventListener("DOMContentLoaded", () => {
         if (window.location.pathname.endsWith("admin.html")) window.location.href = "index.html";
     });
 
+    // === estado en vivo: lo que devolvio REST/snapshot + los deltas de socketio ===
+    // por topico, entidades por _id (en el orden en que llegaron)
+    const liveData = { pilots: new Map(), teams: new Map() };
+    const liveRenderers = { pilots: pilots => renderPilots(pilots), teams: teams => renderTeams(teams) };
+
+    function setTopic(topic, items) {
+        const map = liveData[topic];
+        if (!map) return;
+        map.clear();
+        (items || []).forEach(item => map.set(String(item._id), item));
+        liveRenderers[topic](Array.from(map.values()));
+    }
+
+    // aplica un lote de cambios compactos; false si el lote pide recargar el topico
+    function applyChanges(topic, changes) {
+        const map = liveData[topic];
+        if (!map) return true;
+        for (const c of changes) {
+            if (c.op === "reload") return false;
+            if (c.op === "delete") {
+                map.delete(c.id);
+            } else if (c.op === "upsert") {
+                const prev = c.replace ? null : map.get(c.id);
+                map.set(c.id, Object.assign({}, prev || { _id: c.id }, c.data || {}));
+            }
+        }
+        liveRenderers[topic](Array.from(map.values()));
+        return true;
+    }
+
     // === pilotos: carga y renderizado ===
     async function loadPilots() {
         try {
@@ -370,7 +400,7 @@ document.addEventListener("DOMContentLoaded", () => {
             }
             if (contentType.includes("application/json")) {
                 const pilots = await res.json();
-                renderPilots(pilots || []);
+                setTopic("pilots", pilots);
             } else {
                 const text = await res.text();
                 console.warn("/pilots devolvio non-json:", contentType);
@@ -408,7 +438,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 return;
             }
             const teams = await res.json();
-            renderTeams(teams || []);
+            setTopic("teams", teams);
         } catch (err) {
             console.error("loadTeams error", err);
             teamsGrid.innerHTML = `<div class='card'>error: ${err.message}</div>`;
@@ -452,6 +482,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
             // prepara rutas candidatas de imagen (logo, image, por id, por nombre)
             const candidates = [];
+            if (t.logo_url) candidates.push(String(t.logo_url));
             if (t.logo) candidates.push(String(t.logo));
             if (t.image) candidates.push(String(t.image));
             if (t._id) candidates.push(`./resources/uploads/equipos/${encodeURIComponent(t._id)}.png`);
@@ -539,9 +570,7 @@ document.addEventListener("DOMContentLoaded", () => {
             sse.onmessage = (e) => {
                 try {
                     const msg = JSON.parse(e.data);
-                    // recarga de datos por evento
-                    if (msg.type === "pilot_created") loadPilots();
-                    if (msg.type === "team_updated" || msg.type === "team_created") loadTeams();
+                    // los datos llegan como deltas por socketio; esto sólo avisa
                     toast("evento sse: " + (msg.type || "evento"));
                 } catch (err) { console.error("sse parse", err); }
             };
@@ -555,10 +584,56 @@ document.addEventListener("DOMContentLoaded", () => {
             socket.on("connect", () => { dotWS && (dotWS.classList.remove("off", "err"), dotWS.classList.add("ok")); });
             socket.on("disconnect", () => { dotWS && (dotWS.classList.remove("ok"), dotWS.classList.add("off")); });
             socket.on("connect_error", () => { dotWS && (dotWS.classList.remove("ok"), dotWS.classList.add("err")); });
-            // escucha eventos de socketio y recarga datos
-            socket.on("pilot_created", msg => { toast("ws: nuevo piloto " + (msg.name || "")); loadPilots(); });
-            socket.on("team_created", msg => { toast("ws: equipo creado " + (msg.name || "")); loadTeams(); });
-            socket.on("team_updated", msg => { toast("ws: equipo actualizado " + (msg.name || "")); loadTeams(); });
+            // deltas por topico: un lote cada ~100ms con numero de secuencia; se
+            // aplican sobre liveData sin volver a pedir el listado por REST
+            const seqs = {};
+            // topico -> lotes recibidos mientras se espera su snapshot
+            const resyncing = {};
+            let epoch = null;
+            const requestSnapshot = topic => {
+                if (resyncing[topic]) return;
+                resyncing[topic] = [];
+                socket.emit("resync", { topic });
+            };
+            const applyBatch = msg => {
+                seqs[msg.topic] = msg.seq;
+                if (!applyChanges(msg.topic, msg.changes)) requestSnapshot(msg.topic);
+            };
+            socket.on("connect", () => {
+                socket.emit("subscribe", { topics: Object.keys(liveData) }, ack => {
+                    if (!ack) return;
+                    epoch = ack.epoch;
+                    Object.assign(seqs, ack.seq);
+                });
+            });
+            socket.on("delta", msg => {
+                if (!liveData[msg.topic]) return;
+                if (resyncing[msg.topic]) {
+                    resyncing[msg.topic].push(msg);
+                    return;
+                }
+                // salto de secuencia o reconexion contra otro worker: pide snapshot
+                if (msg.epoch !== epoch || msg.seq !== (seqs[msg.topic] || 0) + 1) {
+                    requestSnapshot(msg.topic);
+                    resyncing[msg.topic].push(msg);
+                    return;
+                }
+                applyBatch(msg);
+            });
+            socket.on("snapshot", msg => {
+                const pending = resyncing[msg.topic] || [];
+                delete resyncing[msg.topic];
+                if (msg.error) return;
+                epoch = msg.epoch;
+                seqs[msg.topic] = msg.seq;
+                setTopic(msg.topic, msg.data);
+                // lo que llego durante la espera y es posterior al snapshot, en orden
+                for (const d of pending) {
+                    if (d.epoch !== epoch || d.seq <= seqs[msg.topic]) continue;
+                    if (d.seq !== seqs[msg.topic] + 1) { requestSnapshot(msg.topic); return; }
+                    applyBatch(d);
+                }
+            });
         } catch (err) {
             dotWS && (dotWS.classList.remove("ok"), dotWS.classList.add("err"));
         }